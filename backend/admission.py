@@ -0,0 +1,277 @@
+"""
+Admission control for the HTTP API
+This module keeps slow LLM traffic from starving cheap reads: LLM-backed and database-backed routes get separate
+concurrency limits with a bounded wait queue, requests that cannot be admitted in time are shed with 503 and
+Retry-After, and every client is rate limited per minute: in memory per worker, and for the LLM lane also across
+workers through the shared cache
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import registry
+from shared_cache import shared_cache
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# Requests served at once per lane; the rest wait in a FIFO queue of bounded length for at most the max wait
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", "16"))
+LLM_MAX_WAIT_SECONDS = float(os.getenv("LLM_MAX_WAIT_SECONDS", "10"))
+DB_CONCURRENCY = int(os.getenv("DB_CONCURRENCY", "16"))
+DB_QUEUE_LIMIT = int(os.getenv("DB_QUEUE_LIMIT", "64"))
+DB_MAX_WAIT_SECONDS = float(os.getenv("DB_MAX_WAIT_SECONDS", "2"))
+# Requests per client per minute and lane; 0 disables the limit. The LLM limit holds across workers, the DB limit
+# is counted in each worker's memory so reads never write to the shared cache
+LLM_RATE_LIMIT_PER_MINUTE = int(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", "20"))
+DB_RATE_LIMIT_PER_MINUTE = int(os.getenv("DB_RATE_LIMIT_PER_MINUTE", "600"))
+# Identify clients by the first X-Forwarded-For address: from any peer, or only from these proxy addresses
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+TRUSTED_PROXIES = {a.strip() for a in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if a.strip()}
+# Clients tracked per lane and worker; the least recently seen are forgotten beyond this
+RATE_LIMIT_MAX_CLIENTS = 10000
+
+LLM_ROUTES = ("/chat", "/warehouse/query")
+DB_ROUTE_PREFIXES = ("/warehouse", "/changes")
+RATE_WINDOW_SECONDS = 60
+
+admission_rejected = registry.counter(
+    "admission_rejected_total", "Requests refused by admission control, by lane and reason", ("lane", "reason"))
+
+
+class Lane:
+    """
+    A concurrency limit with a FIFO wait queue. Only used from the event loop thread, so it needs no lock;
+    a released slot is handed straight to the oldest waiter.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_limit: int, max_wait: float, rate_limit: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.rate_limit = rate_limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        # Moving average of how long an admitted request holds its slot, for Retry-After
+        self.service_time = 0.0
+        self.admitted = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Tuple[bool, str]:
+        """Returns (admitted, reason); the reason is "queue_full" or "timeout" when not admitted"""
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True, ""
+        if len(self._waiters) >= self.queue_limit:
+            return False, "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            # release() may have handed over the slot just as the wait timed out; the request then holds it
+            if not (waiter.done() and not waiter.cancelled()):
+                return False, "timeout"
+        except asyncio.CancelledError:
+            # The client went away after the slot was handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        return True, ""
+
+    def release(self, held: Optional[float] = None):
+        if held is not None:
+            self.service_time = held if self.service_time == 0.0 else 0.9 * self.service_time + 0.1 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead of a new request should have drained"""
+        backlog = (self.queued + self.in_flight) / max(1, self.concurrency)
+        return max(1, math.ceil(backlog * (self.service_time or self.max_wait)))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "avg_service_ms": round(self.service_time * 1000, 2),
+            "rate_limit_per_minute": self.rate_limit,
+        }
+
+
+class TokenBucket:
+    """`rate` requests per minute with bursts up to `rate`, refilled continuously"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, rate: int, now: float):
+        self.tokens = float(rate)
+        self.updated = now
+
+    def take(self, rate: int, now: float) -> float:
+        """0 when a token was taken, else the seconds until one is available"""
+        self.tokens = min(float(rate), self.tokens + (now - self.updated) * rate / RATE_WINDOW_SECONDS)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) * RATE_WINDOW_SECONDS / rate
+
+
+class AdmissionController:
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._buckets: Dict[str, "collections.OrderedDict[str, TokenBucket]"] = {}
+        self.lanes = {
+            "llm": Lane("llm", LLM_CONCURRENCY, LLM_QUEUE_LIMIT, LLM_MAX_WAIT_SECONDS, LLM_RATE_LIMIT_PER_MINUTE),
+            "db": Lane("db", DB_CONCURRENCY, DB_QUEUE_LIMIT, DB_MAX_WAIT_SECONDS, DB_RATE_LIMIT_PER_MINUTE),
+        }
+        registry.gauge("admission_requests", "Requests holding or waiting for an admission slot", ("lane", "state"),
+                       self._gauges)
+
+    def lane_for(self, path: str) -> Optional[Lane]:
+        """Health, metrics and docs are never limited"""
+        if path in LLM_ROUTES:
+            return self.lanes["llm"]
+        if path.startswith(DB_ROUTE_PREFIXES):
+            return self.lanes["db"]
+        return None
+
+    def _check_local(self, lane: Lane, client: str, now: float) -> int:
+        buckets = self._buckets.setdefault(lane.name, collections.OrderedDict())
+        bucket = buckets.get(client)
+        if bucket is None:
+            bucket = buckets[client] = TokenBucket(lane.rate_limit, now)
+            if len(buckets) > RATE_LIMIT_MAX_CLIENTS:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(client)
+        wait = bucket.take(lane.rate_limit, now)
+        return max(1, math.ceil(wait)) if wait else 0
+
+    async def check_rate(self, lane: Lane, client: str) -> int:
+        """0 if the client is within its limit, else the seconds until it may retry"""
+        if not lane.rate_limit:
+            return 0
+        now = time.time()
+        retry_after = self._check_local(lane, client, now)
+        # Only the LLM lane is worth a shared-cache write per request, to hold its limit across workers
+        if retry_after or lane.name != "llm" or self.cache is None:
+            return retry_after
+        window = int(now // RATE_WINDOW_SECONDS)
+        count = await asyncio.to_thread(self.cache.incr, f"rate:{lane.name}:{client}:{window}", 1, RATE_WINDOW_SECONDS)
+        if count <= lane.rate_limit:
+            return 0
+        return max(1, math.ceil((window + 1) * RATE_WINDOW_SECONDS - now))
+
+    def size_threadpool(self):
+        """Sync endpoints share one threadpool; make sure both lanes fit in it with room for unlimited routes"""
+        from anyio import to_thread
+        limiter = to_thread.current_default_thread_limiter()
+        limiter.total_tokens = max(limiter.total_tokens, sum(lane.concurrency for lane in self.lanes.values()) + 8)
+
+    def _gauges(self) -> Dict[Tuple[str, ...], float]:
+        values = {}
+        for name, lane in self.lanes.items():
+            values[(name, "in_flight")] = float(lane.in_flight)
+            values[(name, "queued")] = float(lane.queued)
+        return values
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: lane.status() for name, lane in self.lanes.items()}
+
+
+_untrusted_proxy_warned = False
+
+
+def client_id(scope) -> str:
+    global _untrusted_proxy_warned
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            if TRUST_FORWARDED_FOR or peer in TRUSTED_PROXIES:
+                return value.decode("latin-1").split(",")[0].strip()
+            if not _untrusted_proxy_warned:
+                _untrusted_proxy_warned = True
+                logger.warning(f"X-Forwarded-For from {peer} is ignored, so its clients share one rate limit; "
+                               f"add the proxy to TRUSTED_PROXIES")
+            break
+    return peer
+
+
+async def _reject(send, status: int, detail: str, retry_after: int):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying rate limits and lane admission before the endpoint runs"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        lane = self.controller.lane_for(scope["path"]) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await self.controller.check_rate(lane, client_id(scope))
+        if retry_after:
+            admission_rejected.inc(lane.name, "rate_limit")
+            await _reject(send, 429, "Rate limit exceeded", retry_after)
+            return
+
+        admitted, reason = await lane.acquire()
+        if not admitted:
+            admission_rejected.inc(lane.name, reason)
+            logger.warning(f"Shedding {scope['method']} {scope['path']}: {lane.name} lane {reason}")
+            await _reject(send, 503, f"Server busy ({lane.name} requests)", lane.retry_after())
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(time.perf_counter() - started)
+
+
+# Global admission controller instance
+admission = AdmissionController(cache=shared_cache)
@@ -0,0 +1,4 @@
+"""
+Benchmark and load-testing tools for the backend
+Run from the backend directory, e.g. `python -m benchmarks.run --products 10000`
+"""
@@ -0,0 +1,129 @@
+"""
+Payload size and decode-time benchmark for the list response formats
+Seeds SQLite, loads product and order rows the way the list endpoints return them, and measures every format
+(row JSON, columnar JSON, MessagePack) under every encoding (identity, gzip, zstd): bytes on the wire, server
+encode time and client decode time (decompress, parse and rebuild one dict per row).
+
+    python -m benchmarks.payloads --products 10000 --orders 10000 --output payloads.json
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> Tuple[Any, float]:
+    """The result and the best of `repeat` runs, in milliseconds"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, round(best * 1000, 3)
+
+
+def from_columnar(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    columns, data = payload["columns"], payload["data"]
+    return [dict(zip(columns, values)) for values in zip(*data)] if data else [{} for _ in range(payload["count"])]
+
+
+def formats(response_format) -> Dict[str, Tuple[Callable[[List[Dict[str, Any]]], bytes], Callable[[bytes], Any]]]:
+    """name -> (encode rows to bytes, decode bytes back to rows)"""
+    found = {
+        "json": (lambda rows: json.dumps(rows).encode(), lambda body: json.loads(body)),
+        "columnar": (lambda rows: json.dumps(response_format.columnar(rows)).encode(),
+                     lambda body: from_columnar(json.loads(body))),
+    }
+    msgpack = response_format._msgpack()
+    if msgpack is not None:
+        found["msgpack"] = (lambda rows: msgpack.packb(response_format.columnar(rows), use_bin_type=True),
+                            lambda body: from_columnar(msgpack.unpackb(body, raw=False)))
+    return found
+
+
+def encodings(response_format) -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    found = {
+        "identity": (lambda body: body, lambda body: body),
+        "gzip": (lambda body: response_format.compress(body, "gzip"), gzip.decompress),
+    }
+    zstandard = response_format._zstd()
+    if zstandard is not None:
+        found["zstd"] = (lambda body: response_format.compress(body, "zstd"),
+                         lambda body: zstandard.ZstdDecompressor().decompressobj().decompress(body))
+    return found
+
+
+def measure(rows: List[Dict[str, Any]], response_format, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for format_name, (serialize, parse) in formats(response_format).items():
+        body, serialize_ms = timed(lambda: serialize(rows), repeat)
+        for encoding_name, (encode, decode) in encodings(response_format).items():
+            wire, encode_ms = timed(lambda: encode(body), repeat)
+            decoded, decode_ms = timed(lambda: parse(decode(wire)), repeat)
+            assert decoded == rows, f"{format_name}/{encoding_name} did not round-trip"
+            results[f"{format_name}+{encoding_name}"] = {
+                "bytes": len(wire),
+                "encode_ms": round(serialize_ms + encode_ms, 3),
+                "decode_ms": decode_ms,
+            }
+    return results
+
+
+def print_results(name: str, count: int, results: Dict[str, Dict[str, float]]):
+    baseline = results["json+identity"]["bytes"]
+    print(f"\n{name} ({count} rows)")
+    for key, r in results.items():
+        print(f"  {key:<20} {r['bytes']:>11,} B ({r['bytes'] / baseline:6.1%})  encode {r['encode_ms']:>8.2f}ms  "
+              f"decode {r['decode_ms']:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list payload formats and encodings")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "warehouse_payloads.db"))
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding when the database file exists")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the best is reported")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    seeded = os.path.exists(args.db) and args.reuse_db
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    os.environ["SHARED_CACHE_PATH"] = os.path.splitext(args.db)[0] + "_cache.db"
+    sys.path.insert(0, BACKEND_DIR)
+
+    import database_service
+    import response_format
+    from fastapi.encoders import jsonable_encoder
+    if not seeded:
+        from data_generator import generate
+        generate(database_service.engine, args.products, 1, args.orders, args.seed, reset=True)
+
+    with database_service.DatabaseService() as db_service:
+        datasets = {
+            "/warehouse/products": jsonable_encoder(db_service.get_products(limit=args.products)),
+            "/warehouse/shipments": jsonable_encoder(db_service.get_orders(limit=args.orders)),
+        }
+
+    results = {}
+    for name, rows in datasets.items():
+        results[name] = measure(rows, response_format, args.repeat)
+        print_results(name, len(rows), results[name])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"products": args.products, "orders": args.orders, "results": results}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
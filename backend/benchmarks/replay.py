@@ -0,0 +1,351 @@
+"""
+Replay captured traffic against a build with a stub LLM
+Reads traces written by traffic_capture.py (TRAFFIC_CAPTURE_ENABLED=1), replays them in their recorded order
+in-process (ASGI), against a uvicorn process started here, or against any --url, at the original pace, N times
+faster, or as fast as a fixed number of clients allow. Turns of one chat session are replayed one after
+another on a session of their own. Compares the recorded latency distribution with the replayed one per route,
+and per detected intent on the NLU endpoints.
+
+    python -m benchmarks.replay traffic.jsonl                          # original pace, in-process
+    python -m benchmarks.replay traffic.jsonl --speed 10 --modes http --output replay.json
+    python -m benchmarks.replay traffic.jsonl --speed 0 --concurrency 32 --routes /chat
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.run import AsgiLifespan, start_http_server, summarize
+from benchmarks.stub_llm import start_stub_llm, provider_config
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PSEUDONYM = re.compile(r"p-[0-9a-f]{12}")
+
+Response = Tuple[int, bytes]
+
+
+def load_traces(path: str, routes: List[str], limit: int) -> List[Dict[str, Any]]:
+    """Traces in recorded order; a torn last line (capture still running) is skipped"""
+    traces, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            try:
+                trace = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not routes or any(r in (trace.get("r") or trace["p"]) for r in routes):
+                traces.append(trace)
+    if skipped:
+        print(f"⚠️  Skipped {skipped} unreadable trace line(s)")
+    traces.sort(key=lambda t: t["ts"])
+    return traces[:limit] if limit else traces
+
+
+def group(trace: Dict[str, Any]) -> str:
+    key = f"{trace['m']} {trace.get('r') or trace['p']}"
+    return f"{key} [{trace['i']}]" if "i" in trace else key
+
+
+def session_of(trace: Dict[str, Any]) -> Optional[str]:
+    """Recorded chat session of a trace: the one /chat answered on, asked for, or a path names"""
+    if trace.get("sid"):
+        return trace["sid"]
+    body = trace.get("b")
+    if isinstance(body, dict) and body.get("session_id"):
+        return body["session_id"]
+    match = PSEUDONYM.search(trace["p"])
+    return match.group(0) if match else None
+
+
+class AsgiDriver:
+    """Calls the app directly; the recorded client becomes the connection's address"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, query: str, headers: List[Tuple[bytes, bytes]],
+                      body: bytes, client: str) -> Response:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "",
+            "headers": [(b"host", b"replay"), (b"content-length", str(len(body)).encode())] + headers,
+            "client": (client, 50000), "server": ("replay", 80),
+        }
+        request_sent = False
+        response_done = asyncio.Event()
+        status = 0
+        chunks: List[bytes] = []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_done.set()
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+
+class HttpDriver:
+    """Blocking requests on a thread pool; the recorded client is sent as X-Forwarded-For"""
+
+    def __init__(self, base_url: str, threads: int):
+        self.base_url = base_url.rstrip("/")
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.local = threading.local()
+
+    def _send(self, method: str, url: str, headers: Dict[str, str], body: bytes) -> Response:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        try:
+            response = session.request(method, url, headers=headers, data=body or None, timeout=120)
+            return response.status_code, response.content
+        except requests.RequestException:
+            return 599, b""
+
+    async def request(self, method: str, path: str, query: str, headers: List[Tuple[bytes, bytes]],
+                      body: bytes, client: str) -> Response:
+        url = self.base_url + path + (f"?{query}" if query else "")
+        plain = {name.decode(): value.decode() for name, value in headers}
+        plain["x-forwarded-for"] = client
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._send, method, url, plain, body)
+
+
+async def replay(driver, traces: List[Dict[str, Any]], speed: float, concurrency: int) -> Dict[str, Any]:
+    """
+    Issue every trace at its recorded offset divided by `speed` (open loop), or with speed 0 back to back from
+    `concurrency` clients. Returns per-request results and how late requests started against the schedule.
+    """
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency) if not speed else None
+    sessions: Dict[str, str] = {}
+    session_tail: Dict[str, asyncio.Task] = {}
+    results: List[Tuple[str, int, float]] = []
+    lags: List[float] = []
+
+    async def one(trace: Dict[str, Any], previous: Optional[asyncio.Task]):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            recorded_session = session_of(trace)
+            body = trace.get("b")
+            if isinstance(body, dict) and "session_id" in body:
+                body = dict(body)
+                if body["session_id"] in sessions:
+                    body["session_id"] = sessions[body["session_id"]]
+                else:
+                    body.pop("session_id")
+            path = PSEUDONYM.sub(lambda m: sessions.get(m.group(0), m.group(0)), trace["p"])
+            headers = [(b"content-type", b"application/json")] if body is not None else []
+            if "a" in trace:
+                headers.append((b"accept", trace["a"].encode()))
+            if "e" in trace:
+                headers.append((b"accept-encoding", trace["e"].encode()))
+            payload = json.dumps(body).encode() if body is not None else b"x" * trace.get("bn", 0)
+
+            started = time.perf_counter()
+            try:
+                status, content = await driver.request(trace["m"], path, trace.get("q", ""), headers, payload,
+                                                       trace.get("c", "replay"))
+            except Exception:
+                status, content = 599, b""
+            results.append((group(trace), status, time.perf_counter() - started))
+
+            if recorded_session and recorded_session not in sessions and status < 400:
+                try:
+                    sessions[recorded_session] = json.loads(content)["session_id"]
+                except (ValueError, KeyError, TypeError):
+                    pass
+        finally:
+            if limit is not None:
+                limit.release()
+
+    tasks = []
+    origin = traces[0]["ts"] if traces else 0.0
+    started = loop.time()
+    for trace in traces:
+        if speed:
+            due = (trace["ts"] - origin) / speed
+            delay = due - (loop.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, loop.time() - started - due))
+        else:
+            await limit.acquire()
+        recorded_session = session_of(trace)
+        task = asyncio.create_task(one(trace, session_tail.get(recorded_session) if recorded_session else None))
+        if recorded_session:
+            session_tail[recorded_session] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+    return {"results": results, "elapsed": loop.time() - started, "lags": lags}
+
+
+def compare(traces: List[Dict[str, Any]], replayed: Dict[str, Any]) -> Dict[str, Any]:
+    """Recorded and replayed latency summaries per group, plus the whole mix"""
+    recorded: Dict[str, List[Dict[str, Any]]] = {"all": []}
+    for trace in traces:
+        recorded.setdefault(group(trace), []).append(trace)
+        recorded["all"].append(trace)
+    replay_latencies: Dict[str, List[float]] = {"all": []}
+    replay_errors: Dict[str, int] = {"all": 0}
+    for key, status, latency in replayed["results"]:
+        for k in (key, "all"):
+            replay_latencies.setdefault(k, []).append(latency)
+            replay_errors[k] = replay_errors.get(k, 0) + (status >= 400)
+
+    span = traces[-1]["ts"] - traces[0]["ts"] if traces else 0.0
+    groups = {}
+    for key, group_traces in sorted(recorded.items(), key=lambda item: -len(item[1])):
+        groups[key] = {
+            "recorded": summarize(sorted(t["ms"] / 1000 for t in group_traces),
+                                  sum(t["s"] >= 400 for t in group_traces), span),
+            "replayed": summarize(sorted(replay_latencies.get(key, [])), replay_errors.get(key, 0),
+                                  replayed["elapsed"]),
+        }
+    return groups
+
+
+def print_comparison(groups: Dict[str, Any]):
+    print(f"\n{'group':<52} {'n':>6}  {'recorded p50/p95/p99 ms':>26}  {'replayed p50/p95/p99 ms':>26}  "
+          f"{'p95':>7}  errors")
+    for key, g in groups.items():
+        rec, rep = g["recorded"], g["replayed"]
+        ratio = f"{rep['p95_ms'] / rec['p95_ms']:.2f}x" if rec["p95_ms"] else "-"
+        print(f"{key[:52]:<52} {rec['requests']:>6}  "
+              f"{rec['p50_ms']:>8.1f}/{rec['p95_ms']:>8.1f}/{rec['p99_ms']:>8.1f}  "
+              f"{rep['p50_ms']:>8.1f}/{rep['p95_ms']:>8.1f}/{rep['p99_ms']:>8.1f}  "
+              f"{ratio:>7}  {rec['errors']}->{rep['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latency distributions")
+    parser.add_argument("traces", help="trace file written by traffic_capture.py")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 replays at the recorded pace, 10 ten times faster, 0 back to back")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="clients for --speed 0; size of the HTTP client thread pool")
+    parser.add_argument("--routes", default="", help="comma-separated substrings selecting routes")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N traces")
+    parser.add_argument("--modes", default="in_process", help="in_process and/or http")
+    parser.add_argument("--url", help="replay against a running server instead (its LLM is what it is)")
+    parser.add_argument("--database-url", help="database for the replayed app; by default a seeded SQLite file")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "warehouse_replay.db"))
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding when the database file exists")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--http-port", type=int, default=8766)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="write the comparison JSON here")
+    args = parser.parse_args()
+
+    traces = load_traces(args.traces, [r.strip() for r in args.routes.split(",") if r.strip()], args.limit)
+    if not traces:
+        sys.exit(f"❌ No traces to replay in {args.traces}")
+    span = traces[-1]["ts"] - traces[0]["ts"]
+    print(f"📼 {len(traces)} traces over {span:.1f}s, replaying "
+          + (f"at {args.speed:g}x ({span / args.speed:.1f}s)" if args.speed else f"back to back, c={args.concurrency}"))
+
+    output: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "traces": args.traces,
+            "requests": len(traces),
+            "recorded_seconds": round(span, 3),
+            "speed": args.speed,
+            "llm_latency_ms": None if args.url else args.llm_latency_ms,
+        },
+        "results": {},
+    }
+
+    def report(mode: str, replayed: Dict[str, Any]):
+        groups = compare(traces, replayed)
+        lags = sorted(replayed["lags"])
+        output["results"][mode] = {
+            "elapsed_seconds": round(replayed["elapsed"], 3),
+            "schedule_lag_p99_ms": round(lags[int(0.99 * (len(lags) - 1))] * 1000, 2) if lags else None,
+            "groups": groups,
+        }
+        print(f"\n{mode}: replayed in {replayed['elapsed']:.1f}s"
+              + (f", p99 start lag {output['results'][mode]['schedule_lag_p99_ms']}ms" if lags else ""))
+        print_comparison(groups)
+
+    if args.url:
+        async def against_url():
+            return await replay(HttpDriver(args.url, args.concurrency), traces, args.speed, args.concurrency)
+        report("url", asyncio.run(against_url()))
+    else:
+        stub = start_stub_llm(latency_ms=args.llm_latency_ms)
+        os.environ["LLM_PROVIDERS"] = provider_config(stub)
+        os.environ["TRAFFIC_CAPTURE_ENABLED"] = "0"
+        os.environ["TRUST_FORWARDED_FOR"] = "1"
+        if args.database_url:
+            os.environ["DATABASE_URL"] = args.database_url
+        else:
+            os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+        os.environ["SHARED_CACHE_PATH"] = os.path.splitext(args.db)[0] + "_cache.db"
+        # The replay starts with no stored LLM answers, like the first start of a deploy
+        store = os.path.splitext(args.db)[0] + "_completions.db"
+        os.environ["COMPLETION_STORE_PATH"] = store
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(store + suffix):
+                os.remove(store + suffix)
+        sys.path.insert(0, BACKEND_DIR)
+
+        import database_service
+        if not args.database_url and not (os.path.exists(args.db) and args.reuse_db):
+            from data_generator import generate
+            generate(database_service.engine, args.products, 1, args.orders, args.seed, reset=True)
+
+        if "in_process" in args.modes:
+            from main import app
+
+            async def in_process():
+                async with AsgiLifespan(app):
+                    return await replay(AsgiDriver(app), traces, args.speed, args.concurrency)
+            report("in_process", asyncio.run(in_process()))
+
+        if "http" in args.modes:
+            server = start_http_server(dict(os.environ), args.http_port, args.workers)
+            try:
+                driver = HttpDriver(f"http://127.0.0.1:{args.http_port}", args.concurrency)
+                report("http", asyncio.run(replay(driver, traces, args.speed, args.concurrency)))
+            finally:
+                server.terminate()
+                server.wait()
+        stub.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
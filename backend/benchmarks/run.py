@@ -0,0 +1,348 @@
+"""
+Backend load-testing and benchmark suite
+Seeds SQLite at a chosen scale, drives every endpoint in-process (ASGI) and over HTTP (uvicorn) at several
+concurrency levels against a stub LLM, and reports p50/p95/p99 latency and throughput.
+
+    python -m benchmarks.run --products 100000 --orders 100000 --concurrency 1,16,64 --output results.json
+    python -m benchmarks.run --baseline results.json     # exit code 1 on regression
+    python -m benchmarks.run --modes http --workers 1,2,4 --concurrency 64   # throughput per worker count
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.stub_llm import start_stub_llm, provider_config
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (method, path factory, JSON body)
+Scenario = Tuple[str, Callable[[random.Random, int], str], Optional[Dict[str, Any]]]
+SCENARIOS: Dict[str, Scenario] = {
+    "GET /": ("GET", lambda rng, n: "/", None),
+    "GET /health": ("GET", lambda rng, n: "/health", None),
+    "GET /warehouse/stats": ("GET", lambda rng, n: "/warehouse/stats", None),
+    "GET /warehouse/low-stock": ("GET", lambda rng, n: "/warehouse/low-stock", None),
+    "GET /warehouse/products": ("GET", lambda rng, n: "/warehouse/products", None),
+    "GET /warehouse/shipments": ("GET", lambda rng, n: "/warehouse/shipments", None),
+    "GET /warehouse/product/{id}": ("GET", lambda rng, n: f"/warehouse/product/{rng.randint(1, max(1, n))}", None),
+    "GET /warehouse/products/batch": ("GET", lambda rng, n: "/warehouse/products/batch?ids=" + ",".join(
+        str(rng.randint(1, max(1, n))) for _ in range(50)), None),
+    "GET /warehouse/analytics/orders": ("GET", lambda rng, n: "/warehouse/analytics/orders?bucket=day", None),
+    "POST /chat": ("POST", lambda rng, n: "/chat", {"message": "What products are running low on stock?"}),
+    "POST /warehouse/query": ("POST", lambda rng, n: "/warehouse/query", {"query": "Tell me about our best categories"}),
+}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round((latencies[-1] if latencies else 0) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+# In-process driver: talks ASGI directly to the app, no sockets involved
+async def asgi_request(app, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> int:
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    request_sent = False
+    response_done = asyncio.Event()
+    status = 0
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+class AsgiLifespan:
+    """Runs the app's startup/shutdown events around an in-process benchmark"""
+
+    def __init__(self, app):
+        self.app = app
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.started = asyncio.Event()
+        self.stopped = asyncio.Event()
+
+    async def _receive(self):
+        return await self.queue.get()
+
+    async def _send(self, message):
+        if message["type"].startswith("lifespan.startup"):
+            self.started.set()
+        elif message["type"].startswith("lifespan.shutdown"):
+            self.stopped.set()
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, self._receive, self._send))
+        await self.queue.put({"type": "lifespan.startup"})
+        await self.started.wait()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.queue.put({"type": "lifespan.shutdown"})
+        await self.stopped.wait()
+        await self.task
+
+
+async def run_in_process(app, scenario: Scenario, concurrency: int, total: int, products: int, seed: int) -> Dict[str, float]:
+    method, make_path, body = scenario
+    rng = random.Random(seed)
+    remaining = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) < total:
+            path = make_path(rng, products)
+            started = time.perf_counter()
+            try:
+                status = await asgi_request(app, method, path, body)
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# HTTP driver: a real uvicorn process and a pool of client threads
+def start_http_server(env: Dict[str, str], port: int, workers: int = 1) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("uvicorn did not start within 60s")
+
+
+def run_http(base_url: str, scenario: Scenario, concurrency: int, total: int, products: int, seed: int) -> Dict[str, float]:
+    method, make_path, body = scenario
+    rng = random.Random(seed)
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = [0]
+
+    def worker():
+        session = requests.Session()
+        while next(counter) < total:
+            with lock:
+                path = make_path(rng, products)
+            started = time.perf_counter()
+            try:
+                status = session.request(method, base_url + path, json=body, timeout=60).status_code
+            except requests.RequestException:
+                status = 599
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions where p95 grew or throughput dropped by more than the tolerance"""
+    regressions = []
+    for mode, scenarios in results["results"].items():
+        for name, levels in scenarios.items():
+            for level, current in levels.items():
+                previous = baseline.get("results", {}).get(mode, {}).get(name, {}).get(level)
+                if not previous:
+                    continue
+                if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                    regressions.append(f"{mode} {name} c={level}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+                if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+                    regressions.append(f"{mode} {name} c={level}: {previous['rps']} -> {current['rps']} req/s")
+    return regressions
+
+
+def print_table(mode: str, name: str, level: int, summary: Dict[str, float]):
+    print(f"{mode:<10} {name:<34} c={level:<4} p50={summary['p50_ms']:>8.2f}ms p95={summary['p95_ms']:>8.2f}ms "
+          f"p99={summary['p99_ms']:>8.2f}ms {summary['rps']:>8.1f} req/s errors={summary['errors']}")
+
+
+def print_scaling(results: Dict[str, Any], worker_counts: List[int], level: int):
+    """Throughput at the highest concurrency level per worker count, relative to the first count"""
+    modes = ["http" if w == 1 else f"http_w{w}" for w in worker_counts]
+    print(f"\nThroughput scaling at c={level} (req/s, speedup vs {worker_counts[0]} worker(s)):")
+    for name in results["results"].get(modes[0], {}):
+        base = results["results"][modes[0]][name][str(level)]["rps"]
+        cells = []
+        for workers, mode in zip(worker_counts, modes):
+            rps = results["results"][mode][name][str(level)]["rps"]
+            cells.append(f"w={workers}: {rps:>8.1f} ({rps / base if base else 0:.2f}x)")
+        print(f"  {name:<34} " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the warehouse backend")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--warehouses", type=int, default=1, help="warehouse_products rows per product")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "warehouse_bench.db"))
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding when the database file exists")
+    parser.add_argument("--modes", default="in_process,http")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--endpoints", default="", help="comma-separated substrings selecting scenarios")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--http-port", type=int, default=8765)
+    parser.add_argument("--workers", default="1", help="comma-separated uvicorn worker counts for the http mode")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a previous results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    filters = [f.strip() for f in args.endpoints.split(",") if f.strip()]
+    scenarios = {name: s for name, s in SCENARIOS.items() if not filters or any(f in name for f in filters)}
+
+    stub = start_stub_llm(latency_ms=args.llm_latency_ms)
+    seeded = os.path.exists(args.db) and args.reuse_db
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    os.environ["LLM_PROVIDERS"] = provider_config(stub)
+    os.environ["SHARED_CACHE_PATH"] = os.path.splitext(args.db)[0] + "_cache.db"
+    # Every run starts with no stored LLM answers, like the first start of a deploy
+    store = os.path.splitext(args.db)[0] + "_completions.db"
+    os.environ["COMPLETION_STORE_PATH"] = store
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(store + suffix):
+            os.remove(store + suffix)
+    sys.path.insert(0, BACKEND_DIR)
+
+    import database_service
+    if not seeded:
+        from data_generator import generate
+        generate(database_service.engine, args.products, args.warehouses, args.orders, args.seed, reset=True)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "products": args.products,
+            "orders": args.orders,
+            "warehouses": args.warehouses,
+            "requests": args.requests,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "results": {},
+    }
+
+    if "in_process" in args.modes:
+        from main import app
+
+        async def in_process():
+            async with AsgiLifespan(app):
+                for name, scenario in scenarios.items():
+                    for level in levels:
+                        summary = await run_in_process(app, scenario, level, args.requests, args.products, args.seed)
+                        results["results"].setdefault("in_process", {}).setdefault(name, {})[str(level)] = summary
+                        print_table("in_process", name, level, summary)
+
+        asyncio.run(in_process())
+
+    if "http" in args.modes:
+        worker_counts = [int(w) for w in args.workers.split(",")]
+        for workers in worker_counts:
+            mode = "http" if workers == 1 else f"http_w{workers}"
+            server = start_http_server(dict(os.environ), args.http_port, workers)
+            try:
+                for name, scenario in scenarios.items():
+                    for level in levels:
+                        summary = run_http(f"http://127.0.0.1:{args.http_port}", scenario, level, args.requests, args.products, args.seed)
+                        results["results"].setdefault(mode, {}).setdefault(name, {})[str(level)] = summary
+                        print_table(mode, name, level, summary)
+            finally:
+                server.terminate()
+                server.wait()
+        if len(worker_counts) > 1:
+            print_scaling(results, worker_counts, max(levels))
+
+    stub.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+SQLite concurrency benchmark: read throughput while writes are in progress
+Seeds a SQLite file, then for each profile (the bare rollback-journal engine the fallback used to create, and the
+tuned WAL profile from sqlite_tuning.py) runs reader threads alone and then alongside a writer committing small
+stock updates back to back. Reports reads/s, read latency percentiles and errors ("database is locked"), plus
+the writer's commit rate.
+
+    python -m benchmarks.sqlite_concurrency --products 20000 --readers 8 --seconds 10 --output sqlite.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.run import summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (weight, statement, parameters from rng and the number of products)
+READS = [
+    (6, "SELECT id, name, price, status, updated_at FROM products WHERE id = :id",
+     lambda rng, n: {"id": rng.randint(1, n)}),
+    (3, "SELECT p.id, p.name, SUM(wp.quantity) AS stock FROM products p "
+        "JOIN warehouse_products wp ON wp.product_id = p.id WHERE p.id BETWEEN :low AND :high GROUP BY p.id, p.name",
+     lambda rng, n: (lambda low: {"low": low, "high": low + 50})(rng.randint(1, n))),
+    (1, "SELECT COUNT(*) FROM warehouse_products WHERE quantity <= :quantity",
+     lambda rng, n: {"quantity": rng.randint(0, 20)}),
+]
+WRITE = "UPDATE warehouse_products SET quantity = quantity + 1, updated_at = CURRENT_TIMESTAMP WHERE id = :id"
+
+
+def default_engine(url: str):
+    """The engine the SQLite fallback created before the tuned profile: rollback journal, default pool"""
+    with sqlite3.connect(url[len("sqlite:///"):]) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def tuned_engine(url: str):
+    import sqlite_tuning
+    return sqlite_tuning.tune_engine(create_engine(url, **sqlite_tuning.engine_args(url)))
+
+
+PROFILES: Dict[str, Callable[[str], Any]] = {"default": default_engine, "tuned": tuned_engine}
+
+
+def reader(engine, products: int, seed: int, stop: threading.Event, latencies: List[float], errors: List[int]):
+    rng = random.Random(seed)
+    statements = [(text(sql), params) for weight, sql, params in READS for _ in range(weight)]
+    while not stop.is_set():
+        statement, params = rng.choice(statements)
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(statement, params(rng, products)).fetchall()
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors[0] += 1
+
+
+def writer(engine, stock_rows: int, rows_per_commit: int, stop: threading.Event, latencies: List[float],
+           errors: List[int]):
+    rng = random.Random(0)
+    statement = text(WRITE)
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(statement, [{"id": rng.randint(1, stock_rows)} for _ in range(rows_per_commit)])
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors[0] += 1
+
+
+def run_phase(engine, args, products: int, stock_rows: int, with_writer: bool) -> Dict[str, Any]:
+    stop = threading.Event()
+    read_latencies: List[List[float]] = [[] for _ in range(args.readers)]
+    read_errors = [0]
+    write_latencies: List[float] = []
+    write_errors = [0]
+    threads = [threading.Thread(target=reader, args=(engine, products, i, stop, read_latencies[i], read_errors))
+               for i in range(args.readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer, args=(engine, stock_rows, args.rows_per_commit, stop,
+                                                             write_latencies, write_errors)))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = {"reads": summarize([ms for samples in read_latencies for ms in samples], read_errors[0], elapsed)}
+    if with_writer:
+        result["writes"] = summarize(write_latencies, write_errors[0], elapsed)
+    return result
+
+
+def print_results(name: str, results: Dict[str, Any]):
+    print(f"\n{name}")
+    for phase, result in results.items():
+        for kind, r in result.items():
+            print(f"  {phase:<12} {kind:<6} {r['rps']:>9.1f}/s  p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  "
+                  f"p99 {r['p99_ms']:>8.2f}ms  max {r['max_ms']:>8.2f}ms  errors {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite read throughput with and without a concurrent writer")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "warehouse_sqlite_bench.db"))
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding when the database file exists")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows-per-commit", type=int, default=20)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    seeded = os.path.exists(args.db) and args.reuse_db
+    url = f"sqlite:///{args.db}"
+    os.environ["DATABASE_URL"] = url
+    os.environ["SHARED_CACHE_PATH"] = os.path.splitext(args.db)[0] + "_cache.db"
+    sys.path.insert(0, BACKEND_DIR)
+
+    import database_service
+    if not seeded:
+        from data_generator import generate
+        generate(database_service.engine, args.products, 1, 100, args.seed, reset=True)
+    with database_service.engine.connect() as conn:
+        products = conn.execute(text("SELECT MAX(id) FROM products")).scalar()
+        stock_rows = conn.execute(text("SELECT MAX(id) FROM warehouse_products")).scalar()
+    # Switching journal modes needs the file to itself
+    database_service.engine.dispose()
+
+    results = {}
+    for name in args.profiles.split(","):
+        engine = PROFILES[name](url)
+        results[name] = {
+            "reads_only": run_phase(engine, args, products, stock_rows, with_writer=False),
+            "with_writer": run_phase(engine, args, products, stock_rows, with_writer=True),
+        }
+        engine.dispose()
+        print_results(name, results[name])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"products": products, "readers": args.readers, "seconds": args.seconds,
+                       "results": results}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
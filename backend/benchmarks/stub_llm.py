@@ -0,0 +1,73 @@
+"""
+Stub OpenAI-compatible LLM server for benchmarks
+Answers /chat/completions with a canned reply after a configurable delay, so load tests never call a real model
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        prompt_tokens = sum(math.ceil(len(m.get("content", "")) / 4) for m in payload.get("messages", []))
+        body = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "This is a stub LLM reply."}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 7, "total_tokens": prompt_tokens + 7}
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_llm(port: int = 0, latency_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub server on a background thread; port 0 picks a free port (see server.server_port)"""
+    handler = type("StubLLMHandler", (StubLLMHandler,), {"latency_ms": latency_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def provider_config(server: ThreadingHTTPServer) -> str:
+    """LLM_PROVIDERS value pointing the backend at a running stub server"""
+    return json.dumps([{
+        "name": "stub",
+        "base_url": f"http://127.0.0.1:{server.server_port}/v1",
+        "model": "stub-model"
+    }])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible LLM server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    server = start_stub_llm(args.port, args.latency_ms)
+    print(f"🤖 Stub LLM listening on http://127.0.0.1:{server.server_port}/v1 ({args.latency_ms:.0f} ms per reply)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,237 @@
+"""
+Server-side chat sessions with bounded history
+This module keeps each conversation's recent turns in a ring buffer capped by tokens, folds older turns into a
+short rolling summary so prompt size stays constant, and evicts idle or least recently used sessions
+"""
+
+import collections
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from context_builder import estimate_tokens
+from nlu_processor import QueryIntent
+from shared_cache import shared_cache
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Verbatim turns kept per session, by count and by estimated tokens; older turns go into the summary
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "12"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "600"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "150"))
+# Sessions unused for this long are dropped
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+# Limits for the whole store; the least recently used sessions go first
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+# A single message is cut to this many characters (and to the history budget) before it is stored
+MAX_STORED_MESSAGE_CHARS = 2000
+# Each folded turn contributes one line of at most this many characters to the summary
+SUMMARY_LINE_CHARS = 120
+# Rough per-session overhead (objects, dict slots) on top of the stored text
+SESSION_OVERHEAD_BYTES = 1024
+
+
+class ChatSession:
+    """One conversation: a token-capped ring buffer of recent turns plus a summary of the older ones"""
+
+    __slots__ = ("id", "turns", "history_tokens", "summary", "summary_tokens", "last_intent", "last_entities",
+                 "revision", "last_seen", "size", "accounted", "lock")
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.turns: Deque[Tuple[str, str, int]] = collections.deque()
+        self.history_tokens = 0
+        self.summary: Deque[str] = collections.deque()
+        self.summary_tokens = 0
+        self.last_intent: Optional[str] = None
+        self.last_entities: Dict[str, Any] = {}
+        self.revision = 0
+        self.last_seen = time.time()
+        self.size = SESSION_OVERHEAD_BYTES
+        # The size the store last counted for this session
+        self.accounted = 0
+        # Held for a whole turn (SessionStore.checkout), so concurrent messages do not interleave
+        self.lock = threading.Lock()
+
+    def append(self, role: str, content: str):
+        content = content[:min(MAX_STORED_MESSAGE_CHARS, SESSION_HISTORY_TOKENS * 4)]
+        tokens = estimate_tokens(content)
+        self.turns.append((role, content, tokens))
+        self.history_tokens += tokens
+        self.size += len(content)
+        while len(self.turns) > SESSION_MAX_TURNS or self.history_tokens > SESSION_HISTORY_TOKENS:
+            self._fold(*self.turns.popleft())
+        self.revision += 1
+
+    def _fold(self, role: str, content: str, tokens: int):
+        """Move the oldest turn into the summary, dropping the oldest summary lines beyond its budget"""
+        self.history_tokens -= tokens
+        self.size -= len(content)
+        text = " ".join(content.split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 3] + "..."
+        line = f"{'User' if role == 'user' else 'Assistant'}: {text}"
+        self.summary.append(line)
+        self.summary_tokens += estimate_tokens(line) + 1
+        self.size += len(line)
+        while self.summary_tokens > SESSION_SUMMARY_TOKENS and len(self.summary) > 1:
+            dropped = self.summary.popleft()
+            self.summary_tokens -= estimate_tokens(dropped) + 1
+            self.size -= len(dropped)
+
+    def resolve_followup(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Carry the previous turn's intent into a follow-up the NLU cannot classify on its own ("and what about
+        cheese?", whose intent is at best inferred from the entity it names). The follow-up's own entities
+        replace the previous ones; without any, the previous ones carry over.
+        """
+        vague = analysis["intent"] == QueryIntent.UNKNOWN or analysis.get("intent_inferred")
+        if vague and self.last_intent:
+            analysis["intent"] = QueryIntent(self.last_intent)
+            analysis["entities"] = analysis["entities"] or dict(self.last_entities)
+            analysis["followup"] = True
+        self.last_intent = analysis["intent"].value
+        self.last_entities = dict(analysis["entities"])
+        return analysis
+
+    def prompt_messages(self) -> List[Dict[str, str]]:
+        """History to place between the system prompt and the new user message"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": "Earlier in this conversation:\n" + "\n".join(self.summary)})
+        messages.extend({"role": role, "content": content} for role, content, _ in self.turns)
+        return messages
+
+    def prompt_tokens(self) -> int:
+        return self.history_tokens + (self.summary_tokens + 6 if self.summary else 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": [[role, content] for role, content, _ in self.turns],
+            "summary": list(self.summary),
+            "last_intent": self.last_intent,
+            "last_entities": self.last_entities,
+            "revision": self.revision,
+        }
+
+    @classmethod
+    def from_dict(cls, session_id: str, data: Dict[str, Any]) -> "ChatSession":
+        session = cls(session_id)
+        for role, content in data["turns"]:
+            tokens = estimate_tokens(content)
+            session.turns.append((role, content, tokens))
+            session.history_tokens += tokens
+            session.size += len(content)
+        for line in data["summary"]:
+            session.summary.append(line)
+            session.summary_tokens += estimate_tokens(line) + 1
+            session.size += len(line)
+        session.last_intent = data["last_intent"]
+        session.last_entities = data["last_entities"]
+        session.revision = data["revision"]
+        return session
+
+
+class SessionStore:
+    """
+    Sessions in an LRU order, bounded by count, total size and idle time. With a shared cache every change
+    is also written through, so a session continues on whichever worker serves the next message.
+    """
+
+    def __init__(self, cache=None, max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES,
+                 idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.cache = cache
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._sessions: "collections.OrderedDict[str, ChatSession]" = collections.OrderedDict()
+        self._bytes = 0
+        self.evicted = 0
+
+    def _add(self, session: ChatSession):
+        self._sessions[session.id] = session
+        session.accounted = session.size
+        self._bytes += session.size
+
+    def _remove(self, session_id: str) -> Optional[ChatSession]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.accounted
+        return session
+
+    def _evict(self, now: float):
+        """Idle sessions sit at the LRU end, so the scan stops at the first recent one within the limits"""
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if (now - oldest.last_seen < self.idle_seconds and len(self._sessions) <= self.max_sessions
+                    and self._bytes <= self.max_bytes):
+                break
+            self._remove(oldest.id)
+            self.evicted += 1
+
+    def get(self, session_id: Optional[str] = None) -> ChatSession:
+        """The session with this ID, or a new one (with a fresh ID) if it is unknown or expired"""
+        remote = self.cache.get(f"session:{session_id}") if session_id and self.cache is not None else None
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if remote is not None and (session is None or remote["revision"] > session.revision):
+                self._remove(session_id)
+                session = ChatSession.from_dict(session_id, remote)
+                self._add(session)
+            if session is None or now - session.last_seen >= self.idle_seconds:
+                session = ChatSession(secrets.token_urlsafe(16))
+                self._add(session)
+            session.last_seen = now
+            self._sessions.move_to_end(session.id)
+            self._evict(now)
+            return session
+
+    @contextmanager
+    def checkout(self, session_id: Optional[str] = None) -> Iterator[ChatSession]:
+        """
+        The session, as get() returns it, held by this caller until the block ends and then saved. A second
+        message to the same conversation waits for the first one's reply, so it sees that turn in its history.
+        """
+        session = self.get(session_id)
+        with session.lock:
+            yield session
+            self.save(session)
+
+    def save(self, session: ChatSession):
+        """Account for the session's new size and, with a shared cache, publish it"""
+        with self._lock:
+            if self._sessions.get(session.id) is session:
+                self._bytes += session.size - session.accounted
+                session.accounted = session.size
+                self._evict(time.time())
+        if self.cache is not None:
+            self.cache.set(f"session:{session.id}", session.to_dict(), self.idle_seconds)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._remove(session_id) is not None
+        if self.cache is not None:
+            self.cache.delete(f"session:{session_id}")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evicted": self.evicted,
+            }
+
+
+# Global session store instance
+session_store = SessionStore(cache=shared_cache)
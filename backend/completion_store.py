@@ -0,0 +1,220 @@
+"""
+Persistent LLM completion store
+This module keeps LLM answers in a SQLite file keyed by model, prompt hash and data version, so restarts and
+deploys do not start from an empty cache. Lookups are indexed point queries (nothing is loaded at startup), the
+file is kept under a size limit by evicting the least recently used answers (use is counted in memory and
+written in batches, so a hit is a single read), and the questions asked are counted by detected intent so
+the most frequent ones can be answered ahead of time after a restart.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+COMPLETION_STORE_ENABLED = os.getenv("COMPLETION_STORE_ENABLED", "1") == "1"
+COMPLETION_STORE_PATH = os.getenv("COMPLETION_STORE_PATH", "./completion_store.db")
+COMPLETION_STORE_MAX_MB = float(os.getenv("COMPLETION_STORE_MAX_MB", "64"))
+# Answers unused for this long are dropped whatever the size
+COMPLETION_STORE_MAX_AGE_DAYS = float(os.getenv("COMPLETION_STORE_MAX_AGE_DAYS", "30"))
+# Distinct questions whose counts are kept for the warm-up
+TRACKED_QUESTIONS = 5000
+# Size and age limits are enforced every this many writes
+EVICT_EVERY = 100
+# Hit counts are kept in memory and written in one batch once this many answers have pending hits
+# (the API also flushes them every COMPLETION_HIT_FLUSH_SECONDS)
+HIT_FLUSH_BATCH = 500
+
+
+def normalize_question(question: str) -> str:
+    """
+    The form of a user's question that is both counted and sent to the LLM, so the prompts the warm-up
+    answers hash the same as the ones real askers send
+    """
+    return " ".join(question.split())
+
+
+class CompletionStore:
+    """
+    Answers live in a WAL-mode SQLite file shared by every worker on the host; each thread keeps its own
+    connection. Errors are logged and treated as misses, so a damaged file never fails a request.
+    """
+
+    def __init__(self, path: str = COMPLETION_STORE_PATH, max_bytes: int = int(COMPLETION_STORE_MAX_MB * 1024 * 1024),
+                 max_age: float = COMPLETION_STORE_MAX_AGE_DAYS * 86400, enabled: bool = COMPLETION_STORE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        # Set by the API from the database's change watermark; answers stored under another version are not served
+        self.data_version = ""
+        self._local = threading.local()
+        self._writes = 0
+        self._evict_lock = threading.Lock()
+        # (model, prompt_hash, data_version) -> [hits, last used], written by flush_hits()
+        self._hits: Dict[Tuple[str, str, str], List[float]] = {}
+        self._hits_lock = threading.Lock()
+        if enabled:
+            try:
+                self._create()
+            except sqlite3.Error as e:
+                logger.error(f"Completion store unavailable at {path}: {e}")
+                self.enabled = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _create(self):
+        conn = self._connection()
+        conn.execute("""CREATE TABLE IF NOT EXISTS completions (
+            model TEXT NOT NULL, prompt_hash TEXT NOT NULL, data_version TEXT NOT NULL, value TEXT NOT NULL,
+            size INTEGER NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (model, prompt_hash, data_version))""")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_completions_used_at ON completions (used_at)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS questions (
+            endpoint TEXT NOT NULL, question TEXT NOT NULL, intent TEXT NOT NULL, asked INTEGER NOT NULL,
+            asked_at REAL NOT NULL, PRIMARY KEY (endpoint, question))""")
+
+    def get(self, model: str, prompt_hash: str) -> Optional[Dict[str, Any]]:
+        """The stored answer for this prompt at the current data version"""
+        if not self.enabled:
+            return None
+        key = (model, prompt_hash, self.data_version)
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM completions WHERE model = ? AND prompt_hash = ? AND data_version = ?",
+                               key).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Completion store read failed: {e}")
+            return None
+        with self._hits_lock:
+            pending = self._hits.setdefault(key, [0, 0.0])
+            pending[0] += 1
+            pending[1] = time.time()
+            flush = len(self._hits) >= HIT_FLUSH_BATCH
+        if flush:
+            self.flush_hits()
+        return value
+
+    def flush_hits(self) -> int:
+        """Write the hit counts and last-used times gathered since the previous flush; returns the answers updated"""
+        with self._hits_lock:
+            hits, self._hits = self._hits, {}
+        if not hits or not self.enabled:
+            return 0
+        try:
+            self._connection().executemany(
+                "UPDATE completions SET used_at = MAX(used_at, ?), hits = hits + ? "
+                "WHERE model = ? AND prompt_hash = ? AND data_version = ?",
+                [(used_at, count, *key) for key, (count, used_at) in hits.items()])
+        except sqlite3.Error as e:
+            logger.warning(f"Completion store hit count update failed: {e}")
+            return 0
+        return len(hits)
+
+    def put(self, model: str, prompt_hash: str, value: Dict[str, Any]):
+        if not self.enabled:
+            return
+        encoded = json.dumps(value, default=str)
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO completions (model, prompt_hash, data_version, value, size, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, prompt_hash, self.data_version, encoded, len(encoded) + len(prompt_hash) + len(model), now, now))
+        except sqlite3.Error as e:
+            logger.warning(f"Completion store write failed: {e}")
+            return
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def record_question(self, endpoint: str, question: str, intent: str):
+        """Count a question answered by the LLM, for the warm-up; `question` is the normalize_question() form"""
+        if not self.enabled:
+            return
+        try:
+            self._connection().execute(
+                "INSERT INTO questions (endpoint, question, intent, asked, asked_at) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (endpoint, question) DO UPDATE SET asked = asked + 1, intent = excluded.intent, "
+                "asked_at = excluded.asked_at", (endpoint, question, intent, time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Completion store write failed: {e}")
+
+    def frequent_questions(self, intents: int, per_intent: int) -> List[Tuple[str, str, str]]:
+        """(endpoint, question, intent) for the most asked questions of the most frequent intents"""
+        if not self.enabled:
+            return []
+        conn = self._connection()
+        top_intents = [intent for intent, in conn.execute(
+            "SELECT intent FROM questions GROUP BY intent ORDER BY SUM(asked) DESC LIMIT ?", (intents,))]
+        questions = []
+        for intent in top_intents:
+            questions.extend(conn.execute(
+                "SELECT endpoint, question, intent FROM questions WHERE intent = ? ORDER BY asked DESC, asked_at DESC "
+                "LIMIT ?", (intent, per_intent)).fetchall())
+        return questions
+
+    def evict(self) -> Dict[str, int]:
+        """Drop expired answers, then the least recently used ones until the store is back under 90% of its limit"""
+        if not self.enabled or not self._evict_lock.acquire(blocking=False):
+            return {"expired": 0, "evicted": 0}
+        # Least recently used is judged on up-to-date use times
+        self.flush_hits()
+        try:
+            conn = self._connection()
+            expired = conn.execute("DELETE FROM completions WHERE used_at < ?", (time.time() - self.max_age,)).rowcount
+            conn.execute("DELETE FROM questions WHERE rowid NOT IN "
+                         "(SELECT rowid FROM questions ORDER BY asked DESC, asked_at DESC LIMIT ?)", (TRACKED_QUESTIONS,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                excess = total - int(self.max_bytes * 0.9)
+                victims = []
+                for rowid, size in conn.execute("SELECT rowid, size FROM completions ORDER BY used_at"):
+                    victims.append((rowid,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM completions WHERE rowid = ?", victims)
+                evicted = len(victims)
+                logger.info(f"Completion store over {self.max_bytes} bytes: evicted {evicted} answers")
+            return {"expired": expired, "evicted": evicted}
+        except sqlite3.Error as e:
+            logger.warning(f"Completion store eviction failed: {e}")
+            return {"expired": 0, "evicted": 0}
+        finally:
+            self._evict_lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        try:
+            entries, size, current = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(data_version = ?), 0) FROM completions",
+                (self.data_version,)).fetchone()
+        except sqlite3.Error as e:
+            return {"enabled": True, "error": str(e)}
+        return {"enabled": True, "entries": entries, "current_version_entries": current, "bytes": size,
+                "max_bytes": self.max_bytes, "data_version": self.data_version, "pending_hits": len(self._hits)}
+
+
+# Global completion store instance
+completion_store = CompletionStore()
@@ -0,0 +1,215 @@
+"""
+Token-budgeted context builder for LLM prompts
+This module ranks candidate facts for a query and fills a per-intent token budget from pre-computed snippets
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+from nlu_processor import QueryIntent
+from metrics import cache_requests
+from refresh_scheduler import scheduler
+
+# Prompt budget (in tokens) for the facts section, per detected intent
+INTENT_BUDGETS = {
+    QueryIntent.INVENTORY_STATUS: 300,
+    QueryIntent.LOW_STOCK: 400,
+    QueryIntent.SHIPMENT_STATUS: 150,
+    QueryIntent.PRODUCT_INFO: 200,
+    QueryIntent.WAREHOUSE_STATS: 250,
+    QueryIntent.CATEGORY_QUERY: 300,
+    QueryIntent.REORDER_SUGGESTIONS: 400,
+    QueryIntent.GENERAL_HELP: 50,
+    QueryIntent.UNKNOWN: 150,
+}
+DEFAULT_BUDGET = 150
+
+# Which fact families are worth spending budget on, in priority order
+INTENT_FACTS = {
+    QueryIntent.LOW_STOCK: ["low_stock", "categories"],
+    QueryIntent.REORDER_SUGGESTIONS: ["low_stock", "categories"],
+    QueryIntent.INVENTORY_STATUS: ["categories", "low_stock"],
+    QueryIntent.CATEGORY_QUERY: ["categories"],
+    QueryIntent.WAREHOUSE_STATS: ["categories", "low_stock"],
+    QueryIntent.PRODUCT_INFO: ["categories"],
+}
+
+SNIPPET_TTL = float(os.getenv("CONTEXT_SNIPPET_TTL", "30"))
+
+SYSTEM_HEADER = """You are an AI assistant for a food management system. You have access to real-time data from our food database.
+
+Current System Status:
+- Total Products: {total_products}
+- Low Stock Products: {low_stock_products}
+- Total Inventory Value: €{total_inventory_value:.2f}
+- Product Categories: {category_count}
+- Average Stock Level: {average_stock_level:.1f} units
+
+Query Intent: {intent}
+Detected Entities: {entities}
+
+You should provide helpful, accurate responses about:
+- Food products and inventory management
+- Stock levels and reorder alerts
+- Order status and delivery tracking
+- Product categories and pricing
+- Restaurant/food business operations
+
+Be conversational, helpful, and use the real data provided to give accurate information."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (~4 characters per token for Llama-family tokenizers)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _mentions(query: str, name: str) -> bool:
+    """Whether the lowercase query contains the name as whole words, plural allowed ("cakes", not "pending" for "pen")"""
+    return re.search(rf"(?<!\w){re.escape(name)}(?:s|es)?(?!\w)", query) is not None
+
+
+class Snippet:
+    __slots__ = ("text", "tokens", "key")
+
+    def __init__(self, text: str, key: str = ""):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.key = key
+
+
+class BuiltContext:
+    """A finished system prompt along with its token accounting"""
+
+    def __init__(self, prompt: str, budget: int, facts_included: int, facts_available: int):
+        self.prompt = prompt
+        self.budget = budget
+        self.facts_included = facts_included
+        self.facts_available = facts_available
+
+    def token_report(self, user_message: str = "") -> Dict[str, int]:
+        system_tokens = estimate_tokens(self.prompt)
+        user_tokens = estimate_tokens(user_message)
+        return {
+            "system": system_tokens,
+            "user": user_tokens,
+            "total": system_tokens + user_tokens,
+            "budget": self.budget,
+            "facts_included": self.facts_included,
+            "facts_available": self.facts_available,
+        }
+
+
+class ContextBuilder:
+    def __init__(self, budgets: Optional[Dict[QueryIntent, int]] = None, snippet_ttl: float = SNIPPET_TTL):
+        self.budgets = budgets or INTENT_BUDGETS
+        self.snippet_ttl = snippet_ttl
+        self._lock = threading.Lock()
+        self._snippets: Optional[Dict[str, Any]] = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        """Drop pre-computed snippets so the next build reloads them"""
+        with self._lock:
+            self._snippets = None
+
+    def _load_snippets(self, db_service) -> Dict[str, Any]:
+        """Pre-compute every snippet once per TTL, ranked so the builder only has to take a prefix"""
+        with self._lock:
+            if self._snippets is not None and time.monotonic() - self._built_at < self.snippet_ttl:
+                cache_requests.inc("context_snippets", "hit")
+                return self._snippets
+            cache_requests.inc("context_snippets", "miss")
+
+            # Prefer the scheduler's background snapshots; compute inline only before the first refresh
+            stats = scheduler.value("stats", db_service.get_warehouse_stats)
+            low_stock = scheduler.value("low_stock", db_service.get_low_stock_products)
+
+            # Most severe first: out of stock, then lowest stock relative to its reorder point
+            def severity(item):
+                reorder_point = item['reorder_point'] or 1
+                return (item['current_stock'] > 0, item['current_stock'] / reorder_point, -(reorder_point - item['current_stock']))
+
+            low_stock_snippets = [
+                Snippet(f"- {item['name']}: {item['current_stock']} units (reorder at {item['reorder_point']})\n", str(item['id']))
+                for item in sorted(low_stock, key=severity)
+            ]
+            category_snippets = [
+                Snippet(f"- {name}: {count} products\n", name.lower())
+                for name, count in sorted(stats['categories'].items(), key=lambda kv: -kv[1])
+            ]
+
+            self._snippets = {
+                "stats": stats,
+                "low_stock": low_stock_snippets,
+                "categories": category_snippets,
+            }
+            self._built_at = time.monotonic()
+            return self._snippets
+
+    def _rank_categories(self, snippets: List[Snippet], query_analysis: Dict[str, Any]) -> List[Snippet]:
+        """Put categories mentioned by the query first, keeping the size order for the rest"""
+        query = query_analysis.get('original_query', '').lower()
+        mentioned = {str(v).lower() for v in query_analysis.get('entities', {}).values() if isinstance(v, str)}
+        relevant = [s for s in snippets if s.key in mentioned or (s.key and _mentions(query, s.key))]
+        if not relevant:
+            return snippets
+        return relevant + [s for s in snippets if s not in relevant]
+
+    def build(self, query_analysis: Dict[str, Any], db_service) -> BuiltContext:
+        """Build the system prompt for a query, spending at most the intent's token budget on facts"""
+        intent = query_analysis.get('intent', QueryIntent.UNKNOWN)
+        if not isinstance(intent, QueryIntent):
+            intent = QueryIntent(intent) if intent in QueryIntent._value2member_map_ else QueryIntent.UNKNOWN
+
+        snippets = self._load_snippets(db_service)
+        stats = snippets["stats"]
+        budget = self.budgets.get(intent, DEFAULT_BUDGET)
+
+        parts = [SYSTEM_HEADER.format(
+            total_products=stats['total_products'],
+            low_stock_products=stats['low_stock_products'],
+            total_inventory_value=stats['total_inventory_value'],
+            category_count=len(stats['categories']),
+            average_stock_level=stats['average_stock_level'],
+            intent=intent.value,
+            entities=query_analysis.get('entities', {}),
+        )]
+
+        remaining = budget
+        included = 0
+        available = 0
+        for family in INTENT_FACTS.get(intent, []):
+            candidates = snippets[family]
+            if family == "categories":
+                candidates = self._rank_categories(candidates, query_analysis)
+                title = "\n\nInventory Summary:\n"
+            else:
+                title = f"\n\nCurrent Low Stock Items ({len(candidates)} total, most urgent first):\n"
+            available += len(candidates)
+
+            title_tokens = estimate_tokens(title)
+            if not candidates or remaining <= title_tokens:
+                continue
+
+            section = [title]
+            remaining -= title_tokens
+            for snippet in candidates:
+                if snippet.tokens > remaining:
+                    break
+                section.append(snippet.text)
+                remaining -= snippet.tokens
+                included += 1
+            if len(section) > 1:
+                parts.append("".join(section))
+            else:
+                remaining += title_tokens
+
+        return BuiltContext("".join(parts), budget, included, available)
+
+
+# Global context builder instance
+context_builder = ContextBuilder()
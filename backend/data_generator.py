@@ -0,0 +1,271 @@
+"""
+Synthetic data generator for capacity planning
+Bulk-loads reproducible catalogs, category trees, multi-warehouse stock and order histories at millions of rows
+
+    python data_generator.py --products 1000000 --warehouses 3 --orders 2000000 --reset
+"""
+
+import argparse
+import json
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Any, Optional
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import NullPool
+
+# (name, parent name, brands, nouns, sizes, price range)
+CATALOG = [
+    ("Drinks", None, [], [], [], (1.0, 6.0)),
+    ("hot", "Drinks", ["Lavazza", "Twinings", "Nescafe", "Lipton"], ["Espresso", "Cappuccino", "Green tea", "Hot chocolate", "Latte"], ["250g", "500g", "20 bags", "1kg"], (2.0, 14.0)),
+    ("cold", "Drinks", ["Coca Cola", "Oasis", "Sidi Ali", "Tropicana"], ["Cola", "Orange juice", "Mineral water", "Iced tea", "Lemonade"], ["33cl", "50cl", "1L", "1.5L"], (0.8, 4.5)),
+    ("Cake", None, ["Kasmi", "Patisserie", "Maison"], ["Chocolate cake", "Cheesecake", "Carrot cake", "Tiramisu", "Fruit tart"], ["slice", "6 pers.", "8 pers."], (3.0, 35.0)),
+    ("Dairy", None, ["Centrale", "Jaouda", "President", "Danone"], ["Fresh milk", "Gouda cheese", "Yogurt", "Butter", "Cream"], ["200g", "500g", "1L", "1kg"], (1.0, 12.0)),
+    ("Meat", None, ["Kamini", "Koutoubia", "Atlas"], ["Chicken breast", "Beef sausages", "Turkey slices", "Minced beef", "Lamb chops"], ["250g", "500g", "1kg"], (4.0, 25.0)),
+    ("Bakery", None, ["Kasmi", "Maison", "Boulangerie"], ["Baguette", "Croissant", "Whole wheat bread", "Brioche", "Msemen"], ["1 pc", "4 pcs", "6 pcs"], (0.5, 6.0)),
+    ("Frozen", None, ["Findus", "Koutoubia", "McCain"], ["French fries", "Pizza", "Ice cream", "Fish sticks", "Mixed vegetables"], ["400g", "750g", "1kg", "2.5kg"], (2.5, 18.0)),
+]
+
+ORDER_STATUSES = ["placed", "confirmed", "processing", "delivered", "canceled"]
+ORDER_TYPES = ["delivery", "self_pickup", "pos"]
+ORDER_TYPE_WEIGHTS = [0.6, 0.25, 0.15]
+PAYMENT_METHODS = ["cash_on_delivery", "card", "wallet"]
+# Orders per hour of day, lunch and dinner peaks
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 6, 7, 7, 8, 12, 16, 12, 8, 7, 7, 9, 13, 16, 13, 8, 4, 2]
+
+
+def category_rows() -> List[Dict[str, Any]]:
+    """The category tree, with ids in catalog order"""
+    ids = {name: i + 1 for i, (name, *_) in enumerate(CATALOG)}
+    return [
+        {"id": ids[name], "name": name, "parent_id": ids[parent] if parent else 0, "position": i + 1, "status": True}
+        for i, (name, parent, *_) in enumerate(CATALOG)
+    ]
+
+
+def iter_products(count: int, rng: random.Random, start_id: int = 1) -> Iterator[Dict[str, Any]]:
+    """Product rows; products in a sub-category also list their parent in category_ids"""
+    categories = category_rows()
+    leaves = [(c, spec) for c, spec in zip(categories, CATALOG) if spec[2]]
+    parent_of = {c["id"]: c["parent_id"] for c in categories}
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    randint, random_, choice = rng.randint, rng.random, rng.choice
+
+    for product_id in range(start_id, start_id + count):
+        category, (name, _, brands, nouns, sizes, (low, high)) = choice(leaves)
+        category_ids = [{"id": category["id"], "position": 1}]
+        if parent_of[category["id"]]:
+            category_ids.insert(0, {"id": parent_of[category["id"]], "position": 0})
+        price = round(low + (high - low) * random_() ** 2, 2)
+        yield {
+            "id": product_id,
+            "name": f"{choice(brands)} {choice(nouns)} {choice(sizes)}",
+            "description": f"{name} product",
+            "price": price,
+            "tax": 10,
+            "unit": "pc",
+            "low_stock_limit": randint(5, 50),
+            "category_ids": dumps(category_ids),
+            "popularity_count": int(1000 * random_() ** 4),
+            "is_featured": random_() < 0.02,
+            "status": random_() > 0.01,
+            "is_deleted": random_() < 0.005,
+        }
+
+
+def iter_stock(product_rows: List[Dict[str, Any]], warehouses: int, rng: random.Random, start_id: int = 1) -> Iterator[Dict[str, Any]]:
+    """warehouse_products rows: every product is stocked in every warehouse, about 8% of them below their limit"""
+    randint, random_ = rng.randint, rng.random
+    row_id = start_id
+    for product in product_rows:
+        limit = product["low_stock_limit"]
+        for warehouse_id in range(1, warehouses + 1):
+            quantity = randint(0, limit) if random_() < 0.08 else randint(limit + 1, limit * 20)
+            yield {
+                "id": row_id,
+                "warehouse_id": warehouse_id,
+                "product_id": product["id"],
+                "quantity": quantity,
+                "price": product["price"],
+                "cost_price": round(product["price"] * 0.7, 2),
+                "status": "active",
+            }
+            row_id += 1
+
+
+def iter_orders(count: int, rng: random.Random, days: int = 90, customers: Optional[int] = None,
+                start_id: int = 1, now: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Order history spread over the last `days` days with lunch/dinner peaks; older orders are mostly settled"""
+    now = (now or datetime.now()).replace(microsecond=0)
+    customers = customers or max(1, count // 8)
+    hours = rng.choices(range(24), weights=HOURLY_WEIGHTS, k=min(count, 100000))
+    types = rng.choices(ORDER_TYPES, weights=ORDER_TYPE_WEIGHTS, k=min(count, 100000))
+    randint, random_, choice = rng.randint, rng.random, rng.choice
+
+    for i, order_id in enumerate(range(start_id, start_id + count)):
+        age_days = int(days * random_())
+        created_at = (now - timedelta(days=age_days)).replace(hour=hours[i % len(hours)], minute=randint(0, 59), second=randint(0, 59))
+        if created_at > now:
+            created_at -= timedelta(days=1)
+        if age_days > 2:
+            status = "canceled" if random_() < 0.05 else "delivered"
+        else:
+            status = choice(ORDER_STATUSES)
+        amount = round(5 + 120 * random_() ** 2, 2)
+        yield {
+            "id": order_id,
+            "user_id": randint(1, customers),
+            "order_amount": amount,
+            "total_tax_amount": round(amount * 0.1, 2),
+            "coupon_discount_amount": round(amount * 0.1, 2) if random_() < 0.1 else 0,
+            "extra_discount": 0,
+            "payment_status": "paid" if status == "delivered" else "unpaid",
+            "order_status": status,
+            "order_type": types[i % len(types)],
+            "payment_method": choice(PAYMENT_METHODS),
+            "delivery_charge": 0 if random_() < 0.3 else 2.5,
+            "date": created_at.date(),
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(minutes=randint(0, 90)) if status != "placed" else created_at,
+        }
+
+
+def _batches(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_insert(conn, table, rows: List[Dict[str, Any]]):
+    """
+    executemany with the INSERT compiled once per batch. Rows go to the driver as tuples after only
+    the bind processors their columns need, which skips Core's per-row parameter construction.
+    Scalar column defaults are filled in here; SQL defaults such as func.now() stay in the statement.
+    """
+    compiled = table.insert().compile(dialect=conn.dialect, column_keys=list(rows[0]))
+    getters = []
+    for key in compiled.positiontup:
+        column = table.c[key]
+        process = column.type.bind_processor(conn.dialect)
+        if key in rows[0]:
+            getters.append((key, None, process))
+        else:
+            default = column.default.arg if column.default is not None else None
+            getters.append((None, process(default) if process else default, None))
+
+    params = [
+        tuple(
+            (process(row[key]) if process else row[key]) if key is not None else constant
+            for key, constant, process in getters
+        )
+        for row in rows
+    ]
+    conn.exec_driver_sql(compiled.string, params)
+
+
+@contextmanager
+def _load_connection(engine) -> Iterator[Any]:
+    """
+    One transaction for the whole load. On a SQLite file it runs on a dedicated connection that trades
+    durability for speed (a crashed load is simply re-run); the pragmas end with that connection, so the
+    application's pooled connections keep their settings.
+    """
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        with engine.begin() as conn:
+            yield conn
+        return
+
+    load_engine = create_engine(engine.url, poolclass=NullPool)
+    try:
+        with load_engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.exec_driver_sql("PRAGMA cache_size=-200000")
+            # WAL is a property of the file and needs exclusive access to leave; other modes are per connection
+            if conn.exec_driver_sql("PRAGMA journal_mode").scalar() != "wal":
+                conn.exec_driver_sql("PRAGMA journal_mode=MEMORY")
+            conn.commit()
+            with conn.begin():
+                yield conn
+    finally:
+        load_engine.dispose()
+
+
+def generate(engine, products: int = 1000, warehouses: int = 1, orders: int = 1000, seed: int = 42,
+             days: int = 90, reset: bool = False, batch_size: int = 20000, verbose: bool = True) -> Dict[str, int]:
+    """
+    Generate and insert a dataset with batched Core inserts. The same seed always yields the same rows
+    (order timestamps are relative to today). With reset=True existing rows, and the tables derived from
+    them, are deleted first; otherwise the tables must be empty, since generated rows have fixed IDs.
+    """
+    from database_service import (Base, Category, Product, WarehouseProduct, Order, OrderRollup, RollupState,
+                                  CategoryClosure, ProductCategory)
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    counts = {"categories": 0, "products": 0, "warehouse_products": 0, "orders": 0}
+
+    def log(message):
+        if verbose:
+            print(f"  {message} ({time.perf_counter() - started:.1f}s)")
+
+    with _load_connection(engine) as conn:
+        if reset:
+            for model in (ProductCategory, CategoryClosure, OrderRollup, RollupState, WarehouseProduct, Order,
+                          Product, Category):
+                conn.execute(model.__table__.delete())
+        else:
+            for model in (Category, Product, WarehouseProduct, Order):
+                if conn.execute(select(model.__table__.c.id).limit(1)).first() is not None:
+                    raise ValueError(f"{model.__tablename__} already has rows; use --reset to replace them")
+
+        _bulk_insert(conn, Category.__table__, category_rows())
+        counts["categories"] = len(CATALOG)
+
+        for batch in _batches(iter_products(products, rng), batch_size):
+            _bulk_insert(conn, Product.__table__, batch)
+            stock = list(iter_stock(batch, warehouses, rng, counts["warehouse_products"] + 1))
+            _bulk_insert(conn, WarehouseProduct.__table__, stock)
+            counts["products"] += len(batch)
+            counts["warehouse_products"] += len(stock)
+        log(f"{counts['products']} products, {counts['warehouse_products']} stock rows")
+
+        for batch in _batches(iter_orders(orders, rng, days), batch_size):
+            _bulk_insert(conn, Order.__table__, batch)
+            counts["orders"] += len(batch)
+        log(f"{counts['orders']} orders")
+
+    if verbose:
+        total = sum(counts.values())
+        elapsed = time.perf_counter() - started
+        print(f"✅ Generated {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic warehouse data")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--warehouses", type=int, default=1, help="stock rows per product")
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=90, help="length of the order history")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--reset", action="store_true", help="delete existing catalog, stock and orders first")
+    args = parser.parse_args()
+
+    from database_service import engine
+    try:
+        generate(engine, args.products, args.warehouses, args.orders, args.seed, args.days, args.reset, args.batch_size)
+    except ValueError as e:
+        parser.exit(1, f"❌ {e}\n")
+
+
+if __name__ == "__main__":
+    main()
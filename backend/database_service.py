@@ -1,12 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, DECIMAL, Text, DateTime, Boolean, BigInteger, Date, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, DECIMAL, Text, DateTime, Boolean, BigInteger, Date, ForeignKey, Index, and_, or_, case
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from sqlalchemy.sql import func
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+import base64
+import heapq
+import json
 import os
 from dotenv import load_dotenv
+from single_flight import coalesced
+from metrics import instrument_methods, instrument_engine, pool_gauges
+from replica_router import ReplicaRouter, DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SECONDS
+from product_cache import product_cache
+from sqlite_tuning import engine_args, tune_engine
 
 load_dotenv()
 
@@ -17,18 +26,35 @@ DATABASE_URL = os.getenv(
 )
 
 # Try to create engine with error handling
+using_fallback = False
 try:
-    engine = create_engine(DATABASE_URL, echo=False)
+    engine = tune_engine(create_engine(DATABASE_URL, echo=False, **engine_args(DATABASE_URL)))
     # Test the connection
     test_conn = engine.connect()
     test_conn.close()
-    print("✅ Connected to MySQL database")
+    print(f"✅ Connected to {engine.dialect.name} database")
 except Exception as e:
     print(f"⚠️ MySQL connection failed: {e}")
     print("🔄 Falling back to SQLite database...")
+    using_fallback = True
     DATABASE_URL = "sqlite:///./food_management.db"
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, echo=False)
+    engine = tune_engine(create_engine(DATABASE_URL, echo=False, **engine_args(DATABASE_URL)))
+
+# Read replicas, only alongside the configured primary (not the SQLite fallback)
+replica_engines = []
+if DATABASE_REPLICA_URLS and not using_fallback:
+    replica_engines = [tune_engine(create_engine(url, echo=False, **engine_args(url))) for url in DATABASE_REPLICA_URLS]
+    print(f"📚 Routing reads to {len(replica_engines)} replica(s) within {REPLICA_MAX_LAG_SECONDS:g}s of the primary")
+elif DATABASE_REPLICA_URLS:
+    print("⚠️ Ignoring DATABASE_REPLICA_URLS: the primary is the SQLite fallback")
+
+# Workers forked from a preloaded app (gunicorn --preload) must not reuse the parent's pooled connections
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: [e.dispose(close=False) for e in [engine] + replica_engines])
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessions for read-only methods, bound per service to a replica or the primary
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
 # Database Models
@@ -91,7 +117,7 @@ class WarehouseProduct(Base):
     
     id = Column(BigInteger, primary_key=True, index=True)
     warehouse_id = Column(BigInteger, nullable=False)
-    product_id = Column(BigInteger, ForeignKey('products.id'), nullable=False)
+    product_id = Column(BigInteger, ForeignKey('products.id'), nullable=False, index=True)
     quantity = Column(Integer, nullable=False, default=0)
     price = Column(DECIMAL(10, 2), nullable=False)
     cost_price = Column(DECIMAL(10, 2), nullable=False)
@@ -135,12 +161,160 @@ class Order(Base):
     free_delivery_amount = Column(DECIMAL(8, 2), default=0)
     weight_charge_amount = Column(DECIMAL(8, 2), nullable=False, default=0)
 
+# Analytics models (owned by this service, not by the ERP schema)
+class OrderRollup(Base):
+    __tablename__ = "order_rollups"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, nullable=False)
+    order_status = Column(String(255), nullable=False)
+    order_type = Column(String(255), nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    tax = Column(DECIMAL(14, 2), nullable=False, default=0)
+    discounts = Column(DECIMAL(14, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_order_rollups_bucket", "bucket_start", "order_status", "order_type", unique=True),
+    )
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+    
+    name = Column(String(64), primary_key=True)
+    high_water_mark = Column(DateTime)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class ReplicaHeartbeat(Base):
+    __tablename__ = "replica_heartbeat"
+    
+    name = Column(String(64), primary_key=True)
+    beat_at = Column(DateTime, nullable=False)
+
+class CategoryClosure(Base):
+    """Every (ancestor, descendant) pair of the category tree, including each category with itself at depth 0"""
+    __tablename__ = "category_closure"
+    
+    ancestor_id = Column(BigInteger, primary_key=True)
+    descendant_id = Column(BigInteger, primary_key=True)
+    depth = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_category_closure_descendant", "descendant_id", "ancestor_id"),
+    )
+
+class ProductCategory(Base):
+    """Product.category_ids as rows, so products can be joined to categories by index"""
+    __tablename__ = "product_categories"
+    
+    category_id = Column(BigInteger, primary_key=True)
+    product_id = Column(BigInteger, primary_key=True)
+    
+    __table_args__ = (
+        Index("ix_product_categories_product", "product_id"),
+    )
+
+ROLLUP_BUCKETS = ("hour", "day")
+
+def _hour_floor(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+# Tables in the change feed; within one updated_at, rows are ordered by this position, then by ID
+CHANGE_FEED_TABLES = (
+    ("categories", Category),
+    ("products", Product),
+    ("warehouse_products", WarehouseProduct),
+    ("orders", Order),
+)
+# Rows updated within this many seconds of now are held back until a later poll, so a
+# second that is still receiving writes (updated_at may only have second resolution) is never split
+CHANGE_FEED_SETTLE_SECONDS = float(os.getenv("CHANGE_FEED_SETTLE_SECONDS", "2"))
+
+ChangeCursor = Tuple[datetime, int, int]
+
+def encode_change_cursor(cursor: ChangeCursor) -> str:
+    updated_at, position, row_id = cursor
+    raw = f"{updated_at.isoformat()}|{position}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_change_cursor(token: str) -> ChangeCursor:
+    """Raises ValueError for a cursor this service did not issue"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        updated_at, position, row_id = raw.split("|")
+        return datetime.fromisoformat(updated_at), int(position), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid change cursor: {token!r}")
+
+def _feed_time(column):
+    """
+    The feed orders rows by updated_at at second resolution. SQLite stores DATETIME as text, with or
+    without microseconds depending on the writer, so it is normalized before comparing.
+    """
+    return func.strftime("%Y-%m-%d %H:%M:%S", column) if engine.dialect.name == "sqlite" else column
+
+def _feed_param(value: datetime):
+    value = value.replace(microsecond=0)
+    return value.strftime("%Y-%m-%d %H:%M:%S") if engine.dialect.name == "sqlite" else value
+
+# IDs per IN (...) list, below SQLite's default limit on bound parameters
+IN_CHUNK_SIZE = 500
+
+def _category_ids(raw: Optional[str]) -> List[int]:
+    """IDs from a product's category_ids JSON ([{"id": 1, "position": 0}, ...]; IDs may be strings)"""
+    try:
+        ids = {int(entry["id"]) for entry in json.loads(raw or "[]")}
+    except (ValueError, TypeError, KeyError):
+        return []
+    return sorted(ids)
+
+def _closure_rows(parents: Dict[int, int]) -> List[Dict[str, int]]:
+    """Closure rows for a {category_id: parent_id} tree; a parent that does not exist ends the path, as does a cycle"""
+    rows = []
+    for category_id in parents:
+        ancestor, depth, seen = category_id, 0, set()
+        while ancestor in parents and ancestor not in seen:
+            seen.add(ancestor)
+            rows.append({"ancestor_id": ancestor, "descendant_id": category_id, "depth": depth})
+            ancestor, depth = parents[ancestor], depth + 1
+    return rows
+
+def _row_data(row) -> Dict[str, Any]:
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+def _heartbeat_time(conn) -> Optional[datetime]:
+    """The primary's last heartbeat as seen through a replica connection"""
+    return conn.execute(
+        ReplicaHeartbeat.__table__.select().with_only_columns(ReplicaHeartbeat.beat_at)
+        .where(ReplicaHeartbeat.name == "primary")
+    ).scalar()
+
+replica_router = ReplicaRouter(engine, replica_engines, _heartbeat_time)
+
 # Database service class
 class DatabaseService:
+    """
+    Writes go through `db`, a session on the primary. Read-only methods use `read_db`, bound on first use
+    to a replica within the lag limit (or the primary), so every read of one service sees the same database.
+    """
     def __init__(self):
         self.db = SessionLocal()
+        self._read_db: Optional[Session] = None
+    
+    @property
+    def read_db(self) -> Session:
+        if self._read_db is None:
+            target = replica_router.read_engine()
+            self._read_db = self.db if target is engine else ReadSessionLocal(bind=target)
+        return self._read_db
+    
+    @property
+    def reads_replica(self) -> bool:
+        return self._read_db is not None and self._read_db is not self.db
     
     def close(self):
+        if self.reads_replica:
+            self._read_db.close()
         self.db.close()
     
     def __enter__(self):
@@ -153,7 +327,7 @@ class DatabaseService:
     def get_products(self, limit: int = 100, category_id: Optional[int] = None, 
                     low_stock_only: bool = False) -> List[Product]:
         """Get products with optional filters"""
-        query = self.db.query(Product).filter(
+        query = self.read_db.query(Product).filter(
             Product.status == True,
             Product.is_deleted == False
         )
@@ -171,15 +345,37 @@ class DatabaseService:
     
     def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Get a specific product by ID"""
-        return self.db.query(Product).filter(
+        return self.read_db.query(Product).filter(
             Product.id == product_id,
             Product.status == True,
             Product.is_deleted == False
         ).first()
     
+    def get_products_by_ids(self, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Active products by ID, as dicts, through the per-ID cache: cached rows are checked with one
+        (id, updated_at) IN query and only new or changed rows are loaded, with one more IN query
+        """
+        return product_cache.get_many(product_ids, self._product_versions, self._load_products)
+    
+    def _active_products_in(self, columns, product_ids: List[int]):
+        for i in range(0, len(product_ids), IN_CHUNK_SIZE):
+            yield from self.read_db.query(*columns).filter(
+                Product.id.in_(product_ids[i:i + IN_CHUNK_SIZE]),
+                Product.status == True,
+                Product.is_deleted == False
+            )
+    
+    def _product_versions(self, product_ids: List[int]) -> Dict[int, Optional[datetime]]:
+        return {product_id: updated_at for product_id, updated_at
+                in self._active_products_in((Product.id, Product.updated_at), product_ids)}
+    
+    def _load_products(self, product_ids: List[int]) -> List[Dict[str, Any]]:
+        return [_row_data(product) for product in self._active_products_in((Product,), product_ids)]
+    
     def get_warehouse_products(self, warehouse_id: Optional[int] = None) -> List[WarehouseProduct]:
         """Get warehouse products with inventory information"""
-        query = self.db.query(WarehouseProduct).join(Product).filter(
+        query = self.read_db.query(WarehouseProduct).join(Product).filter(
             Product.status == True,
             Product.is_deleted == False
         )
@@ -189,9 +385,10 @@ class DatabaseService:
         
         return query.all()
     
+    @coalesced("db")
     def get_low_stock_products(self, warehouse_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get products with low stock levels"""
-        query = self.db.query(WarehouseProduct, Product).join(Product).filter(
+        query = self.read_db.query(WarehouseProduct, Product).join(Product).filter(
             Product.status == True,
             Product.is_deleted == False,
             WarehouseProduct.quantity <= Product.low_stock_limit
@@ -214,18 +411,45 @@ class DatabaseService:
             })
         
         return results
-    
+
+    @coalesced("db")
+    def get_reorder_suggestions(self, warehouse_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Low-stock items with a quantity that restocks them to twice their reorder point, most urgent first"""
+        suggestions = []
+        for item in self.get_low_stock_products(warehouse_id):
+            stock, reorder_point = item['current_stock'], item['reorder_point']
+            quantity = max(reorder_point * 2 - stock, 1)
+            if stock <= 0:
+                urgency = 'critical'
+            elif stock <= reorder_point / 2:
+                urgency = 'high'
+            else:
+                urgency = 'medium'
+            suggestions.append({
+                'id': item['id'],
+                'name': item['name'],
+                'warehouse_id': item['warehouse_id'],
+                'current_stock': stock,
+                'reorder_point': reorder_point,
+                'suggested_quantity': quantity,
+                'estimated_cost': round(quantity * item['price'], 2),
+                'urgency': urgency
+            })
+
+        suggestions.sort(key=lambda s: (s['current_stock'] > 0, s['current_stock'] / (s['reorder_point'] or 1)))
+        return suggestions
+
     # Category operations
     def get_categories(self, parent_id: int = 0) -> List[Category]:
         """Get categories, optionally filtered by parent"""
-        return self.db.query(Category).filter(
+        return self.read_db.query(Category).filter(
             Category.status == True,
             Category.parent_id == parent_id
         ).all()
     
     def get_category_by_id(self, category_id: int) -> Optional[Category]:
         """Get a specific category by ID"""
-        return self.db.query(Category).filter(
+        return self.read_db.query(Category).filter(
             Category.id == category_id,
             Category.status == True
         ).first()
@@ -233,7 +457,7 @@ class DatabaseService:
     # Order operations
     def get_orders(self, status: Optional[str] = None, limit: int = 100) -> List[Order]:
         """Get orders with optional status filter"""
-        query = self.db.query(Order)
+        query = self.read_db.query(Order)
         
         if status:
             query = query.filter(Order.order_status == status)
@@ -242,27 +466,28 @@ class DatabaseService:
     
     def get_order_by_id(self, order_id: int) -> Optional[Order]:
         """Get a specific order by ID"""
-        return self.db.query(Order).filter(Order.id == order_id).first()
+        return self.read_db.query(Order).filter(Order.id == order_id).first()
     
     # Statistics operations
+    @coalesced("db")
     def get_warehouse_stats(self) -> Dict[str, Any]:
         """Get comprehensive warehouse statistics"""
         
         # Total products
-        total_products = self.db.query(Product).filter(
+        total_products = self.read_db.query(Product).filter(
             Product.status == True,
             Product.is_deleted == False
         ).count()
         
         # Low stock products
-        low_stock_count = self.db.query(WarehouseProduct).join(Product).filter(
+        low_stock_count = self.read_db.query(WarehouseProduct).join(Product).filter(
             Product.status == True,
             Product.is_deleted == False,
             WarehouseProduct.quantity <= Product.low_stock_limit
         ).count()
         
         # Total inventory value
-        inventory_value_result = self.db.query(
+        inventory_value_result = self.read_db.query(
             func.sum(WarehouseProduct.quantity * WarehouseProduct.price)
         ).join(Product).filter(
             Product.status == True,
@@ -272,10 +497,10 @@ class DatabaseService:
         total_inventory_value = float(inventory_value_result or 0)
         
         # Categories count
-        categories = self.db.query(Category).filter(Category.status == True).all()
+        categories = self.read_db.query(Category).filter(Category.status == True).all()
         category_stats = {}
         for cat in categories:
-            products_in_category = self.db.query(Product).filter(
+            products_in_category = self.read_db.query(Product).filter(
                 Product.status == True,
                 Product.is_deleted == False,
                 Product.category_ids.contains(f'"id":{cat.id}')
@@ -287,12 +512,12 @@ class DatabaseService:
         order_statuses = ['placed', 'confirmed', 'processing', 'delivered', 'canceled']
         order_stats = {}
         for status in order_statuses:
-            count = self.db.query(Order).filter(Order.order_status == status).count()
+            count = self.read_db.query(Order).filter(Order.order_status == status).count()
             if count > 0:
                 order_stats[status] = count
         
         # Average stock level
-        avg_stock_result = self.db.query(
+        avg_stock_result = self.read_db.query(
             func.avg(WarehouseProduct.quantity)
         ).join(Product).filter(
             Product.status == True,
@@ -312,12 +537,453 @@ class DatabaseService:
     
     def search_products(self, query: str, limit: int = 50) -> List[Product]:
         """Search products by name or description"""
-        return self.db.query(Product).filter(
+        return self.read_db.query(Product).filter(
             Product.status == True,
             Product.is_deleted == False,
             Product.name.contains(query)
         ).limit(limit).all()
 
+    # Replica feeds (streamed in batches, so not coalesced)
+    def get_change_watermark(self) -> Optional[datetime]:
+        """Latest updated_at across products, stock and orders; changes after it are picked up by the next refresh"""
+        marks = [
+            self.read_db.query(func.max(Product.updated_at)).scalar(),
+            self.read_db.query(func.max(WarehouseProduct.updated_at)).scalar(),
+            self.read_db.query(func.max(Order.updated_at)).scalar(),
+        ]
+        marks = [m for m in marks if m is not None]
+        return max(marks) if marks else None
+
+    @coalesced("db")
+    def get_category_names(self) -> Dict[int, str]:
+        """Names of all categories, including sub-categories, by ID"""
+        return {category_id: name for category_id, name in self.read_db.query(Category.id, Category.name)}
+
+    @coalesced("db")
+    def get_category_tree(self) -> List[Dict[str, Any]]:
+        """Every category with its parent (0 for top-level) and whether it is active"""
+        return [
+            {"id": category_id, "name": name, "parent_id": parent_id, "status": bool(status)}
+            for category_id, name, parent_id, status in self.read_db.query(
+                Category.id, Category.name, Category.parent_id, Category.status
+            ).order_by(Category.id)
+        ]
+
+    def iter_product_names(self, since: Optional[datetime] = None, batch_size: int = 10000):
+        """Stream (id, name, status, is_deleted) for every product, or with `since` for those changed since then"""
+        query = self.read_db.query(Product.id, Product.name, Product.status, Product.is_deleted)
+        if since is not None:
+            query = query.filter(Product.updated_at >= since)
+        return iter(query.order_by(Product.id).yield_per(batch_size))
+
+    def iter_order_ids(self, since: Optional[datetime] = None, limit: Optional[int] = None, batch_size: int = 10000):
+        """
+        Stream every order ID (or the latest `limit`, newest first), or with `since` those of orders
+        created or updated since then
+        """
+        query = self.read_db.query(Order.id)
+        if since is not None:
+            query = query.filter(Order.updated_at >= since).order_by(Order.id)
+        elif limit is not None:
+            query = query.order_by(Order.id.desc()).limit(limit)
+        else:
+            query = query.order_by(Order.id)
+        return (order_id for order_id, in query.yield_per(batch_size))
+
+    def iter_inventory_rows(self, since: Optional[datetime] = None, batch_size: int = 10000):
+        """
+        Stream one row per product with its stock summed over warehouses (and the lowest per-warehouse
+        quantity, for low-stock checks). With `since`, only products whose product or stock rows changed.
+        Inactive and deleted products are included so replicas can drop them.
+        """
+        stock = self.read_db.query(
+            WarehouseProduct.product_id,
+            func.sum(WarehouseProduct.quantity).label("quantity"),
+            func.min(WarehouseProduct.quantity).label("min_quantity")
+        ).group_by(WarehouseProduct.product_id)
+        query = self.read_db.query(
+            Product.id, Product.name, Product.category_ids, Product.low_stock_limit, Product.price,
+            Product.status, Product.is_deleted
+        )
+
+        if since is not None:
+            changed = self.read_db.query(Product.id).filter(Product.updated_at >= since).union(
+                self.read_db.query(WarehouseProduct.product_id).filter(WarehouseProduct.updated_at >= since)
+            )
+            stock = stock.filter(WarehouseProduct.product_id.in_(changed))
+            query = query.filter(Product.id.in_(changed))
+
+        stock = stock.subquery()
+        query = query.add_columns(stock.c.quantity, stock.c.min_quantity).outerjoin(
+            stock, stock.c.product_id == Product.id
+        )
+        return iter(query.order_by(Product.id).yield_per(batch_size))
+
+    def iter_recent_orders(self, since: Optional[datetime] = None, limit: int = 5000):
+        """Stream the latest orders by ID, or with `since` every order updated since then"""
+        query = self.read_db.query(
+            Order.id, Order.user_id, Order.order_amount, Order.order_type, Order.order_status, Order.created_at,
+            Order.updated_at
+        )
+
+        if since is not None:
+            query = query.filter(Order.updated_at >= since).order_by(Order.id)
+        else:
+            query = query.order_by(Order.id.desc()).limit(limit)
+
+        return iter(query.yield_per(limit))
+
+    def _change_horizon(self, settle: float, replica_lag: bool) -> datetime:
+        """Rows updated at or after this time are not served by the feed yet"""
+        # Writers (the admin app, data_generator.py) stamp updated_at with local wall-clock time, while the
+        # database clock may be UTC (SQLite's always is), so the horizon comes from the same clock they use
+        horizon = datetime.now() - timedelta(seconds=settle)
+        if replica_lag:
+            # Rows committed on the primary up to the lag limit ago may not have arrived yet
+            horizon -= timedelta(seconds=REPLICA_MAX_LAG_SECONDS)
+        return horizon
+    
+    def get_change_head(self, settle: float = CHANGE_FEED_SETTLE_SECONDS) -> str:
+        """
+        A cursor from which the feed returns only changes made from now on. Clients take it before reading
+        the tables through get_table_rows, so nothing written meanwhile is missed (rows read twice are
+        upserted again). It allows for replica lag whenever replicas exist, as the pages may come from one.
+        """
+        horizon = self._change_horizon(settle, bool(replica_router.replicas))
+        return encode_change_cursor((horizon.replace(microsecond=0), 0, 0))
+    
+    def get_table_rows(self, table: str, after_id: Optional[int] = None, limit: int = 1000,
+                       newest_first: bool = False) -> Dict[str, Any]:
+        """
+        One page of a feed table's rows, in the feed's row format, by ID (descending with newest_first).
+        Deleted products are left out. Raises KeyError for a table that is not in the feed.
+        """
+        model = dict(CHANGE_FEED_TABLES)[table]
+        query = self.read_db.query(model)
+        if model is Product:
+            query = query.filter(Product.is_deleted == False)
+        if after_id is not None:
+            query = query.filter(model.id < after_id if newest_first else model.id > after_id)
+        rows = query.order_by(model.id.desc() if newest_first else model.id).limit(limit + 1).all()
+        return {
+            "table": table,
+            "rows": [_row_data(row) for row in rows[:limit]],
+            "next_after_id": rows[limit - 1].id if len(rows) > limit else None,
+            "has_more": len(rows) > limit
+        }
+    
+    def get_changes(self, after: Optional[ChangeCursor] = None, limit: int = 500,
+                    settle: float = CHANGE_FEED_SETTLE_SECONDS) -> Dict[str, Any]:
+        """
+        Rows of every feed table updated after a cursor, merged in (updated_at, table, id) order.
+        Deleted products come back as tombstones without data. Without a cursor the feed starts
+        from the oldest row; clients seed their copy with get_table_rows and a head cursor instead.
+        """
+        read_db = self.read_db
+        horizon = self._change_horizon(settle, self.reads_replica)
+        feeds = []
+        for position, (table, model) in enumerate(CHANGE_FEED_TABLES):
+            changed_at = _feed_time(model.updated_at)
+            query = read_db.query(model).filter(changed_at < _feed_param(horizon))
+            if after is not None:
+                updated_at, after_position, after_id = after
+                updated_at = _feed_param(updated_at)
+                if position < after_position:
+                    query = query.filter(changed_at > updated_at)
+                elif position == after_position:
+                    query = query.filter(or_(
+                        changed_at > updated_at,
+                        and_(changed_at == updated_at, model.id > after_id)
+                    ))
+                else:
+                    query = query.filter(changed_at >= updated_at)
+            rows = query.order_by(changed_at, model.id).limit(limit + 1).all()
+            feeds.append([((row.updated_at.replace(microsecond=0), position, row.id), table, row) for row in rows])
+
+        merged = list(heapq.merge(*feeds, key=lambda entry: entry[0]))
+        changes = []
+        for key, table, row in merged[:limit]:
+            deleted = table == "products" and row.is_deleted
+            changes.append({
+                "table": table,
+                "id": row.id,
+                "op": "delete" if deleted else "upsert",
+                "updated_at": row.updated_at,
+                "data": None if deleted else _row_data(row)
+            })
+
+        last = merged[min(limit, len(merged)) - 1][0] if merged else after
+        return {
+            "changes": changes,
+            "next_cursor": encode_change_cursor(last) if last else None,
+            "has_more": len(merged) > limit
+        }
+
+    def write_replica_heartbeat(self):
+        """Stamp the primary's clock; replicas are as far behind as the copy of this row they hold"""
+        beat = self.db.get(ReplicaHeartbeat, "primary")
+        if beat is None:
+            self.db.add(ReplicaHeartbeat(name="primary", beat_at=datetime.now()))
+        else:
+            beat.beat_at = datetime.now()
+        self.db.commit()
+    
+    # Analytics operations
+    @coalesced("db")
+    def refresh_order_rollups(self) -> int:
+        """
+        Incrementally maintain hourly order rollups.
+        Only orders touched since the stored high-water mark are read; every
+        hour bucket they fall into is re-aggregated from scratch, so replaying
+        the same window twice is harmless. Returns the number of buckets rebuilt.
+        """
+        try:
+            rebuilt = self._refresh_order_rollups()
+            self.db.commit()
+        except (IntegrityError, OperationalError):
+            # Another worker rebuilt the same buckets at the same time; its result stands
+            self.db.rollback()
+            return 0
+        return rebuilt
+    
+    def _refresh_order_rollups(self) -> int:
+        state = self.db.get(RollupState, "orders")
+        high_water_mark = state.high_water_mark if state else None
+        changed_at = func.coalesce(Order.updated_at, Order.created_at)
+        
+        changed = self.db.query(Order.created_at, changed_at).filter(Order.created_at.isnot(None))
+        if high_water_mark is not None:
+            # updated_at may only have second resolution (and SQLite compares it
+            # as text), so look back one extra second; re-aggregation is idempotent
+            changed = changed.filter(changed_at >= high_water_mark - timedelta(seconds=1))
+        
+        hours = set()
+        new_high_water_mark = high_water_mark
+        for created_at, touched_at in changed.yield_per(10000):
+            hours.add(_hour_floor(created_at))
+            if touched_at is not None and (new_high_water_mark is None or touched_at > new_high_water_mark):
+                new_high_water_mark = touched_at
+        
+        if not hours:
+            return 0
+        
+        aggregates: Dict[tuple, Dict[str, Any]] = {}
+        rows = self.db.query(
+            Order.created_at, Order.order_status, Order.order_type, Order.order_amount,
+            Order.total_tax_amount, Order.coupon_discount_amount, Order.extra_discount
+        ).filter(
+            Order.created_at >= min(hours),
+            Order.created_at < max(hours) + timedelta(hours=1)
+        )
+        for created_at, status, order_type, amount, tax, coupon, extra in rows.yield_per(10000):
+            bucket = _hour_floor(created_at)
+            if bucket not in hours:
+                continue
+            key = (bucket, status or 'placed', order_type or 'delivery')
+            agg = aggregates.setdefault(key, {'order_count': 0, 'revenue': Decimal(0), 'tax': Decimal(0), 'discounts': Decimal(0)})
+            agg['order_count'] += 1
+            agg['revenue'] += amount or 0
+            agg['tax'] += tax or 0
+            agg['discounts'] += (coupon or 0) + (extra or 0)
+        
+        sorted_hours = sorted(hours)
+        for i in range(0, len(sorted_hours), 500):
+            self.db.query(OrderRollup).filter(
+                OrderRollup.bucket_start.in_(sorted_hours[i:i + 500])
+            ).delete(synchronize_session=False)
+        
+        self.db.bulk_insert_mappings(OrderRollup, [
+            {'bucket_start': bucket, 'order_status': status, 'order_type': order_type, **agg}
+            for (bucket, status, order_type), agg in aggregates.items()
+        ])
+        
+        if state is None:
+            state = RollupState(name="orders")
+            self.db.add(state)
+        state.high_water_mark = new_high_water_mark
+        return len(hours)
+    
+    def refresh_category_index(self) -> Dict[str, int]:
+        """
+        Maintain category_closure and product_categories. The closure is rebuilt (categories are few) when
+        the tree differs from the stored one; product mappings are rewritten only for products changed since
+        the stored high-water mark. Returns the number of rows written to each table.
+        """
+        try:
+            closure_rows = self._refresh_category_closure()
+            mapping_rows = self._refresh_product_categories()
+            self.db.commit()
+        except (IntegrityError, OperationalError):
+            # Another worker refreshed the same rows at the same time; its result stands
+            self.db.rollback()
+            return {"category_closure": 0, "product_categories": 0}
+        return {"category_closure": closure_rows, "product_categories": mapping_rows}
+    
+    def _refresh_category_closure(self) -> int:
+        parents = {category_id: parent_id or 0 for category_id, parent_id
+                   in self.db.query(Category.id, Category.parent_id)}
+        stored = {(ancestor, descendant) for ancestor, descendant in self.db.query(
+            CategoryClosure.ancestor_id, CategoryClosure.descendant_id).filter(CategoryClosure.depth <= 1)}
+        current = {(category_id, category_id) for category_id in parents}
+        current |= {(parent_id, category_id) for category_id, parent_id in parents.items() if parent_id in parents}
+        if stored == current:
+            return 0
+        
+        rows = _closure_rows(parents)
+        self.db.query(CategoryClosure).delete(synchronize_session=False)
+        self.db.bulk_insert_mappings(CategoryClosure, rows)
+        return len(rows)
+    
+    def _refresh_product_categories(self) -> int:
+        state = self.db.get(RollupState, "product_categories")
+        high_water_mark = state.high_water_mark if state else None
+        changed = self.db.query(Product.id, Product.category_ids, Product.updated_at)
+        if high_water_mark is not None:
+            # Same one-second look-back as the order rollups; rewriting a product's mappings is idempotent
+            changed = changed.filter(Product.updated_at >= high_water_mark - timedelta(seconds=1))
+        
+        written = 0
+        new_high_water_mark = high_water_mark
+        batch: List[Tuple[int, Optional[str]]] = []
+        
+        def flush():
+            nonlocal written
+            product_ids = [product_id for product_id, _ in batch]
+            self.db.query(ProductCategory).filter(
+                ProductCategory.product_id.in_(product_ids)
+            ).delete(synchronize_session=False)
+            mappings = [{"category_id": category_id, "product_id": product_id}
+                        for product_id, raw in batch for category_id in _category_ids(raw)]
+            self.db.bulk_insert_mappings(ProductCategory, mappings)
+            written += len(mappings)
+            batch.clear()
+        
+        for product_id, raw, updated_at in changed.order_by(Product.id).yield_per(10000):
+            batch.append((product_id, raw))
+            if updated_at is not None and (new_high_water_mark is None or updated_at > new_high_water_mark):
+                new_high_water_mark = updated_at
+            if len(batch) >= IN_CHUNK_SIZE:
+                flush()
+        if batch:
+            flush()
+        
+        if new_high_water_mark != high_water_mark:
+            if state is None:
+                state = RollupState(name="product_categories")
+                self.db.add(state)
+            state.high_water_mark = new_high_water_mark
+        return written
+    
+    def _category_rollups(self, category_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Product count, stock units, stock value and low-stock products for each category's subtree, in one
+        grouped query: closure -> product_categories -> products -> stock. A product listed under several
+        categories of the same subtree is counted once.
+        """
+        in_subtree = self.read_db.query(
+            CategoryClosure.ancestor_id.label("category_id"),
+            ProductCategory.product_id.label("product_id")
+        ).join(
+            ProductCategory, ProductCategory.category_id == CategoryClosure.descendant_id
+        ).filter(
+            CategoryClosure.ancestor_id.in_(category_ids)
+        ).distinct().subquery()
+        
+        rows = self.read_db.query(
+            in_subtree.c.category_id,
+            func.count(func.distinct(Product.id)),
+            func.coalesce(func.sum(WarehouseProduct.quantity), 0),
+            func.coalesce(func.sum(WarehouseProduct.quantity * WarehouseProduct.price), 0),
+            func.count(func.distinct(case((WarehouseProduct.quantity <= Product.low_stock_limit, Product.id))))
+        ).select_from(in_subtree).join(
+            Product, Product.id == in_subtree.c.product_id
+        ).outerjoin(
+            WarehouseProduct, WarehouseProduct.product_id == Product.id
+        ).filter(
+            Product.status == True,
+            Product.is_deleted == False
+        ).group_by(in_subtree.c.category_id)
+        
+        totals = {category_id: values for category_id, *values in rows}
+        rollups = {}
+        for category_id, name, parent_id in self.read_db.query(
+            Category.id, Category.name, Category.parent_id
+        ).filter(Category.id.in_(category_ids)).order_by(Category.position, Category.id):
+            products, units, value, low_stock = totals.get(category_id, (0, 0, 0, 0))
+            rollups[category_id] = {
+                'category_id': category_id,
+                'name': name,
+                'parent_id': parent_id,
+                'product_count': products,
+                'stock_units': int(units),
+                'stock_value': round(float(value), 2),
+                'low_stock_products': low_stock,
+            }
+        return rollups
+    
+    @coalesced("db")
+    def get_category_rollup(self, category_id: int) -> Optional[Dict[str, Any]]:
+        """Totals for one category and everything below it; None for an unknown category"""
+        return self._category_rollups([category_id]).get(category_id)
+    
+    @coalesced("db")
+    def get_child_category_rollups(self, parent_id: int = 0) -> List[Dict[str, Any]]:
+        """Subtree totals for each direct child of `parent_id` (0 for the top-level categories)"""
+        children = [category_id for category_id, in self.read_db.query(Category.id).filter(
+            Category.parent_id == parent_id
+        )]
+        return list(self._category_rollups(children).values()) if children else []
+    
+    @coalesced("db")
+    def get_order_analytics(self, start: datetime, end: datetime, bucket: str = "day") -> List[Dict[str, Any]]:
+        """Get order totals per time bucket, status and type, read from the rollup table only"""
+        if bucket not in ROLLUP_BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(ROLLUP_BUCKETS)}")
+        
+        rows = self.read_db.query(OrderRollup).filter(
+            OrderRollup.bucket_start >= _hour_floor(start),
+            OrderRollup.bucket_start < end
+        ).order_by(OrderRollup.bucket_start).all()
+        
+        series: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            bucket_start = row.bucket_start
+            if bucket == "day":
+                bucket_start = bucket_start.replace(hour=0)
+            key = (bucket_start, row.order_status, row.order_type)
+            point = series.setdefault(key, {
+                'bucket_start': bucket_start.isoformat(),
+                'order_status': row.order_status,
+                'order_type': row.order_type,
+                'order_count': 0,
+                'revenue': 0.0,
+                'tax': 0.0,
+                'discounts': 0.0
+            })
+            point['order_count'] += row.order_count
+            point['revenue'] += float(row.revenue)
+            point['tax'] += float(row.tax)
+            point['discounts'] += float(row.discounts)
+        
+        for point in series.values():
+            for field in ('revenue', 'tax', 'discounts'):
+                point[field] = round(point[field], 2)
+        
+        return list(series.values())
+
+# Per-method latency, statement counts and pool usage for /metrics
+instrument_methods(DatabaseService, [
+    "get_products", "get_product_by_id", "get_products_by_ids", "get_warehouse_products", "get_low_stock_products", "get_reorder_suggestions",
+    "get_categories", "get_category_by_id", "get_orders", "get_order_by_id", "get_warehouse_stats",
+    "search_products", "get_change_watermark", "get_changes", "get_category_names", "get_category_tree",
+    "refresh_order_rollups", "get_order_analytics", "refresh_category_index", "get_category_rollup",
+    "get_child_category_rollups"
+])
+instrument_engine(engine)
+for replica_engine in replica_engines:
+    instrument_engine(replica_engine)
+pool_gauges(engine)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -330,73 +996,33 @@ def create_sample_data():
     """Create sample data for SQLite database"""
     try:
         session = SessionLocal()
+        has_data = session.query(Product).first() is not None
+        session.close()
         
         # Check if data already exists
-        if session.query(Product).first():
-            session.close()
+        if has_data:
             return
         
         print("🔄 Creating sample food data...")
-        
-        # Create categories
-        drinks_cat = Category(id=1, name="Drinks", parent_id=0, position=1)
-        hot_cat = Category(id=2, name="hot", parent_id=0, position=2)
-        cold_cat = Category(id=3, name="cold", parent_id=0, position=3)
-        cake_cat = Category(id=4, name="Cake", parent_id=0, position=4)
-        
-        session.add_all([drinks_cat, hot_cat, cold_cat, cake_cat])
-        
-        # Create sample products (simplified for SQLite)
-        products = [
-            Product(id=1, name="Kamini sausages", price=Decimal("4.99"), status=True),
-            Product(id=2, name="Gouda cheese", price=Decimal("7.50"), status=True),
-            Product(id=3, name="Chicken breast", price=Decimal("12.99"), status=True),
-            Product(id=4, name="Coca Cola", price=Decimal("2.99"), status=True),
-            Product(id=5, name="Chocolate cake", price=Decimal("15.99"), status=True),
-            Product(id=6, name="Fresh milk", price=Decimal("3.49"), status=True),
-        ]
-        
-        session.add_all(products)
-        
-        # Create warehouse products with stock levels
-        warehouse_products = [
-            WarehouseProduct(id=1, warehouse_id=1, product_id=1, quantity=150, price=Decimal("4.99"), cost_price=Decimal("3.50"), status="active"),
-            WarehouseProduct(id=2, warehouse_id=1, product_id=2, quantity=85, price=Decimal("7.50"), cost_price=Decimal("5.25"), status="active"),
-            WarehouseProduct(id=3, warehouse_id=1, product_id=3, quantity=200, price=Decimal("12.99"), cost_price=Decimal("9.50"), status="active"),
-            WarehouseProduct(id=4, warehouse_id=1, product_id=4, quantity=300, price=Decimal("2.99"), cost_price=Decimal("1.50"), status="active"),
-            WarehouseProduct(id=5, warehouse_id=1, product_id=5, quantity=25, price=Decimal("15.99"), cost_price=Decimal("10.99"), status="active"),
-            WarehouseProduct(id=6, warehouse_id=1, product_id=6, quantity=120, price=Decimal("3.49"), cost_price=Decimal("2.25"), status="active"),
-        ]
-        
-        session.add_all(warehouse_products)
-        
-        # Create sample orders
-        orders = [
-            Order(id=1, user_id=1, order_amount=Decimal("45.97"), order_status="delivered", 
-                 created_at=datetime.now()),
-            Order(id=2, user_id=2, order_amount=Decimal("28.48"), order_status="processing", 
-                 created_at=datetime.now()),
-            Order(id=3, user_id=3, order_amount=Decimal("67.23"), order_status="delivered", 
-                 created_at=datetime.now()),
-        ]
-        
-        session.add_all(orders)
-        session.commit()
-        session.close()
-        
+        from data_generator import generate
+        generate(engine, products=200, warehouses=2, orders=500, verbose=False)
         print("✅ Sample data created successfully!")
         
     except Exception as e:
         print(f"❌ Error creating sample data: {e}")
-        if 'session' in locals():
-            session.rollback()
-            session.close()
 
 # Initialize database if using SQLite
 if "sqlite" in DATABASE_URL.lower():
     print("🔧 Setting up SQLite database...")
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so files created before an index was added get it here
+    for index in WarehouseProduct.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
     create_sample_data()
 
+# Analytics and heartbeat tables are created on every backend, including MySQL
+Base.metadata.create_all(bind=engine, tables=[OrderRollup.__table__, RollupState.__table__, ReplicaHeartbeat.__table__,
+                                              CategoryClosure.__table__, ProductCategory.__table__])
+
 # Global database service instance
 db_service = DatabaseService()
@@ -0,0 +1,352 @@
+"""
+Entity resolution index for the NLU
+This module resolves category names, product names, product IDs and order numbers mentioned in a query to
+database IDs. It is built from the live products, categories and orders tables, refreshed incrementally, and
+answers a query with a bounded number of hash lookups, so resolution time does not grow with the catalog.
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+import heapq
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from dotenv import load_dotenv
+
+from metrics import registry
+
+load_dotenv()
+
+# Refreshes look back this far past the watermark, since DATETIME values may be stored without sub-seconds
+REFRESH_LOOKBACK = timedelta(seconds=1)
+# Longest category or product name (in words) matched as an exact phrase
+MAX_PHRASE_WORDS = 8
+# Token matching gives up when even the rarest query word appears in more products than this
+MAX_CANDIDATES = 256
+# Share of a product's name words a query must contain to match it by words alone
+MIN_NAME_COVERAGE = 0.5
+# Words shorter than this are never spelling-corrected
+MIN_FUZZY_LENGTH = 4
+# Order numbers resolved are those of the latest this many orders; older ones are pruned from memory
+ENTITY_INDEX_MAX_ORDERS = int(os.getenv("ENTITY_INDEX_MAX_ORDERS", "200000"))
+
+STOPWORDS = frozenset("""
+a about all an and any are as at be by can do does for from get give has have how i in is it its list me
+many more most much my of on or our please show some stock stocks tell than that the their there these
+this those to us was we what whats when where which who why will with you your level levels status info
+price
+""".split())
+# Pack sizes and units carry no identity ("1 pc", "500g")
+UNIT_TOKENS = frozenset(("pc", "pcs", "g", "kg", "ml", "cl", "l", "x", "pack", "pers"))
+
+PRODUCT_REFERENCE = re.compile(r"\b(?:prd|product|item|sku)\s*(?:id|number|no)?\s*[#:-]?\s*(\d+)\b")
+ORDER_REFERENCE = re.compile(r"\b(?:shp|ord|order|shipment)\s*(?:id|number|no)?\s*[#:-]?\s*(\d+)\b")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+entity_resolve_duration = registry.histogram(
+    "entity_resolve_duration_seconds", "Time spent resolving entity references in a query",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01))
+
+
+def normalize(text: str) -> str:
+    """Lowercase ASCII words separated by single spaces ("Café  crème" -> "cafe creme")"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def product_key(product_id: Union[int, str]) -> Optional[int]:
+    """A product ID in the form the index resolves to: database IDs stay ints, "PRD-0012" becomes 12"""
+    if isinstance(product_id, int):
+        return product_id
+    digits = str(product_id).upper().replace("PRD", "").strip("-# ")
+    return int(digits) if digits.isdigit() else None
+
+
+def _stem(token: str) -> str:
+    """Fold plain plurals so "cakes" finds "Cake" (applied to the index and to queries alike)"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and token not in STOPWORDS:
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(token) for token in normalize(text).split()]
+
+
+def _is_name_word(token: str) -> bool:
+    return token not in STOPWORDS and token not in UNIT_TOKENS and not token[0].isdigit()
+
+
+def _deletes(token: str) -> List[str]:
+    return [token[:i] + token[i + 1:] for i in range(len(token))]
+
+
+def _contains(posting: array, product_id: int) -> bool:
+    i = bisect_left(posting, product_id)
+    return i < len(posting) and posting[i] == product_id
+
+
+class EntityIndex:
+    """
+    Categories and full product names are hash maps keyed by their normalized phrase; product words have
+    sorted posting lists of product IDs. Misspelled words are corrected against the vocabulary through a
+    map of single-character deletions, so a one-letter typo costs one lookup per letter.
+    """
+
+    def __init__(self, max_orders: int = ENTITY_INDEX_MAX_ORDERS):
+        self.max_orders = max_orders
+        self._lock = threading.RLock()
+        self._categories: Dict[str, int] = {}
+        self._category_names: Dict[int, str] = {}
+        self._category_words: Set[str] = set()
+        self._product_names: Dict[int, str] = {}
+        self._name_words: Dict[int, int] = {}
+        self._by_name: Dict[str, array] = {}
+        self._postings: Dict[str, array] = {}
+        self._deletes: Dict[str, Set[str]] = {}
+        self._orders: Set[int] = set()
+        self.watermark: Optional[datetime] = None
+        self.loaded_at: Optional[datetime] = None
+
+    # Loading
+
+    def _set_categories(self, rows: Iterable[Dict[str, Any]]):
+        """Index every active category by its name, and sub-categories also as "<name> <parent>" ("cold drinks")"""
+        rows = [row for row in rows if row["status"] and row["name"]]
+        names = {row["id"]: row["name"] for row in rows}
+        categories: Dict[str, int] = {}
+        for row in rows:
+            phrase = " ".join(tokenize(row["name"]))
+            if phrase:
+                categories.setdefault(phrase, row["id"])
+            parent = names.get(row["parent_id"])
+            if phrase and parent:
+                categories.setdefault(f"{phrase} {' '.join(tokenize(parent))}", row["id"])
+        self._categories = categories
+        self._category_names = names
+        self._category_words = {word for phrase in categories for word in phrase.split()}
+        for word in self._category_words:
+            self._add_word(word)
+
+    def _add_word(self, word: str):
+        if len(word) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(word) + [word]:
+                self._deletes.setdefault(variant, set()).add(word)
+
+    def _upsert_product(self, product_id: int, name: str, live: bool):
+        self._remove_product(product_id)
+        words = tokenize(name)
+        if not live or not words:
+            return
+        self._product_names[product_id] = name
+        phrase = " ".join(words)
+        self._insert(self._by_name.setdefault(phrase, array("q")), product_id)
+        name_words = {word for word in words if _is_name_word(word)}
+        self._name_words[product_id] = len(name_words)
+        for word in name_words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = array("q")
+                self._add_word(word)
+            self._insert(posting, product_id)
+
+    def _remove_product(self, product_id: int):
+        name = self._product_names.pop(product_id, None)
+        if name is None:
+            return
+        del self._name_words[product_id]
+        words = tokenize(name)
+        self._discard(self._by_name, " ".join(words), product_id)
+        for word in {word for word in words if _is_name_word(word)}:
+            self._discard(self._postings, word, product_id)
+
+    @staticmethod
+    def _insert(posting: array, product_id: int):
+        # Products usually arrive in ID order, so this is almost always an append
+        if not posting or posting[-1] < product_id:
+            posting.append(product_id)
+        else:
+            i = bisect_left(posting, product_id)
+            if i == len(posting) or posting[i] != product_id:
+                posting.insert(i, product_id)
+
+    @staticmethod
+    def _discard(postings: Dict[str, array], key: str, product_id: int):
+        posting = postings.get(key)
+        if posting is None:
+            return
+        i = bisect_left(posting, product_id)
+        if i < len(posting) and posting[i] == product_id:
+            del posting[i]
+        if not posting:
+            # Spelling variants of an emptied word stay in the delete map but no longer resolve
+            del postings[key]
+
+    def _apply_products(self, rows: Iterable) -> int:
+        count = 0
+        for product_id, name, status, is_deleted in rows:
+            self._upsert_product(product_id, name or "", bool(status) and not is_deleted)
+            count += 1
+        return count
+
+    def load_from_db(self, db_service) -> Dict[str, int]:
+        """Build a fresh index from the database and swap it in"""
+        watermark = db_service.get_change_watermark()
+        index = EntityIndex(self.max_orders)
+        index._set_categories(db_service.get_category_tree())
+        products = index._apply_products(db_service.iter_product_names())
+        index._orders.update(db_service.iter_order_ids(limit=self.max_orders))
+
+        with self._lock:
+            self.__dict__.update({k: v for k, v in index.__dict__.items() if k != "_lock"})
+            self.watermark = watermark
+            self.loaded_at = datetime.now()
+        return {"categories": len(self._category_names), "products": products, "orders": len(self._orders)}
+
+    def refresh(self, db_service) -> Dict[str, int]:
+        """Apply categories (always reloaded, the table is small), products and orders changed since the last refresh"""
+        if self.watermark is None:
+            return self.load_from_db(db_service)
+
+        watermark = db_service.get_change_watermark()
+        since = self.watermark - REFRESH_LOOKBACK
+        categories = db_service.get_category_tree()
+        product_rows = list(db_service.iter_product_names(since=since))
+        order_ids = list(db_service.iter_order_ids(since=since))
+        with self._lock:
+            self._set_categories(categories)
+            products = self._apply_products(product_rows)
+            self._orders.update(order_ids)
+            self._prune_orders()
+            self.watermark = watermark or self.watermark
+            self.loaded_at = datetime.now()
+        return {"categories": len(self._category_names), "products": products, "orders": len(order_ids)}
+
+    def _prune_orders(self):
+        """Drop the oldest order numbers once over max_orders, down to 90% of it so this does not run every refresh"""
+        excess = len(self._orders) - self.max_orders
+        if excess > 0:
+            self._orders.difference_update(heapq.nsmallest(excess + self.max_orders // 10, self._orders))
+
+    # Resolution
+
+    def _correct(self, word: str) -> str:
+        """The known word within one edit of `word` that names the most products, or `word` itself"""
+        if (len(word) < MIN_FUZZY_LENGTH or word in self._postings or word in self._category_words
+                or word in STOPWORDS or word[0].isdigit()):
+            return word
+        candidates: Set[str] = set()
+        for variant in _deletes(word) + [word]:
+            candidates.update(self._deletes.get(variant, ()))
+        candidates = {c for c in candidates if c in self._postings or c in self._category_words}
+        if not candidates:
+            return word
+        return max(candidates, key=lambda c: (c in self._category_words, len(self._postings.get(c, ())), c))
+
+    def _match_categories(self, words: List[str]) -> Tuple[List[int], Set[int]]:
+        """Leftmost-longest category phrases; returns the category IDs and the word positions they used"""
+        found: List[int] = []
+        used: Set[int] = set()
+        for size in range(min(MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                span = range(start, start + size)
+                if used.intersection(span):
+                    continue
+                category_id = self._categories.get(" ".join(words[start:start + size]))
+                if category_id is not None and category_id not in found:
+                    found.append(category_id)
+                    used.update(span)
+        return found, used
+
+    def _match_product_names(self, words: List[str]) -> List[int]:
+        """Products whose full normalized name appears in the query"""
+        for size in range(min(MAX_PHRASE_WORDS, len(words)), 1, -1):
+            for start in range(len(words) - size + 1):
+                ids = self._by_name.get(" ".join(words[start:start + size]))
+                if ids:
+                    return list(ids)
+        return []
+
+    def _match_product_words(self, words: List[str]) -> List[int]:
+        """
+        Products sharing the most words with the query, starting from the rarest word's posting list.
+        Gives up (returns nothing) when every word is too common to narrow the catalog down.
+        """
+        postings = sorted(
+            (self._postings[word] for word in set(words) if _is_name_word(word) and word in self._postings), key=len
+        )
+        if not postings or len(postings[0]) > MAX_CANDIDATES:
+            return []
+
+        best_key = None
+        best: List[int] = []
+        for product_id in postings[0]:
+            matched = 1 + sum(1 for posting in postings[1:] if _contains(posting, product_id))
+            coverage = matched / max(1, self._name_words[product_id])
+            if coverage < MIN_NAME_COVERAGE and matched < 2:
+                continue
+            key = (matched, coverage)
+            if best_key is None or key > best_key:
+                best_key, best = key, [product_id]
+            elif key == best_key:
+                best.append(product_id)
+        return best
+
+    def resolve(self, query: str) -> Dict[str, Any]:
+        """
+        Entities referenced by a query, as database IDs: `category`/`category_id` (plus `category_ids` when
+        several are named), `product_id`/`product_name` (plus `product_ids` when the name is ambiguous) and
+        `order_id`, all IDs as ints. Numeric references ("product 12", "order #345") only resolve to rows that
+        exist (orders among the latest max_orders).
+        """
+        started = time.perf_counter()
+        text = normalize(query)
+        entities: Dict[str, Any] = {}
+        with self._lock:
+            words = [self._correct(_stem(word)) for word in text.split()]
+
+            category_ids, used = self._match_categories(words)
+            if category_ids:
+                entities["category"] = self._category_names[category_ids[0]]
+                entities["category_id"] = category_ids[0]
+                if len(category_ids) > 1:
+                    entities["category_ids"] = category_ids
+
+            product_ids: List[int] = []
+            match = PRODUCT_REFERENCE.search(text)
+            if match and int(match.group(1)) in self._product_names:
+                product_ids = [int(match.group(1))]
+            if not product_ids:
+                product_ids = self._match_product_names(words)
+            if not product_ids:
+                product_ids = self._match_product_words([w for i, w in enumerate(words) if i not in used])
+            if product_ids:
+                entities["product_id"] = product_ids[0]
+                entities["product_name"] = self._product_names[product_ids[0]]
+                if len(product_ids) > 1:
+                    entities["product_ids"] = product_ids[:10]
+
+            match = ORDER_REFERENCE.search(text)
+            if match and int(match.group(1)) in self._orders:
+                entities["order_id"] = int(match.group(1))
+        entity_resolve_duration.observe(time.perf_counter() - started)
+        return entities
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "categories": len(self._category_names),
+                "products": len(self._product_names),
+                "words": len(self._postings),
+                "orders": len(self._orders),
+                "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            }
+
+
+# Global entity index instance; loaded and refreshed by main's scheduler job
+entity_index = EntityIndex()
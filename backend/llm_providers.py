@@ -0,0 +1,380 @@
+"""
+LLM provider abstraction for the AI agent
+This module routes chat completions across OpenAI-compatible backends by observed latency, hedges slow requests
+and provides a local template provider so the pipeline can run offline
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Any, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from single_flight import flight_group, SINGLE_FLIGHT_ENABLED
+from metrics import llm_request_duration, llm_tokens, llm_errors, cache_requests
+from shared_cache import shared_cache
+from completion_store import completion_store
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+# Fire a second request at the next-best provider once the first has been running longer than this percentile
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Identical requests within this many seconds are answered from the shared cache, by any worker (0 disables)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "60"))
+# Without any LLM configured, serve template answers as a deliberate choice (offline demos, load tests);
+# otherwise the service runs degraded and says so in /health and in every response
+LLM_TEMPLATE_FALLBACK = os.getenv("LLM_TEMPLATE_FALLBACK", "0") == "1"
+EWMA_ALPHA = 0.2
+FAILURES_BEFORE_COOLDOWN = 3
+COOLDOWN_SECONDS = 30.0
+
+DEFAULT_PROVIDERS = [
+    {"name": "groq", "type": "openai", "base_url": "https://api.groq.com/openai/v1",
+     "api_key_env": "GROQ_API_KEY", "model": "llama3-8b-8192"},
+]
+
+# Generation settings per API endpoint; "providers" restricts routing to the named providers
+DEFAULT_ENDPOINTS = {
+    "chat": {"temperature": 0.7, "max_tokens": 1000},
+    "warehouse_query": {"temperature": 0.5, "max_tokens": 800},
+}
+
+
+class LLMError(Exception):
+    """Raised when no provider could produce a completion"""
+
+
+class LLMResult:
+    __slots__ = ("text", "provider", "model", "latency", "prompt_tokens", "completion_tokens", "hedged", "cached")
+
+    def __init__(self, text: str, provider: str, model: str, latency: float,
+                 prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.provider = provider
+        self.model = model
+        self.latency = latency
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.hedged = False
+        self.cached = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LLMResult":
+        result = cls(data["text"], data["provider"], data["model"], data["latency"],
+                     data["prompt_tokens"], data["completion_tokens"])
+        result.hedged = data["hedged"]
+        return result
+
+
+class LLMProvider:
+    """Base class for chat completion backends"""
+
+    def __init__(self, name: str, model: str):
+        self.name = name
+        self.model = model
+
+    def complete(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                 temperature: float = 0.7, max_tokens: int = 1000) -> LLMResult:
+        raise NotImplementedError
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any backend speaking the OpenAI /chat/completions protocol (Groq, vLLM, Ollama, llama.cpp server...)"""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: Optional[str] = None, timeout: float = LLM_TIMEOUT):
+        super().__init__(name, model)
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def complete(self, messages, model=None, temperature=0.7, max_tokens=1000) -> LLMResult:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": False
+        }
+
+        started = time.perf_counter()
+        response = self.session.post(self.url, headers=headers, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        result = response.json()
+        usage = result.get("usage") or {}
+        return LLMResult(
+            text=result["choices"][0]["message"]["content"],
+            provider=self.name,
+            model=payload["model"],
+            latency=time.perf_counter() - started,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0)
+        )
+
+
+class LocalTemplateProvider(LLMProvider):
+    """
+    Offline stand-in that answers from the system prompt's own facts.
+    Deterministic and dependency-free, so load tests exercise everything except the remote model.
+    """
+
+    def __init__(self, name: str = "local", model: str = "local-template", latency_ms: float = 0.0):
+        super().__init__(name, model)
+        self.latency_ms = latency_ms
+
+    def complete(self, messages, model=None, temperature=0.7, max_tokens=1000) -> LLMResult:
+        started = time.perf_counter()
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        facts = [line for line in system.splitlines() if line.startswith("- ") and ":" in line]
+        text = f"Here is what I found about \"{question}\":\n" + "\n".join(facts[:max(1, max_tokens // 20)])
+
+        return LLMResult(
+            text=text,
+            provider=self.name,
+            model=model or self.model,
+            latency=time.perf_counter() - started,
+            prompt_tokens=sum(math.ceil(len(m["content"]) / 4) for m in messages),
+            completion_tokens=math.ceil(len(text) / 4)
+        )
+
+
+class ProviderStats:
+    """Moving-average latency and health of one provider"""
+
+    def __init__(self, window: int = 200):
+        self.ewma: Optional[float] = None
+        self.samples = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+            self.samples.append(latency)
+            self.successes += 1
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURES_BEFORE_COOLDOWN:
+                self.unhealthy_until = time.monotonic() + COOLDOWN_SECONDS
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class LLMRouter:
+    def __init__(self, providers: List[LLMProvider], endpoints: Optional[Dict[str, Dict[str, Any]]] = None,
+                 hedge_percentile: float = HEDGE_PERCENTILE):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        self.providers = {p.name: p for p in providers}
+        self.stats = {p.name: ProviderStats() for p in providers}
+        self.endpoints = {name: dict(settings) for name, settings in DEFAULT_ENDPOINTS.items()}
+        for name, settings in (endpoints or {}).items():
+            self.endpoints.setdefault(name, {}).update(settings)
+        self.hedge_percentile = hedge_percentile
+        # Why answers are not coming from a real model, when that is not by choice
+        self.degraded: Optional[str] = None
+        self._flight = flight_group("llm.complete")
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+                                           thread_name_prefix="llm")
+
+    def _candidates(self, endpoint: str) -> List[LLMProvider]:
+        """Healthy providers allowed for the endpoint, fastest first (untried ones first so they get measured)"""
+        allowed = self.endpoints.get(endpoint, {}).get("providers") or list(self.providers)
+        providers = [self.providers[name] for name in allowed if name in self.providers]
+        healthy = [p for p in providers if self.stats[p.name].healthy] or providers
+        return sorted(healthy, key=lambda p: self.stats[p.name].ewma or 0.0)
+
+    def _call(self, provider: LLMProvider, messages, settings) -> LLMResult:
+        started = time.perf_counter()
+        try:
+            result = provider.complete(messages, model=settings.get("model"),
+                                       temperature=settings.get("temperature", 0.7),
+                                       max_tokens=settings.get("max_tokens", 1000))
+        except Exception:
+            self.stats[provider.name].record_failure()
+            llm_errors.inc(provider.name)
+            raise
+        latency = time.perf_counter() - started
+        self.stats[provider.name].record_success(latency)
+        llm_request_duration.observe(latency, provider.name, result.model)
+        llm_tokens.inc(provider.name, "prompt", amount=result.prompt_tokens)
+        llm_tokens.inc(provider.name, "completion", amount=result.completion_tokens)
+        return result
+
+    def complete(self, messages: List[Dict[str, str]], endpoint: str = "chat", **overrides) -> LLMResult:
+        """Get a completion from the best provider; identical concurrent requests share one completion"""
+        key = json.dumps([endpoint, messages, overrides], sort_keys=True)
+        if not SINGLE_FLIGHT_ENABLED:
+            return self._cached_complete(key, messages, endpoint, overrides)
+        return self._flight.do(key, self._cached_complete, key, messages, endpoint, overrides)
+
+    def _cached_complete(self, key: str, messages: List[Dict[str, str]], endpoint: str,
+                         overrides: Dict[str, Any]) -> LLMResult:
+        prompt_hash = hashlib.sha256(key.encode()).hexdigest()
+        cache_key = "llm:" + prompt_hash
+        if LLM_CACHE_TTL > 0:
+            cached = shared_cache.get(cache_key)
+            if cached is not None:
+                cache_requests.inc("llm", "hit")
+                result = LLMResult.from_dict(cached)
+                result.cached = True
+                return result
+            cache_requests.inc("llm", "miss")
+
+        # Answers from before the last restart, for the same model and data
+        model = self.model_key(endpoint, overrides)
+        if completion_store.enabled:
+            stored = completion_store.get(model, prompt_hash)
+            cache_requests.inc("llm_store", "hit" if stored is not None else "miss")
+            if stored is not None:
+                if LLM_CACHE_TTL > 0:
+                    shared_cache.set(cache_key, stored, LLM_CACHE_TTL)
+                result = LLMResult.from_dict(stored)
+                result.cached = True
+                return result
+
+        result = self._complete(messages, endpoint, overrides)
+        if LLM_CACHE_TTL > 0:
+            shared_cache.set(cache_key, result.to_dict(), LLM_CACHE_TTL)
+        completion_store.put(model, prompt_hash, result.to_dict())
+        return result
+
+    def model_key(self, endpoint: str, overrides: Dict[str, Any]) -> str:
+        """The model(s) that may answer for an endpoint; stored answers are only reused for the same ones"""
+        settings = {**self.endpoints.get(endpoint, {}), **overrides}
+        if settings.get("model"):
+            return settings["model"]
+        allowed = settings.get("providers") or list(self.providers)
+        return "+".join(sorted({self.providers[name].model for name in allowed if name in self.providers}))
+
+    def _complete(self, messages: List[Dict[str, str]], endpoint: str, overrides: Dict[str, Any]) -> LLMResult:
+        """Run the completion on the fastest provider, hedging to the runner-up when it is slow"""
+        settings = {**self.endpoints.get(endpoint, {}), **overrides}
+        queue = self._candidates(endpoint)
+        pending = {}
+        errors = []
+        hedged = False
+
+        def launch():
+            provider = queue.pop(0)
+            pending[self.executor.submit(self._call, provider, messages, settings)] = provider
+
+        launch()
+        while pending:
+            hedge_after = None
+            if queue and not hedged:
+                first = next(iter(pending.values()))
+                hedge_after = self.stats[first.name].percentile(self.hedge_percentile)
+
+            done, _ = wait(list(pending), timeout=hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                # The running request is slower than usual for its provider: race a second one
+                hedged = True
+                launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"LLM provider {provider.name} failed: {e}")
+                    errors.append(f"{provider.name}: {e}")
+                    continue
+                result.hedged = hedged
+                return result
+
+            if not pending and queue:
+                launch()
+
+        raise LLMError("All LLM providers failed: " + "; ".join(errors))
+
+    def status(self) -> Dict[str, Any]:
+        """Per-provider health"""
+        return {
+            name: {
+                "model": self.providers[name].model,
+                "healthy": stats.healthy,
+                "ewma_latency_ms": round(stats.ewma * 1000, 1) if stats.ewma is not None else None,
+                "successes": stats.successes,
+                "failures": stats.failures,
+            }
+            for name, stats in self.stats.items()
+        }
+
+
+def build_provider(config: Dict[str, Any]) -> LLMProvider:
+    kind = config.get("type", "openai")
+    if kind == "local":
+        return LocalTemplateProvider(config.get("name", "local"), config.get("model", "local-template"),
+                                     float(config.get("latency_ms", 0)))
+    if kind == "openai":
+        api_key = config.get("api_key") or (os.getenv(config["api_key_env"]) if config.get("api_key_env") else None)
+        return OpenAICompatibleProvider(config["name"], config["base_url"], config["model"], api_key,
+                                        float(config.get("timeout", LLM_TIMEOUT)))
+    raise ValueError(f"Unknown LLM provider type: {kind}")
+
+
+def load_router_from_env() -> LLMRouter:
+    """
+    Build the router from LLM_PROVIDERS / LLM_ENDPOINTS (JSON). Without configuration, Groq is used
+    when GROQ_API_KEY is set, otherwise the local template provider.
+    """
+    if os.getenv("LLM_PROVIDERS"):
+        provider_configs = json.loads(os.environ["LLM_PROVIDERS"])
+    elif os.getenv("GROQ_API_KEY"):
+        provider_configs = DEFAULT_PROVIDERS
+    else:
+        provider_configs = [{"name": "local", "type": "local"}]
+
+    endpoints = json.loads(os.getenv("LLM_ENDPOINTS", "{}"))
+    router = LLMRouter([build_provider(c) for c in provider_configs], endpoints)
+    if not os.getenv("LLM_PROVIDERS") and not os.getenv("GROQ_API_KEY"):
+        if LLM_TEMPLATE_FALLBACK:
+            logger.warning("No LLM configured; serving template answers (LLM_TEMPLATE_FALLBACK=1)")
+        else:
+            router.degraded = "GROQ_API_KEY not set and no LLM_PROVIDERS configured: answers are templates"
+            logger.error(f"{router.degraded}. Set LLM_TEMPLATE_FALLBACK=1 if this is intended.")
+    return router
+
+
+# Global LLM router instance
+llm_router = load_router_from_env()
@@ -1,31 +1,193 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
-import requests
 import os
 from dotenv import load_dotenv
 from typing import Optional, List, Dict, Any
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
 # Import our custom modules
-from database_service import DatabaseService, get_db, Product, Category, Order, WarehouseProduct
+from database_service import DatabaseService, get_db, engine, replica_engines, decode_change_cursor, CHANGE_FEED_TABLES, replica_router, Product, Category, Order, WarehouseProduct
+from replica_router import REPLICA_HEARTBEAT_SECONDS
+import sqlite_tuning
 from nlu_processor import nlu_processor, QueryIntent
+from context_builder import context_builder
+from llm_providers import llm_router, LLMError
+from completion_store import completion_store, normalize_question
+from single_flight import coalescing_stats
+from metrics import registry, MetricsMiddleware
+from warehouse_data import warehouse_db
+from entity_index import entity_index
+from refresh_scheduler import scheduler, REFRESH_SCHEDULER_ENABLED
+from shared_cache import shared_cache
+from chat_sessions import session_store
+from product_cache import product_cache
+from admission import admission, AdmissionMiddleware, ADMISSION_ENABLED
+from static_panel import static_panel, WEB_PANEL_ENABLED, WEB_PANEL_PATH
+from response_format import CompressionMiddleware, rows_response, RESPONSE_COMPRESSION_ENABLED
+import query_profiler
+import traffic_capture
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+# Off by default: the replica is per-worker memory plus a periodic scan, and only NLUProcessor.generate_context_prompt
+# reads it; the API's prompts are built by context_builder from the shared snapshots
+INVENTORY_REPLICA_ENABLED = os.getenv("INVENTORY_REPLICA_ENABLED", "0") == "1"
+
+# Refresh intervals (seconds) for the derived views served from snapshots
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "30"))
+LOW_STOCK_REFRESH_SECONDS = float(os.getenv("LOW_STOCK_REFRESH_SECONDS", "30"))
+REORDER_REFRESH_SECONDS = float(os.getenv("REORDER_REFRESH_SECONDS", "60"))
+REPLICA_REFRESH_SECONDS = float(os.getenv("REPLICA_REFRESH_SECONDS", "15"))
+ENTITY_INDEX_REFRESH_SECONDS = float(os.getenv("ENTITY_INDEX_REFRESH_SECONDS", "30"))
+ORDER_ROLLUP_REFRESH_SECONDS = float(os.getenv("ORDER_ROLLUP_REFRESH_SECONDS", "60"))
+# How often the data version of stored LLM answers is checked, and the most asked questions are answered ahead
+COMPLETION_VERSION_SECONDS = float(os.getenv("COMPLETION_VERSION_SECONDS", "15"))
+COMPLETION_WARMUP_SECONDS = float(os.getenv("COMPLETION_WARMUP_SECONDS", "600"))
+# How often the hit counts of stored LLM answers are written back
+COMPLETION_HIT_FLUSH_SECONDS = float(os.getenv("COMPLETION_HIT_FLUSH_SECONDS", "30"))
+# Most frequent intents, and most asked questions per intent, answered by the warm-up (0 disables it)
+COMPLETION_WARMUP_INTENTS = int(os.getenv("COMPLETION_WARMUP_INTENTS", "5"))
+COMPLETION_WARMUP_PER_INTENT = int(os.getenv("COMPLETION_WARMUP_PER_INTENT", "4"))
+# Upper bound on ids per /warehouse/products/batch request
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", "500"))
+
+def db_view(method: str):
+    """A no-argument function running one DatabaseService method in its own session"""
+    def compute():
+        with DatabaseService() as db_service:
+            return getattr(db_service, method)()
+    compute.__name__ = method
+    return compute
+
+def refresh_inventory_replica() -> Dict[str, int]:
+    """Apply database changes to warehouse_db (the first call replaces the synthetic sample with a full load)"""
+    first_load = warehouse_db.watermark is None
+    with DatabaseService() as db_service:
+        counts = warehouse_db.refresh(db_service)
+    if first_load:
+        logger.info(f"Inventory replica loaded: {counts}")
+    return counts
+
+def refresh_entity_index() -> Dict[str, int]:
+    """Apply catalog changes to the NLU's entity index (the first call loads it in full)"""
+    first_load = entity_index.watermark is None
+    with DatabaseService() as db_service:
+        counts = entity_index.refresh(db_service)
+    if first_load:
+        logger.info(f"Entity index loaded: {counts}")
+    return counts
+
+def refresh_data_version() -> str:
+    """Version stored LLM answers are keyed by: the latest change to products, stock or orders"""
+    with DatabaseService() as db_service:
+        watermark = db_service.get_change_watermark()
+    completion_store.data_version = watermark.isoformat() if watermark else ""
+    return completion_store.data_version
+
+def warm_completion_store() -> Dict[str, int]:
+    """
+    Answer the most asked questions of the most frequent intents at the current data version, with the
+    prompts /chat (first turn) and /warehouse/query would build, so their next askers get a stored answer
+    """
+    refresh_data_version()
+    counts = {"questions": 0, "stored": 0, "generated": 0, "failed": 0}
+    with DatabaseService() as db_service:
+        for endpoint, question, intent in completion_store.frequent_questions(COMPLETION_WARMUP_INTENTS,
+                                                                               COMPLETION_WARMUP_PER_INTENT):
+            counts["questions"] += 1
+            analysis = nlu_processor.analyze_query(question)
+            try:
+                result = llm_router.complete([
+                    {"role": "system", "content": generate_context_prompt_with_db(analysis, db_service)},
+                    {"role": "user", "content": question}
+                ], endpoint=endpoint)
+            except LLMError as e:
+                logger.warning(f"Completion warm-up failed for a {intent} question: {e}")
+                counts["failed"] += 1
+                continue
+            counts["stored" if result.cached else "generated"] += 1
+    if counts["generated"]:
+        logger.info(f"Completion store warmed: {counts}")
+    return counts
+
+# Stats include the per-category product counts
+scheduler.register("stats", db_view("get_warehouse_stats"), STATS_REFRESH_SECONDS)
+scheduler.register("low_stock", db_view("get_low_stock_products"), LOW_STOCK_REFRESH_SECONDS)
+scheduler.register("reorder_suggestions", db_view("get_reorder_suggestions"), REORDER_REFRESH_SECONDS)
+# Rollups live in the database, so one worker per interval brings them up to date for all
+scheduler.register("order_rollups", db_view("refresh_order_rollups"), ORDER_ROLLUP_REFRESH_SECONDS)
+if INVENTORY_REPLICA_ENABLED:
+    # Every worker keeps its own in-memory replica, so this job is not shared
+    scheduler.register("inventory_replica", refresh_inventory_replica, REPLICA_REFRESH_SECONDS, shared=False)
+# Per-worker memory as well
+scheduler.register("entity_index", refresh_entity_index, ENTITY_INDEX_REFRESH_SECONDS, shared=False)
+if completion_store.enabled:
+    # Each worker keys its answers by the version it last saw; one worker per interval runs the warm-up
+    scheduler.register("data_version", refresh_data_version, COMPLETION_VERSION_SECONDS, shared=False)
+    # Hits are counted in each worker's memory
+    scheduler.register("completion_hits", completion_store.flush_hits, COMPLETION_HIT_FLUSH_SECONDS, shared=False)
+    if COMPLETION_WARMUP_INTENTS > 0:
+        scheduler.register("completion_warmup", warm_completion_store, COMPLETION_WARMUP_SECONDS)
+if replica_router.replicas:
+    # Replica lag is measured against this row; one worker writes it
+    scheduler.register("replica_heartbeat", db_view("write_replica_heartbeat"), REPLICA_HEARTBEAT_SECONDS)
+if engine.dialect.name == "sqlite" and sqlite_tuning.SQLITE_TUNING_ENABLED:
+    # Planner statistics and WAL checkpoints for the database file; one worker per interval is enough
+    scheduler.register("sqlite_optimize", lambda: sqlite_tuning.optimize(engine),
+                       sqlite_tuning.SQLITE_OPTIMIZE_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if ADMISSION_ENABLED:
+        admission.size_threadpool()
+    if WEB_PANEL_ENABLED:
+        try:
+            await run_in_threadpool(static_panel.load)
+        except OSError as e:
+            logger.error(f"Web panel not available: {e}")
+    if REFRESH_SCHEDULER_ENABLED:
+        await scheduler.start()
+    else:
+        if INVENTORY_REPLICA_ENABLED:
+            try:
+                await run_in_threadpool(refresh_inventory_replica)
+            except Exception as e:
+                logger.error(f"Inventory replica load failed, keeping sample data: {e}")
+        try:
+            await run_in_threadpool(refresh_entity_index)
+        except Exception as e:
+            logger.error(f"Entity index load failed, resolving IDs by pattern only: {e}")
+        if completion_store.enabled:
+            try:
+                await run_in_threadpool(refresh_data_version)
+            except Exception as e:
+                logger.error(f"Data version check failed, stored LLM answers are keyed without it: {e}")
+    yield
+    await scheduler.stop()
+    completion_store.flush_hits()
 
 app = FastAPI(
     title="AI-Powered Food Management System",
     description="AI-powered restaurant/food management system with natural language interface connected to real database",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
+# Separate concurrency limits, load shedding and rate limits for LLM and database routes
+# (added before CORS so that shed responses still carry CORS headers)
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,9 +197,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/zstd for large responses, negotiated by Accept-Encoding
+if RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Request latency per route for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Optional per-request SQL profiling and slow-query log
+if query_profiler.QUERY_PROFILER_ENABLED:
+    # Reads go to the replicas when there are any, so they are profiled too
+    for profiled_engine in [engine] + replica_engines:
+        query_profiler.install(profiled_engine)
+    app.add_middleware(query_profiler.QueryProfilerMiddleware)
+
+# Optional sanitized request traces for benchmarks/replay.py
+# (added last so that traces time the whole stack, including shed and compressed responses)
+if traffic_capture.TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(traffic_capture.TrafficCaptureMiddleware, exclude=(WEB_PANEL_PATH,))
+
+# The web panel, precompressed and served from memory
+if WEB_PANEL_ENABLED:
+    app.mount(WEB_PANEL_PATH, static_panel, name="web_panel")
+
 # Pydantic models
 class Message(BaseModel):
     message: str = Field(..., description="Natural language query about warehouse operations")
+    session_id: Optional[str] = Field(default=None, description="Session returned by a previous reply; omit to start a new conversation")
 
 class WarehouseQuery(BaseModel):
     query: str = Field(..., description="Natural language warehouse query")
@@ -46,50 +232,14 @@ class WarehouseQuery(BaseModel):
 class APIResponse(BaseModel):
     reply: str
     query_analysis: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.now)
 
 def generate_context_prompt_with_db(query_analysis: Dict[str, Any], db_service: DatabaseService) -> str:
-    """Generate context-aware prompt using real database data"""
-    
-    # Get current database stats
-    stats = db_service.get_warehouse_stats()
-    
-    # Base context
-    context = f"""You are an AI assistant for a food management system. You have access to real-time data from our food database.
-
-Current System Status:
-- Total Products: {stats['total_products']}
-- Low Stock Products: {stats['low_stock_products']}  
-- Total Inventory Value: €{stats['total_inventory_value']:.2f}
-- Product Categories: {', '.join(stats['categories'].keys())}
-- Average Stock Level: {stats['average_stock_level']:.1f} units
-
-Query Intent: {query_analysis.get('intent', 'general')}
-Detected Entities: {query_analysis.get('entities', {})}
-
-You should provide helpful, accurate responses about:
-- Food products and inventory management
-- Stock levels and reorder alerts  
-- Order status and delivery tracking
-- Product categories and pricing
-- Restaurant/food business operations
-
-Be conversational, helpful, and use the real data provided to give accurate information."""
-
-    # Add specific context based on intent
-    if query_analysis.get('intent') == 'low_stock':
-        low_stock = db_service.get_low_stock_products()
-        if low_stock:
-            context += f"\n\nCurrent Low Stock Items ({len(low_stock)} total):\n"
-            for item in low_stock[:5]:  # Show first 5
-                context += f"- {item['name']}: {item['current_stock']} units (reorder at {item['reorder_point']})\n"
-    
-    elif query_analysis.get('intent') == 'inventory_status':
-        context += f"\n\nInventory Summary:\n"
-        for category, count in stats['categories'].items():
-            context += f"- {category}: {count} products\n"
-    
-    return context
+    """Generate context-aware prompt using real database data, within the intent's token budget"""
+    context = context_builder.build(query_analysis, db_service)
+    query_analysis['prompt_tokens'] = context.token_report(query_analysis.get('original_query', ''))
+    return context.prompt
 
 @app.get("/", tags=["Health"])
 def read_root():
@@ -112,47 +262,58 @@ def chat_with_food_agent(message: Message, db: Session = Depends(get_db)):
         # Create database service instance
         db_service = DatabaseService()
         
-        # Analyze the user query
-        query_analysis = nlu_processor.analyze_query(message.message)
-        logger.info(f"Query analysis: {query_analysis}")
+        # One form of the question for the analysis, the prompt and the warm-up counts, so stored answers match
+        question = normalize_question(message.message)
         
-        # Generate context-aware system prompt with real data
-        context_prompt = generate_context_prompt_with_db(query_analysis, db_service)
-        
-        # Prepare the LLM request
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": "llama3-8b-8192",  # Using a known working model
-            "messages": [
+        # Continue the client's conversation (or start one); its turns run one at a time
+        with session_store.checkout(message.session_id) as session:
+            # Analyze the user query; follow-ups inherit the previous turn's intent
+            query_analysis = session.resolve_followup(nlu_processor.analyze_query(question))
+            logger.info(f"Query analysis: {query_analysis}")
+            traffic_capture.annotate(i=query_analysis['intent'].value, sid=traffic_capture.pseudonym(session.id))
+            
+            # Generate context-aware system prompt with real data
+            context_prompt = generate_context_prompt_with_db(query_analysis, db_service)
+            history = session.prompt_messages()
+            history_tokens = session.prompt_tokens()
+            if not history:
+                # First turns are what the completion warm-up answers ahead of time
+                completion_store.record_question("chat", question, query_analysis['intent'].value)
+            query_analysis['prompt_tokens']['history'] = history_tokens
+            query_analysis['prompt_tokens']['total'] += history_tokens
+            
+            # Ask the fastest healthy LLM provider
+            result = llm_router.complete([
                 {"role": "system", "content": context_prompt},
-                {"role": "user", "content": message.message}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000,
-            "stream": False
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        reply = result["choices"][0]["message"]["content"]
+                *history,
+                {"role": "user", "content": question}
+            ], endpoint="chat")
+            reply = result.text
+            query_analysis['llm'] = {"provider": result.provider, "model": result.model, "hedged": result.hedged,
+                                     "cached": result.cached}
+            if llm_router.degraded:
+                query_analysis['llm']['degraded'] = llm_router.degraded
+            
+            session.append("user", question)
+            session.append("assistant", reply)
         
         db_service.close()
         
         return APIResponse(
             reply=reply,
-            query_analysis=query_analysis
+            query_analysis=query_analysis,
+            session_id=session.id
         )
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Service error: {str(e)}")
 
+@app.delete("/chat/sessions/{session_id}", tags=["AI Agent"])
+def end_chat_session(session_id: str):
+    """Forget a conversation's history"""
+    return {"session_id": session_id, "deleted": session_store.delete(session_id)}
+
 @app.post("/warehouse/query", response_model=APIResponse, tags=["Food Management"])
 def advanced_food_query(warehouse_query: WarehouseQuery, db: Session = Depends(get_db)):
     """
@@ -162,8 +323,10 @@ def advanced_food_query(warehouse_query: WarehouseQuery, db: Session = Depends(g
         # Create database service instance
         db_service = DatabaseService()
         
-        # Analyze the query
-        analysis = nlu_processor.analyze_query(warehouse_query.query)
+        # Analyze the query, in the form stored answers are keyed by
+        question = normalize_question(warehouse_query.query)
+        analysis = nlu_processor.analyze_query(question)
+        traffic_capture.annotate(i=analysis['intent'].value)
         
         # Generate response based on intent
         if analysis['intent'] == QueryIntent.WAREHOUSE_STATS:
@@ -175,28 +338,16 @@ def advanced_food_query(warehouse_query: WarehouseQuery, db: Session = Depends(g
         else:
             # Use LLM for complex queries
             context_prompt = generate_context_prompt_with_db(analysis, db_service)
+            completion_store.record_question("warehouse_query", question, analysis['intent'].value)
             
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": "llama3-8b-8192",
-                "messages": [
-                    {"role": "system", "content": context_prompt},
-                    {"role": "user", "content": warehouse_query.query}
-                ],
-                "temperature": 0.5,
-                "max_tokens": 800,
-                "stream": False
-            }
-
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            response_text = result["choices"][0]["message"]["content"]
+            result = llm_router.complete([
+                {"role": "system", "content": context_prompt},
+                {"role": "user", "content": question}
+            ], endpoint="warehouse_query")
+            response_text = result.text
+            analysis['llm'] = {"provider": result.provider, "model": result.model, "cached": result.cached}
+            if llm_router.degraded:
+                analysis['llm']['degraded'] = llm_router.degraded
         
         db_service.close()
         
@@ -213,10 +364,7 @@ def advanced_food_query(warehouse_query: WarehouseQuery, db: Session = Depends(g
 def get_food_statistics(db: Session = Depends(get_db)):
     """Get comprehensive food management statistics"""
     try:
-        db_service = DatabaseService()
-        stats = db_service.get_warehouse_stats()
-        db_service.close()
-        return stats
+        return scheduler.value("stats")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -224,9 +372,7 @@ def get_food_statistics(db: Session = Depends(get_db)):
 def get_low_stock_products(db: Session = Depends(get_db)):
     """Get products with stock levels below reorder point"""
     try:
-        db_service = DatabaseService()
-        low_stock = db_service.get_low_stock_products()
-        db_service.close()
+        low_stock = scheduler.value("low_stock")
         
         return {
             "low_stock_count": len(low_stock),
@@ -235,40 +381,181 @@ def get_low_stock_products(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/warehouse/reorder-suggestions", tags=["Food Management"])
+def get_reorder_suggestions():
+    """Get suggested reorder quantities for low-stock products, most urgent first"""
+    try:
+        suggestions = scheduler.value("reorder_suggestions")
+        return {
+            "suggestion_count": len(suggestions),
+            "estimated_total_cost": round(sum(s["estimated_cost"] for s in suggestions), 2),
+            "suggestions": suggestions
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/warehouse/products", tags=["Food Management"])
-def get_all_products(db: Session = Depends(get_db)):
-    """Get all products in the food management system"""
+def get_all_products(db: Session = Depends(get_db), accept: Optional[str] = Header(None)):
+    """Get all products in the food management system (columnar with `Accept: application/x-columnar+json`)"""
     try:
         db_service = DatabaseService()
         products = db_service.get_products()
         db_service.close()
-        return products
+        return rows_response(accept, products)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/warehouse/shipments", tags=["Food Management"])
-def get_all_shipments(db: Session = Depends(get_db)):
-    """Get all shipments/orders in the food management system"""
+def get_all_shipments(db: Session = Depends(get_db), accept: Optional[str] = Header(None)):
+    """Get all shipments/orders in the food management system (columnar with `Accept: application/x-columnar+json`)"""
     try:
         db_service = DatabaseService()
         shipments = db_service.get_orders()
         db_service.close()
-        return shipments
+        return rows_response(accept, shipments)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/warehouse/products/batch", tags=["Food Management"])
+def get_products_batch(ids: str = Query(..., description="Comma-separated product IDs")):
+    """Get many products at once; IDs that are unknown, inactive or deleted are listed under `missing`"""
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not product_ids or len(product_ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {PRODUCT_BATCH_MAX_IDS} ids are required")
+    
+    try:
+        with DatabaseService() as db_service:
+            products = db_service.get_products_by_ids(product_ids)
+        unique_ids = list(dict.fromkeys(product_ids))
+        return {
+            "products": [products[product_id] for product_id in unique_ids if product_id in products],
+            "missing": [product_id for product_id in unique_ids if product_id not in products]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/warehouse/product/{product_id}", tags=["Food Management"])
-def get_product_details(product_id: int, db: Session = Depends(get_db)):
+def get_product_details(product_id: int):
     """Get detailed information about a specific product"""
     try:
-        db_service = DatabaseService()
-        product = db_service.get_product_by_id(product_id)
-        db_service.close()
+        with DatabaseService() as db_service:
+            product = db_service.get_products_by_ids([product_id]).get(product_id)
         
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
         return product
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/warehouse/categories/rollups", tags=["Analytics"])
+def get_category_rollups(parent_id: int = Query(0, ge=0, description="Parent category (0 for the top level)")):
+    """Product count, stock units, stock value and low-stock products for each child category's whole subtree"""
+    try:
+        with DatabaseService() as db_service:
+            db_service.refresh_category_index()
+            categories = db_service.get_child_category_rollups(parent_id)
+        return {"parent_id": parent_id, "categories": categories}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/warehouse/categories/{category_id}/rollup", tags=["Analytics"])
+def get_category_rollup(category_id: int):
+    """Product count, stock units, stock value and low-stock products for a category and all categories below it"""
+    try:
+        with DatabaseService() as db_service:
+            db_service.refresh_category_index()
+            rollup = db_service.get_category_rollup(category_id)
+        if rollup is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return rollup
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/warehouse/analytics/orders", tags=["Analytics"])
+def get_order_analytics(
+    start: Optional[datetime] = Query(None, alias="from", description="Start of the range (defaults to 7 days before 'to')"),
+    end: Optional[datetime] = Query(None, alias="to", description="End of the range (defaults to now)"),
+    bucket: str = Query("day", pattern="^(hour|day)$", description="Time bucket: hour or day")
+):
+    """Get order count, revenue, tax and discounts over time, by order status and type"""
+    try:
+        end = end or datetime.now()
+        start = start or end - timedelta(days=7)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+        
+        db_service = DatabaseService()
+        if not REFRESH_SCHEDULER_ENABLED:
+            # Nothing refreshes the rollups in the background
+            db_service.refresh_order_rollups()
+        series = db_service.get_order_analytics(start, end, bucket)
+        db_service.close()
+        
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "bucket": bucket,
+            "series": series,
+            "totals": {
+                "order_count": sum(p['order_count'] for p in series),
+                "revenue": round(sum(p['revenue'] for p in series), 2),
+                "tax": round(sum(p['tax'] for p in series), 2),
+                "discounts": round(sum(p['discounts'] for p in series), 2)
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/changes", tags=["Sync"])
+def get_changes(
+    since: Optional[str] = Query(None, description="Cursor returned by the previous call or by /changes/head"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum number of changes to return")
+):
+    """Get categories, products, stock rows and orders changed after a cursor, oldest first, with tombstones for deleted products"""
+    try:
+        after = decode_change_cursor(since) if since else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        with DatabaseService() as db_service:
+            return db_service.get_changes(after, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/changes/head", tags=["Sync"])
+def get_change_head():
+    """Get a cursor from which /changes returns only what changes from now on; take it before seeding from /changes/rows"""
+    try:
+        with DatabaseService() as db_service:
+            return {"cursor": db_service.get_change_head()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/changes/rows/{table}", tags=["Sync"])
+def get_table_rows(
+    table: str,
+    after_id: Optional[int] = Query(None, description="next_after_id of the previous page; omit for the first page"),
+    limit: int = Query(1000, ge=1, le=5000, description="Maximum number of rows to return"),
+    newest_first: bool = Query(False, description="Page by descending ID, e.g. to load only the latest orders")
+):
+    """Get one page of a feed table's rows in the /changes row format, by ID, to seed a local copy"""
+    if table not in dict(CHANGE_FEED_TABLES):
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    
+    try:
+        with DatabaseService() as db_service:
+            return db_service.get_table_rows(table, after_id, limit, newest_first)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -276,6 +563,23 @@ def get_product_details(product_id: int, db: Session = Depends(get_db)):
 @app.get("/health", tags=["System"])
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
-
+    return {
+        "status": "degraded" if llm_router.degraded else "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "llm_providers": llm_router.status(),
+        "llm_degraded": llm_router.degraded,
+        "coalescing": coalescing_stats(),
+        "snapshots": scheduler.status(),
+        "admission": admission.status(),
+        "chat_sessions": session_store.stats(),
+        "entity_index": entity_index.status(),
+        "read_replicas": replica_router.status(),
+        "product_cache": product_cache.stats(),
+        "completion_store": completion_store.stats(),
+        "worker": {"pid": os.getpid(), "shared_cache": shared_cache.name}
+    }
 
+@app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Service metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
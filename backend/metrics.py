@@ -0,0 +1,265 @@
+"""
+Prometheus-style metrics for the backend
+This module keeps counters, gauges and histograms in process memory and renders them in the Prometheus text format
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; covers in-memory lookups through slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._series.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._series.items())
+        lines = self._header()
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A gauge whose value is either set directly or read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._series[labels] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = dict(self._series)
+        if self.callback is not None:
+            try:
+                series.update(self.callback())
+            except Exception:
+                pass
+        lines = self._header()
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted((labels, list(s.counts), s.total, s.count) for labels, s in self._series.items())
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+db_method_duration = registry.histogram(
+    "db_method_duration_seconds", "DatabaseService method latency as seen by callers", ("method",))
+db_statements = registry.counter(
+    "db_statements_total", "SQL statements executed, by the DatabaseService method that issued them", ("method",))
+db_statement_duration = registry.counter(
+    "db_statement_seconds_total", "Time spent executing SQL statements, by DatabaseService method", ("method",))
+llm_request_duration = registry.histogram(
+    "llm_request_duration_seconds", "LLM completion latency by provider", ("provider", "model"))
+llm_tokens = registry.counter(
+    "llm_tokens_total", "LLM tokens by provider and kind (prompt/completion)", ("provider", "kind"))
+llm_errors = registry.counter(
+    "llm_errors_total", "Failed LLM completions by provider", ("provider",))
+nlu_duration = registry.histogram(
+    "nlu_analyze_duration_seconds", "Time spent in NLUProcessor.analyze_query",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+cache_requests = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+
+# Name of the DatabaseService method currently running in this context, for statement attribution
+current_db_method: contextvars.ContextVar[str] = contextvars.ContextVar("current_db_method", default="other")
+
+
+def instrument_methods(cls, names: Iterable[str]):
+    """Time the named methods of a class into db_method_duration and attribute their SQL statements"""
+    for name in names:
+        method = getattr(cls, name)
+
+        def wrap(method, name=name):
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                token = current_db_method.set(name)
+                started = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    db_method_duration.observe(time.perf_counter() - started, name)
+                    current_db_method.reset(token)
+            return wrapper
+
+        setattr(cls, name, wrap(method))
+
+
+def instrument_engine(engine):
+    """Count SQL statements and their execution time per DatabaseService method"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        method = current_db_method.get()
+        db_statements.inc(method)
+        db_statement_duration.inc(method, amount=time.perf_counter() - started)
+
+
+def pool_gauges(engine):
+    """Expose connection pool usage, read at scrape time"""
+    def collect():
+        pool = engine.pool
+        values = {}
+        for stat in ("size", "checkedout", "overflow", "checkedin"):
+            reader = getattr(pool, stat, None)
+            if callable(reader):
+                values[(stat,)] = float(reader())
+        return values
+
+    registry.gauge("db_pool_connections", "Database connection pool usage", ("state",), collect)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by its route template (not the raw path)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"], getattr(route, "path", "unmatched"), status_holder[0]
+            )
@@ -4,9 +4,13 @@ This module analyzes user queries and determines intent and extracts relevant in
 """
 
 import re
+import time
 from typing import Dict, List, Any, Optional
 from enum import Enum
 
+from metrics import nlu_duration
+from entity_index import entity_index, product_key
+
 class QueryIntent(Enum):
     INVENTORY_STATUS = "inventory_status"
     LOW_STOCK = "low_stock"
@@ -48,7 +52,6 @@ class NLUProcessor:
             ],
             QueryIntent.CATEGORY_QUERY: [
                 r"category|type.*product|products.*in.*category",
-                r"electronics|clothing|books|sports|home.*garden",
                 r"what.*categories|list.*categories"
             ],
             QueryIntent.REORDER_SUGGESTIONS: [
@@ -61,32 +64,38 @@ class NLUProcessor:
                 r"how.*use|guide|assistance"
             ]
         }
-        
-        self.category_mapping = {
-            "electronics": "Electronics",
-            "clothing": "Clothing",
-            "fashion": "Clothing",
-            "books": "Books",
-            "sports": "Sports",
-            "home": "Home & Garden",
-            "garden": "Home & Garden"
-        }
     
     def analyze_query(self, query: str) -> Dict[str, Any]:
         """
         Analyze user query and extract intent and entities
         """
+        started = time.perf_counter()
         query = query.lower().strip()
         
         intent = self._detect_intent(query)
         entities = self._extract_entities(query, intent)
-        
-        return {
+        confidence = self._calculate_confidence(query, intent)
+        
+        # An order number settles the intent; a query that only names a catalog entity ("brioche?",
+        # "cold drinks") is probably about that entity, unless it follows up on an earlier question
+        inferred = False
+        if intent == QueryIntent.UNKNOWN and 'order_id' in entities:
+            intent = QueryIntent.SHIPMENT_STATUS
+            confidence = 0.6
+        elif intent == QueryIntent.UNKNOWN and ('product_id' in entities or 'category' in entities):
+            intent = QueryIntent.PRODUCT_INFO if 'product_id' in entities else QueryIntent.CATEGORY_QUERY
+            confidence = 0.5
+            inferred = True
+        
+        analysis = {
             "intent": intent,
             "entities": entities,
             "original_query": query,
-            "confidence": self._calculate_confidence(query, intent)
+            "confidence": confidence,
+            "intent_inferred": inferred
         }
+        nlu_duration.observe(time.perf_counter() - started)
+        return analysis
     
     def _detect_intent(self, query: str) -> QueryIntent:
         """Detect the intent of the user query"""
@@ -98,24 +107,19 @@ class NLUProcessor:
     
     def _extract_entities(self, query: str, intent: QueryIntent) -> Dict[str, Any]:
         """Extract relevant entities based on the detected intent"""
-        entities = {}
+        # Categories, products and orders named in the query, resolved against the database
+        entities = entity_index.resolve(query)
         
-        # Extract product ID
+        # Extract product ID, as an int like the index's
         product_id_match = re.search(r'prd-?\d{4}', query, re.IGNORECASE)
-        if product_id_match:
-            entities['product_id'] = product_id_match.group().upper().replace('-', '-') if '-' not in product_id_match.group() else product_id_match.group().upper()
+        if product_id_match and 'product_id' not in entities:
+            entities['product_id'] = product_key(product_id_match.group())
         
         # Extract shipment ID
         shipment_id_match = re.search(r'shp-?\d{4}', query, re.IGNORECASE)
         if shipment_id_match:
             entities['shipment_id'] = shipment_id_match.group().upper().replace('-', '-') if '-' not in shipment_id_match.group() else shipment_id_match.group().upper()
         
-        # Extract category
-        for key, value in self.category_mapping.items():
-            if key in query:
-                entities['category'] = value
-                break
-        
         # Extract status keywords
         status_keywords = ['pending', 'in_transit', 'delivered', 'delayed', 'urgent', 'critical']
         for status in status_keywords:
@@ -155,13 +159,16 @@ class NLUProcessor:
             if 'product_id' in entities:
                 product = warehouse_data.get_product_by_id(entities['product_id'])
                 if product:
-                    context += f"The user is asking about product {product.name} (ID: {product.id}). Current stock: {product.stock_level}, Location: {product.location}, Reorder point: {product.reorder_point}. "
+                    context += f"The user is asking about product {product.name} (ID: {product.id}). Current stock: {product.stock_level}, "
+                    if product.location:
+                        context += f"Location: {product.location}, "
+                    context += f"Reorder point: {product.reorder_point}. "
         
         elif intent == QueryIntent.LOW_STOCK:
-            low_stock = warehouse_data.get_low_stock_products()
-            context += f"There are currently {len(low_stock)} products with low stock levels. "
+            low_stock = warehouse_data.get_low_stock_products(limit=5)
+            context += f"There are currently {warehouse_data.count_low_stock_products()} products with low stock levels. "
             if low_stock:
-                context += "Low stock products: " + ", ".join([f"{p.name} ({p.stock_level} units)" for p in low_stock[:5]])
+                context += "Low stock products: " + ", ".join([f"{p.name} ({p.stock_level} units)" for p in low_stock])
         
         elif intent == QueryIntent.WAREHOUSE_STATS:
             stats = warehouse_data.get_warehouse_stats()
@@ -169,13 +176,13 @@ class NLUProcessor:
         
         elif intent == QueryIntent.CATEGORY_QUERY:
             if 'category' in entities:
-                products = warehouse_data.get_products_by_category(entities['category'])
-                context += f"Found {len(products)} products in {entities['category']} category. "
+                count = warehouse_data.count_products_by_category(entities['category'])
+                context += f"Found {count} products in {entities['category']} category. "
         
         elif intent == QueryIntent.SHIPMENT_STATUS:
             if 'status' in entities:
-                shipments = warehouse_data.get_shipments_by_status(entities['status'])
-                context += f"There are {len(shipments)} shipments with {entities['status']} status. "
+                count = warehouse_data.count_shipments_by_status(entities['status'])
+                context += f"There are {count} shipments with {entities['status']} status. "
         
         context += "Provide helpful, accurate information based on the warehouse data and respond in a professional but friendly manner."
         
@@ -0,0 +1,123 @@
+"""
+Per-product cache for ID lookups
+This module keeps recently requested products in a bounded LRU keyed by ID. A cached product is served as long
+as its updated_at in the database still matches; that check reads only (id, updated_at) for the whole batch,
+and entries checked within the last few seconds are served without asking the database at all. updated_at may
+only have one-second resolution, so a row read while its second could still receive writes is never trusted
+on updated_at alone; it is reloaded on its next check
+"""
+
+import collections
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import registry
+
+load_dotenv()
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+# Entries checked against updated_at this recently are trusted without another check; 0 checks on every lookup
+PRODUCT_CACHE_FRESH_SECONDS = float(os.getenv("PRODUCT_CACHE_FRESH_SECONDS", "2"))
+# Rows updated this recently when loaded (by the writers' local clock, as for the change feed) are not validated
+# by updated_at: another write within the same second would leave it unchanged
+PRODUCT_CACHE_SETTLE_SECONDS = float(os.getenv("PRODUCT_CACHE_SETTLE_SECONDS", "2"))
+
+product_cache_lookups = registry.counter(
+    "product_cache_lookups_total", "Product ID lookups by outcome (fresh, revalidated, changed, miss)",
+    ("outcome",))
+
+
+class _Entry:
+    __slots__ = ("updated_at", "checked_at", "data")
+
+    def __init__(self, updated_at: Optional[datetime], checked_at: float, data: Dict[str, Any]):
+        self.updated_at = updated_at
+        self.checked_at = checked_at
+        self.data = data
+
+
+class ProductCache:
+    """
+    `versions(ids)` returns {id: updated_at} for the products that are still active; `load(ids)` returns their
+    rows as dicts. Neither is called under the lock, so slow queries never block cache hits.
+    """
+
+    def __init__(self, max_entries: int = PRODUCT_CACHE_SIZE, fresh_seconds: float = PRODUCT_CACHE_FRESH_SECONDS,
+                 settle_seconds: float = PRODUCT_CACHE_SETTLE_SECONDS):
+        self.max_entries = max_entries
+        self.fresh_seconds = fresh_seconds
+        self.settle_seconds = settle_seconds
+        self._lock = threading.Lock()
+        self._entries: "collections.OrderedDict[int, _Entry]" = collections.OrderedDict()
+        self.evicted = 0
+
+    def _store(self, product_id: int, entry: _Entry):
+        self._entries[product_id] = entry
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def get_many(self, ids: Iterable[int], versions: Callable[[List[int]], Dict[int, Optional[datetime]]],
+                 load: Callable[[List[int]], List[Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """Active products by ID; unknown, inactive and deleted IDs are left out"""
+        found: Dict[int, Dict[str, Any]] = {}
+        cached: Dict[int, _Entry] = {}
+        missing: List[int] = []
+        now = time.monotonic()
+        with self._lock:
+            for product_id in dict.fromkeys(ids):
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    missing.append(product_id)
+                elif now - entry.checked_at < self.fresh_seconds:
+                    found[product_id] = entry.data
+                    self._entries.move_to_end(product_id)
+                else:
+                    cached[product_id] = entry
+        product_cache_lookups.inc("fresh", amount=len(found))
+        product_cache_lookups.inc("miss", amount=len(missing))
+
+        if cached:
+            current = versions(list(cached))
+            checked_at = time.monotonic()
+            revalidated = 0
+            with self._lock:
+                for product_id, entry in cached.items():
+                    if product_id not in current:
+                        self._entries.pop(product_id, None)
+                    elif entry.updated_at is not None and current[product_id] == entry.updated_at:
+                        entry.checked_at = checked_at
+                        self._store(product_id, entry)
+                        found[product_id] = entry.data
+                        revalidated += 1
+                    else:
+                        missing.append(product_id)
+            product_cache_lookups.inc("revalidated", amount=revalidated)
+            product_cache_lookups.inc("changed", amount=len(cached) - revalidated)
+
+        if missing:
+            rows = load(missing)
+            checked_at = time.monotonic()
+            settled = datetime.now() - timedelta(seconds=self.settle_seconds)
+            with self._lock:
+                for row in rows:
+                    # Without a settled updated_at the entry is served while fresh, then always reloaded
+                    updated_at = row.get("updated_at")
+                    self._store(row["id"], _Entry(updated_at if updated_at and updated_at <= settled else None,
+                                                  checked_at, row))
+                    found[row["id"]] = row
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "evicted": self.evicted}
+
+
+# Global product cache instance
+product_cache = ProductCache()
@@ -0,0 +1,134 @@
+"""
+Slow-query log and per-request SQL profiler
+This module hooks SQLAlchemy cursor events to record every statement issued while serving a request,
+logs requests and statements over configurable thresholds and can report a summary in an X-Query-Stats header
+"""
+
+import contextvars
+import heapq
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+QUERY_PROFILER_ENABLED = os.getenv("QUERY_PROFILER_ENABLED", "0") == "1"
+QUERY_STATS_HEADER = os.getenv("QUERY_STATS_HEADER", "0") == "1"
+# A single statement slower than this is logged on its own
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# A request is logged when it issues more statements, or spends more time in the database, than this
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", "50"))
+SLOW_REQUEST_DB_MS = float(os.getenv("SLOW_REQUEST_DB_MS", "500"))
+# How many of the slowest statements are kept per request
+KEEP_SLOWEST = 5
+
+
+class RequestProfile:
+    """Statements issued while serving one request"""
+
+    __slots__ = ("label", "count", "total", "slowest", "_seq")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.total = 0.0
+        self.slowest: List[Tuple[float, int, str, Any]] = []
+        self._seq = 0
+
+    def record(self, duration: float, statement: str, parameters: Any):
+        self.count += 1
+        self.total += duration
+        self._seq += 1
+        entry = (duration, self._seq, statement, parameters)
+        if len(self.slowest) < KEEP_SLOWEST:
+            heapq.heappush(self.slowest, entry)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "queries": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "slowest": [
+                {"ms": round(duration * 1000, 2), "statement": _short_sql(statement), "parameters": _short(parameters)}
+                for duration, _, statement, parameters in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def header_value(self) -> str:
+        slowest = max((entry[0] for entry in self.slowest), default=0.0)
+        return f"count={self.count};total_ms={self.total * 1000:.2f};slowest_ms={slowest * 1000:.2f}"
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("query_profile", default=None)
+
+
+def _short(parameters: Any, limit: int = 200) -> str:
+    text = repr(parameters)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _short_sql(statement: str, limit: int = 300) -> str:
+    text = " ".join(statement.split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def install(engine):
+    """Attach the profiler to an engine's cursor events"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["profiler_started"].pop()
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.record(duration, statement, parameters)
+        if duration * 1000 >= SLOW_QUERY_MS:
+            logger.warning(f"Slow query ({duration * 1000:.1f} ms) in {profile.label if profile else 'background'}: "
+                           f"{_short_sql(statement)} {_short(parameters)}")
+
+
+def start(label: str) -> Tuple[RequestProfile, contextvars.Token]:
+    profile = RequestProfile(label)
+    return profile, _current_profile.set(profile)
+
+
+def finish(profile: RequestProfile, token: contextvars.Token):
+    _current_profile.reset(token)
+    if profile.count > SLOW_REQUEST_QUERIES or profile.total * 1000 > SLOW_REQUEST_DB_MS:
+        logger.warning(f"Query-heavy request {profile.label}: {profile.summary()}")
+
+
+class QueryProfilerMiddleware:
+    """Pure ASGI middleware opening a profile per HTTP request"""
+
+    def __init__(self, app, header: bool = QUERY_STATS_HEADER):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile, token = start(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if self.header and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-stats", profile.header_value().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish(profile, token)
@@ -0,0 +1,181 @@
+"""
+Background refresh scheduler for derived data
+This module recomputes expensive views (stats, low-stock sets, reorder suggestions, ...) on an asyncio schedule
+so requests can be served from the latest completed snapshot instead of computing them inline
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from shared_cache import shared_cache
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+REFRESH_SCHEDULER_ENABLED = os.getenv("REFRESH_SCHEDULER_ENABLED", "1") == "1"
+# Each wait is the interval scaled by a random factor in [1 - jitter, 1 + jitter], so workers drift apart
+REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", "0.1"))
+
+
+class Snapshot:
+    __slots__ = ("value", "computed_at", "duration")
+
+    def __init__(self, value: Any, computed_at: float, duration: float):
+        self.value = value
+        self.computed_at = computed_at
+        self.duration = duration
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.computed_at
+
+
+class RefreshJob:
+    def __init__(self, name: str, fn: Callable[[], Any], interval: float, jitter: float = REFRESH_JITTER,
+                 shared: bool = True):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        # Shared jobs are computed by one worker per interval and published through the shared cache
+        self.shared = shared
+        self.snapshot: Optional[Snapshot] = None
+        self.running = False
+        self.runs = 0
+        self.adopted = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    def next_delay(self, rng: random.Random) -> float:
+        return max(0.0, self.interval * (1 + rng.uniform(-self.jitter, self.jitter)))
+
+    def status(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "interval_seconds": self.interval,
+            "snapshot_age_seconds": round(snapshot.age, 3) if snapshot else None,
+            "computed_at": datetime.fromtimestamp(snapshot.computed_at).isoformat() if snapshot else None,
+            "last_refresh_ms": round(snapshot.duration * 1000, 2) if snapshot else None,
+            "running": self.running,
+            "runs": self.runs,
+            "adopted": self.adopted,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+        }
+
+
+class RefreshScheduler:
+    """
+    Runs each registered job in a worker thread on its own jittered interval. A job never overlaps with
+    itself: a run that comes due while the previous one is still going is skipped. Readers always get the
+    last completed snapshot; a failed run keeps the previous one.
+
+    With a shared cache, workers compete for a per-interval lease on each shared job: the winner computes
+    and publishes the snapshot, the others adopt the published copy instead of hitting the database too.
+    """
+
+    def __init__(self, cache=None, seed: Optional[int] = None):
+        self.cache = cache
+        self._jobs: Dict[str, RefreshJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._rng = random.Random(seed)
+
+    def register(self, name: str, fn: Callable[[], Any], interval: float, jitter: float = REFRESH_JITTER,
+                 shared: bool = True) -> RefreshJob:
+        job = self._jobs[name] = RefreshJob(name, fn, interval, jitter, shared)
+        return job
+
+    async def _adopt(self, job: RefreshJob) -> bool:
+        """Take the published snapshot if another worker holds this interval's lease"""
+        lease_ttl = job.interval * (1 - job.jitter)
+        if await asyncio.to_thread(self.cache.add, f"refresh-lease:{job.name}", None, lease_ttl):
+            return False
+        published = await asyncio.to_thread(self.cache.get, f"snapshot:{job.name}")
+        if published is None:
+            return False
+        if job.snapshot is None or published["computed_at"] > job.snapshot.computed_at:
+            job.snapshot = Snapshot(published["value"], published["computed_at"], published["duration"])
+        job.adopted += 1
+        return True
+
+    async def _publish(self, job: RefreshJob):
+        snapshot = job.snapshot
+        await asyncio.to_thread(self.cache.set, f"snapshot:{job.name}", {
+            "value": snapshot.value, "computed_at": snapshot.computed_at, "duration": snapshot.duration
+        }, job.interval * 10)
+
+    async def run_job(self, name: str) -> bool:
+        """Refresh one snapshot now; returns False if the job was already running"""
+        job = self._jobs[name]
+        if job.running:
+            job.skipped += 1
+            return False
+
+        job.running = True
+        started = time.perf_counter()
+        try:
+            if job.shared and self.cache is not None and await self._adopt(job):
+                return True
+            value = await asyncio.to_thread(job.fn)
+            job.snapshot = Snapshot(value, time.time(), time.perf_counter() - started)
+            job.last_error = None
+            if job.shared and self.cache is not None:
+                await self._publish(job)
+            return True
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Refresh of {name} failed: {e}")
+            return True
+        finally:
+            job.runs += 1
+            job.running = False
+
+    async def _loop(self, job: RefreshJob):
+        while True:
+            await self.run_job(job.name)
+            await asyncio.sleep(job.next_delay(self._rng))
+
+    async def start(self):
+        """Start every job's loop; the first refresh of each runs immediately"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._loop(job), name=f"refresh:{job.name}") for job in self._jobs.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self, name: str) -> Optional[Snapshot]:
+        job = self._jobs.get(name)
+        return job.snapshot if job else None
+
+    def value(self, name: str, fallback: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        The latest completed snapshot of a view. Until the first refresh completes (or when the scheduler
+        is not running) the view is computed inline, by `fallback` if given, else by the job itself.
+        """
+        snapshot = self.snapshot(name)
+        if snapshot is not None:
+            return snapshot.value
+        if fallback is None:
+            fallback = self._jobs[name].fn
+        return fallback()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: job.status() for name, job in self._jobs.items()}
+
+
+# Global scheduler instance; jobs are registered by main
+scheduler = RefreshScheduler(cache=shared_cache)
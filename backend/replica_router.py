@@ -0,0 +1,143 @@
+"""
+Read replica routing
+This module picks the engine read-only queries run on: one of the configured replicas whose replication lag is
+within the limit (round robin), or the primary when none is. Lag is measured from a heartbeat row the service
+writes on the primary and reads back from each replica, so it works the same for MySQL replicas and for two
+SQLite files copied with `python replica_router.py copy primary.db replica.db`.
+"""
+
+import itertools
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import registry
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Comma-separated SQLAlchemy URLs; empty sends every query to the primary
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Replicas further behind than this are skipped until they catch up
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# How long a lag measurement is reused, and how often the primary writes its heartbeat
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+REPLICA_HEARTBEAT_SECONDS = float(os.getenv("REPLICA_HEARTBEAT_SECONDS", "1"))
+
+db_reads = registry.counter("db_read_sessions_total", "Read-only sessions opened, by target engine", ("target",))
+
+
+class Replica:
+    __slots__ = ("engine", "name", "lag", "checked_at", "error")
+
+    def __init__(self, engine):
+        self.engine = engine
+        # repr() of a URL hides its password
+        self.name = repr(engine.url)
+        # Seconds behind the primary; None until measured, or when the replica cannot be read
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self.error: Optional[str] = None
+
+
+class ReplicaRouter:
+    """
+    `probe` reads the primary's last heartbeat time through a replica connection. Lags are re-measured by
+    whichever request finds them stale; concurrent requests keep using the previous measurement meanwhile.
+    """
+
+    def __init__(self, primary, replicas: List[Any], probe: Callable[[Any], Optional[datetime]],
+                 max_lag: float = REPLICA_MAX_LAG_SECONDS, check_interval: float = REPLICA_LAG_CHECK_SECONDS):
+        self.primary = primary
+        self.replicas = [Replica(engine) for engine in replicas]
+        self.probe = probe
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._checking = threading.Lock()
+        self._turn = itertools.count()
+        registry.gauge("db_replica_lag_seconds", "Measured replication lag per replica (-1 when unknown)",
+                       ("replica",), self._gauges)
+
+    def _check(self, replica: Replica):
+        try:
+            with replica.engine.connect() as conn:
+                beat = self.probe(conn)
+            replica.lag = max(0.0, (datetime.now() - beat).total_seconds()) if beat is not None else None
+            replica.error = None if beat is not None else "no heartbeat"
+        except Exception as e:
+            error = str(e).splitlines()[0]
+            if replica.error != error:
+                logger.warning(f"Replica {replica.name} unavailable: {error}")
+            replica.lag, replica.error = None, error
+        replica.checked_at = time.monotonic()
+
+    def _refresh(self):
+        now = time.monotonic()
+        stale = [r for r in self.replicas if now - r.checked_at >= self.check_interval]
+        if stale and self._checking.acquire(blocking=False):
+            try:
+                for replica in stale:
+                    self._check(replica)
+            finally:
+                self._checking.release()
+
+    def read_engine(self):
+        """A replica within the lag limit, or the primary"""
+        if not self.replicas:
+            return self.primary
+        self._refresh()
+        healthy = [r for r in self.replicas if r.lag is not None and r.lag <= self.max_lag]
+        if not healthy:
+            db_reads.inc("primary")
+            return self.primary
+        replica = healthy[next(self._turn) % len(healthy)]
+        db_reads.inc(replica.name)
+        return replica.engine
+
+    def _gauges(self) -> Dict[Tuple[str, ...], float]:
+        return {(r.name,): r.lag if r.lag is not None else -1.0 for r in self.replicas}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_lag_seconds": self.max_lag,
+            "replicas": [
+                {
+                    "name": r.name,
+                    "lag_seconds": round(r.lag, 3) if r.lag is not None else None,
+                    "healthy": r.lag is not None and r.lag <= self.max_lag,
+                    "error": r.error,
+                }
+                for r in self.replicas
+            ],
+        }
+
+
+def copy_sqlite(primary_path: str, replica_path: str):
+    """Replace a replica file with a consistent snapshot of the primary (stands in for replication locally)"""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "copy":
+        print("Usage: python replica_router.py copy PRIMARY.db REPLICA.db [--every SECONDS]")
+        sys.exit(1)
+    every = float(sys.argv[sys.argv.index("--every") + 1]) if "--every" in sys.argv else 0
+    while True:
+        copy_sqlite(sys.argv[2], sys.argv[3])
+        print(f"🔄 Copied {sys.argv[2]} to {sys.argv[3]}")
+        if not every:
+            break
+        time.sleep(every)
@@ -0,0 +1,169 @@
+"""
+Response encoding for large API payloads
+This module compresses responses above a size threshold with the best encoding the client accepts (zstd when the
+optional `zstandard` package is installed, else gzip) and lets list endpoints answer in a compact columnar format
+(`Accept: application/x-columnar+json`, or MessagePack with the optional `msgpack` package) that sends each
+column once as an array instead of repeating every key in every row
+"""
+
+import gzip
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from anyio import to_thread
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import MutableHeaders
+
+from metrics import registry
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "1") == "1"
+# Smaller bodies go out as they are; a few hundred bytes gain little and cost a compressor per request
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+# Bodies at least this large are compressed in a worker thread instead of on the event loop
+COMPRESS_IN_THREAD_BYTES = 256 * 1024
+
+COLUMNAR_JSON = "application/x-columnar+json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE_TYPES = ("application/json", COLUMNAR_JSON, "text/") + MSGPACK_TYPES
+
+response_bytes = registry.counter(
+    "response_bytes_total", "Response body bytes before and after compression, by encoding",
+    ("encoding", "stage"))
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _msgpack():
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        return None
+
+
+# Server preference, best first; gzip is always available
+ENCODINGS = ("zstd", "gzip") if _zstd() else ("gzip",)
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Encodings from Accept-Encoding that are not refused with q=0"""
+    accepted = []
+    for part in header.split(","):
+        token, _, params = part.partition(";")
+        token, params = token.strip().lower(), params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if token and quality > 0:
+            accepted.append(token)
+    return accepted
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        # Compressor objects are not thread-safe, and creating one is cheap
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing single-message responses of a compressible type. Streamed responses,
+    bodies under the threshold and responses that are already encoded pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    def _choose(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accepted = accepted_encodings(value.decode("latin-1"))
+                return next((encoding for encoding in ENCODINGS if encoding in accepted), None)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._choose(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held: List[Dict[str, Any]] = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                held.append(message)
+                return
+            if message["type"] != "http.response.body" or not held:
+                await send(message)
+                return
+
+            start = held.pop()
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body") or len(body) < self.minimum_size or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESS_IN_THREAD_BYTES:
+                compressed = await to_thread.run_sync(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            response_bytes.inc(encoding, "raw", amount=len(body))
+            response_bytes.inc(encoding, "sent", amount=len(compressed))
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def columnar(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    {"columns": [...], "data": [[one value per row] per column], "count": n}. Columns appear in first-seen
+    order; a row without a column gets null there.
+    """
+    rows = list(rows)
+    columns: Dict[str, int] = {}
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns[key] = len(columns)
+    data = [[row.get(key) for row in rows] for key in columns]
+    return {"columns": list(columns), "data": data, "count": len(rows)}
+
+
+def rows_response(accept: Optional[str], rows: List[Any]) -> Response:
+    """
+    A list endpoint's rows (ORM objects or dicts) in the format the Accept header asks for: MessagePack or
+    columnar JSON when requested (and available), otherwise the usual JSON array of objects
+    """
+    encoded = jsonable_encoder(rows)
+    accept = (accept or "").lower()
+    vary = {"Vary": "Accept"}
+    if any(media_type in accept for media_type in MSGPACK_TYPES) and _msgpack() is not None:
+        body = _msgpack().packb(columnar(encoded), use_bin_type=True)
+        return Response(body, media_type=MSGPACK_TYPES[0], headers=vary)
+    if COLUMNAR_JSON in accept:
+        return JSONResponse(columnar(encoded), media_type=COLUMNAR_JSON, headers=vary)
+    return JSONResponse(encoded, headers=vary)
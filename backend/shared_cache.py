@@ -0,0 +1,271 @@
+"""
+Shared cache for multi-worker deployments
+This module gives every worker process the same view of cached values, counters and leases. The default backend
+is a local SQLite file (no external service); Redis, or a per-process dict for single-worker setups, can be chosen.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND", "sqlite")
+# Next to the SQLite fallback database, so instances in other directories do not share entries
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "./shared_cache.db")
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+SHARED_CACHE_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "warehouse:")
+
+
+def worker_id() -> str:
+    """Identifies this process when it holds a lease"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CacheBackend:
+    """
+    Values are JSON-serializable and stored with an optional TTL in seconds.
+    `add` only writes when the key is absent (or expired) and is what leases are built on;
+    `incr` counts within a window that starts with the first increment, for rate limits.
+    """
+
+    name = ""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """Per-process dict; only coherent with a single worker"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = (value, now + ttl if ttl else None)
+            return True
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            value = (entry[0] if entry else 0) + amount
+            self._data[key] = (value, entry[1] if entry else (now + ttl if ttl else None))
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    A WAL-mode SQLite file shared by every worker on the host. Each thread keeps its own connection;
+    read-modify-write operations run in IMMEDIATE transactions so they are atomic across processes.
+    """
+
+    name = "sqlite"
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str = SHARED_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _read(self, conn: sqlite3.Connection, key: str, now: float) -> Optional[Tuple[str, Optional[float]]]:
+        return conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+        ).fetchone()
+
+    def _write(self, conn: sqlite3.Connection, key: str, value: Any, expires_at: Optional[float]):
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, json.dumps(value, default=str), expires_at))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key):
+        row = self._read(self._connection(), key, time.time())
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        self._write(self._connection(), key, value, time.time() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        with self._transaction() as conn:
+            if self._read(conn, key, now) is not None:
+                return False
+            self._write(conn, key, value, now + ttl if ttl else None)
+            return True
+
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        with self._transaction() as conn:
+            row = self._read(conn, key, now)
+            value = (json.loads(row[0]) if row else 0) + amount
+            self._write(conn, key, value, row[1] if row else (now + ttl if ttl else None))
+            return value
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCache(CacheBackend):
+    """Any Redis-protocol server (Redis, Valkey, KeyDB...); needs the optional `redis` package"""
+
+    name = "redis"
+
+    def __init__(self, url: str = SHARED_CACHE_URL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _ms(ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl else None
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value, default=str), px=self._ms(ttl))
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(key, json.dumps(value, default=str), px=self._ms(ttl), nx=True))
+
+    def incr(self, key, amount=1, ttl=None):
+        value = self.client.incrby(key, amount)
+        if value == amount and ttl:
+            self.client.pexpire(key, self._ms(ttl))
+        return value
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class SharedCache:
+    """Namespaces keys and keeps callers working (as cache misses) when the backend fails"""
+
+    def __init__(self, backend: CacheBackend, prefix: str = SHARED_CACHE_PREFIX):
+        self.backend = backend
+        self.prefix = prefix
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            return self.backend.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Shared cache get failed: {e}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self.backend.set(self.prefix + key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache set failed: {e}")
+
+    def add(self, key: str, value: Any = None, ttl: Optional[float] = None) -> bool:
+        """Write only if absent (by default this worker's ID, for leases); with the backend down every caller wins"""
+        try:
+            return self.backend.add(self.prefix + key, worker_id() if value is None else value, ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache add failed: {e}")
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        try:
+            return self.backend.incr(self.prefix + key, amount, ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache incr failed: {e}")
+            return amount
+
+    def delete(self, key: str):
+        try:
+            self.backend.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Shared cache delete failed: {e}")
+
+
+def build_cache(backend: str = SHARED_CACHE_BACKEND) -> SharedCache:
+    if backend == "redis":
+        try:
+            return SharedCache(RedisCache())
+        except ImportError:
+            logger.warning("SHARED_CACHE_BACKEND=redis but the redis package is not installed; using SQLite")
+    elif backend == "memory":
+        return SharedCache(MemoryCache())
+    return SharedCache(SQLiteCache())
+
+
+# Global shared cache instance
+shared_cache = build_cache()
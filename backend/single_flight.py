@@ -0,0 +1,127 @@
+"""
+Request coalescing (single-flight) for identical concurrent calls
+This module lets concurrent callers with the same key share one in-flight computation instead of repeating it
+"""
+
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from metrics import registry
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") != "0"
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key: the first caller (the leader) runs the function,
+    callers arriving while it is running wait and receive the same result or exception.
+    Results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def flight_group(name: str) -> SingleFlight:
+    """Get (or create) the named single-flight group"""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def coalesced(prefix: str):
+    """
+    Decorator for methods whose result depends only on their arguments: identical concurrent
+    calls (same method, same arguments, any instance) share one execution. Only for methods returning
+    plain data (dicts, lists, scalars); ORM instances belong to the leader's session and thread.
+    """
+    def decorator(method):
+        group = flight_group(f"{prefix}.{method.__name__}")
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not SINGLE_FLIGHT_ENABLED:
+                return method(self, *args, **kwargs)
+            key = (args, tuple(sorted(kwargs.items())))
+            return group.do(key, method, self, *args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Counters for every single-flight group, keyed by group name"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
+
+
+def _metric_values() -> Dict[tuple, float]:
+    values = {}
+    for name, stats in coalescing_stats().items():
+        values[(name, "executed")] = float(stats["executions"])
+        values[(name, "coalesced")] = float(stats["coalesced"])
+    return values
+
+
+registry.gauge("singleflight_calls", "Callers per single-flight group that executed or shared a computation",
+               ("group", "result"), _metric_values)
@@ -0,0 +1,238 @@
+"""
+Static serving for the web panel
+This module builds the panel once (content-hashed file names for the stylesheet and script, gzip and, when the
+optional `brotli` package is installed, brotli variants of every file) and serves the result from memory with
+long-lived cache headers, ETags and Accept-Encoding negotiation. It is mounted by the API and used by web_panel/serve.py.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from response_format import accepted_encodings
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+WEB_PANEL_ENABLED = os.getenv("WEB_PANEL_ENABLED", "1") == "1"
+WEB_PANEL_PATH = os.getenv("WEB_PANEL_PATH", "/panel")
+WEB_PANEL_DIR = os.getenv("WEB_PANEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_panel"))
+# Output of `python web_panel/serve.py build`; without an up-to-date build the panel is built in memory at startup
+WEB_PANEL_DIST = os.getenv("WEB_PANEL_DIST", os.path.join(WEB_PANEL_DIR, "dist"))
+
+ENTRY = "index.html"
+# Pages keep their names; perf.html is the table rendering benchmark
+PAGES = (ENTRY, "perf.html")
+# Referenced from the pages and renamed to include their content hash
+HASHED_ASSETS = ("styles.css", "virtual-table.js", "script.js")
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+}
+# Hashed names never change content; pages are revalidated with its ETag on every load
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+ENTRY_CACHE = "no-cache"
+# Preferred first; identity is always available
+ENCODINGS = ("br", "gzip")
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Each encoding is a different representation, so it gets its own strong ETag
+ETAG_SUFFIXES = {"identity": "", "br": "-br", "gzip": "-gz"}
+MANIFEST = "manifest.json"
+
+
+def content_hash(data: bytes, length: int = 12) -> str:
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{content_hash(data, 10)}{ext}"
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """Every encoding that makes the file smaller, at the highest level (this only runs at build time)"""
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        variants["br"] = brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+class Asset:
+    """One file ready to serve: its bytes per encoding plus the headers that do not depend on the request"""
+
+    __slots__ = ("name", "variants", "etags", "headers")
+
+    def __init__(self, name: str, body: bytes, variants: Dict[str, bytes], cache_control: str):
+        self.name = name
+        self.variants = dict(variants, identity=body)
+        digest = content_hash(body)
+        self.etags = {encoding: f'"{digest}{ETAG_SUFFIXES[encoding]}"' for encoding in self.variants}
+        content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+        self.headers = {
+            encoding: [
+                (b"content-type", content_type.encode()),
+                (b"cache-control", cache_control.encode()),
+                (b"etag", etag.encode()),
+                (b"vary", b"accept-encoding"),
+            ]
+            for encoding, etag in self.etags.items()
+        }
+
+
+class PanelBundle:
+    """The built panel: assets by URL path plus the digests of the sources it was built from"""
+
+    def __init__(self, assets: Dict[str, Asset], sources: Dict[str, str]):
+        self.assets = assets
+        self.sources = sources
+
+
+def source_digests(source_dir: str = WEB_PANEL_DIR) -> Dict[str, str]:
+    digests = {}
+    for name in PAGES + HASHED_ASSETS:
+        with open(os.path.join(source_dir, name), "rb") as f:
+            digests[name] = content_hash(f.read())
+    return digests
+
+
+def build_bundle(source_dir: str = WEB_PANEL_DIR) -> PanelBundle:
+    """Hash the assets, point the pages at the hashed names and precompress everything"""
+    assets: Dict[str, Asset] = {}
+    renames: Dict[str, str] = {}
+    for name in HASHED_ASSETS:
+        with open(os.path.join(source_dir, name), "rb") as f:
+            data = f.read()
+        renames[name] = hashed_name(name, data)
+        assets["/" + renames[name]] = Asset(renames[name], data, compress(data), IMMUTABLE_CACHE)
+
+    referenced = set()
+    for page_name in PAGES:
+        with open(os.path.join(source_dir, page_name), "rb") as f:
+            page = f.read().decode("utf-8")
+        for name, renamed in renames.items():
+            page, count = re.subn(rf'((?:href|src)=")(?:\./)?{re.escape(name)}"', rf'\g<1>{renamed}"', page)
+            if count:
+                referenced.add(name)
+        body = page.encode("utf-8")
+        assets["/" + page_name] = Asset(page_name, body, compress(body), ENTRY_CACHE)
+    for name in set(renames) - referenced:
+        logger.warning(f"No page references {name}")
+    return PanelBundle(assets, source_digests(source_dir))
+
+
+def write_bundle(bundle: PanelBundle, out_dir: str = WEB_PANEL_DIST):
+    """Write every variant next to each other (script.<hash>.js, .gz, .br) plus a manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"sources": bundle.sources, "files": {}}
+    for asset in bundle.assets.values():
+        for encoding, body in asset.variants.items():
+            with open(os.path.join(out_dir, asset.name + SUFFIXES.get(encoding, "")), "wb") as f:
+                f.write(body)
+        manifest["files"][asset.name] = sorted(e for e in asset.variants if e != "identity")
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_bundle(out_dir: str = WEB_PANEL_DIST) -> PanelBundle:
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    assets = {}
+    for name, encodings in manifest["files"].items():
+        variants = {}
+        for encoding in ["identity"] + encodings:
+            with open(os.path.join(out_dir, name + SUFFIXES.get(encoding, "")), "rb") as f:
+                variants[encoding] = f.read()
+        body = variants.pop("identity")
+        assets["/" + name] = Asset(name, body, variants, ENTRY_CACHE if name in PAGES else IMMUTABLE_CACHE)
+    return PanelBundle(assets, manifest["sources"])
+
+
+def load_bundle(source_dir: str = WEB_PANEL_DIR, dist_dir: str = WEB_PANEL_DIST) -> PanelBundle:
+    """The prebuilt bundle if it matches the current sources, otherwise a fresh in-memory build"""
+    try:
+        bundle = read_bundle(dist_dir)
+        if bundle.sources == source_digests(source_dir):
+            return bundle
+        logger.info("Web panel build is out of date; rebuilding in memory")
+    except FileNotFoundError:
+        pass
+    return build_bundle(source_dir)
+
+
+class StaticPanel:
+    """
+    Pure ASGI app serving a PanelBundle from memory. Each response is a lookup plus two sends, so it is not
+    limited by disk or threads; `/` serves index.html and conditional requests are answered with 304.
+    """
+
+    def __init__(self, source_dir: str = WEB_PANEL_DIR, dist_dir: str = WEB_PANEL_DIST):
+        self.source_dir = source_dir
+        self.dist_dir = dist_dir
+        self.bundle: Optional[PanelBundle] = None
+
+    def load(self) -> PanelBundle:
+        self.bundle = load_bundle(self.source_dir, self.dist_dir)
+        return self.bundle
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            # Only reached when served on its own; the API loads the bundle in its own lifespan
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    self.load()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        status, headers, body = self.respond(scope)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    def respond(self, scope) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        if scope["method"] not in ("GET", "HEAD"):
+            return 405, [(b"allow", b"GET, HEAD"), (b"content-length", b"0")], b""
+        bundle = self.bundle or self.load()
+        path = scope["path"]
+        asset = bundle.assets.get("/" + ENTRY if path in ("", "/") else path)
+        if asset is None:
+            return 404, [(b"content-type", b"text/plain"), (b"content-length", b"9")], b"Not Found"
+
+        request_headers = dict(scope["headers"])
+        encoding = "identity"
+        accepted = accepted_encodings(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        for candidate in ENCODINGS:
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+
+        etag = asset.etags[encoding]
+        if_none_match = request_headers.get(b"if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+            if "*" in tags or etag in tags or f"W/{etag}" in tags:
+                return 304, asset.headers[encoding], b""
+
+        body = asset.variants[encoding]
+        headers = asset.headers[encoding] + [(b"content-length", str(len(body)).encode())]
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        return 200, headers, body
+
+
+# Global web panel app
+static_panel = StaticPanel()
+
@@ -3,6 +3,7 @@
 Test script to verify database connectivity and data retrieval
 """
 
+from datetime import datetime, timedelta
 from database_service import DatabaseService
 
 def test_database_connection():
@@ -34,6 +35,11 @@ def test_database_connection():
         low_stock = db_service.get_low_stock_products()
         print(f"Found {len(low_stock)} low stock products")
         
+        print("\n📈 Testing order analytics rollups...")
+        rebuilt = db_service.refresh_order_rollups()
+        analytics = db_service.get_order_analytics(datetime.now() - timedelta(days=30), datetime.now(), "day")
+        print(f"Rebuilt {rebuilt} hourly buckets, {len(analytics)} daily series points")
+        
         db_service.close()
         print("\n✅ All database tests passed!")
         
@@ -0,0 +1,230 @@
+"""
+Traffic capture for replay
+This module records one sanitized trace per HTTP request (route, query string, JSON body, client, status,
+latency and the detected QueryIntent) as a compact JSON line appended to a file. Traces are written from a
+background thread, so capturing adds no file I/O to the request path; benchmarks/replay.py plays them back.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from dotenv import load_dotenv
+
+from admission import client_id
+from metrics import registry
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TRAFFIC_CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE_ENABLED", "0") == "1"
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "./traffic.jsonl")
+# Fraction of requests recorded
+TRAFFIC_CAPTURE_SAMPLE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", "1.0"))
+# Capture stops once the file reaches this size; it is never rotated or truncated
+TRAFFIC_CAPTURE_MAX_MB = float(os.getenv("TRAFFIC_CAPTURE_MAX_MB", "100"))
+# Larger request bodies are recorded by size only
+TRAFFIC_CAPTURE_MAX_BODY = int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY", "8192"))
+TRAFFIC_CAPTURE_EXCLUDE = [p for p in os.getenv(
+    "TRAFFIC_CAPTURE_EXCLUDE", "/metrics,/docs,/redoc,/openapi.json,/favicon.ico").split(",") if p]
+# Longer strings in bodies and query strings are cut to this many characters
+MAX_TEXT = 500
+
+# Fields dropped from bodies and query strings, and fields replaced by a stable pseudonym
+SECRET_FIELDS = re.compile(r"pass(word)?|secret|token|api[_-]?key|auth", re.IGNORECASE)
+PSEUDONYM_FIELDS = {"session_id"}
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+# Phone and card numbers: 9 or more digits, optionally separated by spaces, dots or dashes
+LONG_NUMBER = re.compile(r"\+?\d(?:[ .-]?\d){8,}")
+
+traces_written = registry.counter(
+    "traffic_traces_total", "Request traces captured for replay, by result", ("result",))
+
+
+def pseudonym(value: Any) -> str:
+    """Stable stand-in for an identifier: equal inputs map to equal pseudonyms, the input is not recoverable"""
+    return "p-" + hashlib.sha256(str(value).encode()).hexdigest()[:12]
+
+
+def scrub_text(value: str) -> str:
+    value = LONG_NUMBER.sub("<number>", EMAIL.sub("<email>", value))
+    return value if len(value) <= MAX_TEXT else value[:MAX_TEXT]
+
+
+def sanitize(value: Any, key: str = "") -> Any:
+    """Copy of a decoded JSON body with secrets removed, identifiers pseudonymized and free text scrubbed"""
+    if isinstance(value, dict):
+        return {k: sanitize(v, k) for k, v in value.items() if not SECRET_FIELDS.search(k)}
+    if isinstance(value, list):
+        return [sanitize(v, key) for v in value]
+    if key in PSEUDONYM_FIELDS and value is not None:
+        return pseudonym(value)
+    if isinstance(value, str):
+        return scrub_text(value)
+    return value
+
+
+def sanitize_query(query_string: str) -> str:
+    pairs = [(k, pseudonym(v) if k in PSEUDONYM_FIELDS else scrub_text(v))
+             for k, v in parse_qsl(query_string, keep_blank_values=True) if not SECRET_FIELDS.search(k)]
+    return urlencode(pairs)
+
+
+class _Trace:
+    """Fields an endpoint adds to the current request's trace"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+
+
+_current_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("traffic_trace", default=None)
+
+
+def annotate(**fields: Any):
+    """Attach fields (e.g. the detected intent) to the trace of the request being served; no-op when not capturing"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+class TraceWriter:
+    """Appends trace lines from a daemon thread; one write() per line keeps lines whole across worker processes"""
+
+    def __init__(self, path: str = TRAFFIC_CAPTURE_PATH, max_bytes: int = int(TRAFFIC_CAPTURE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.queue: "queue.SimpleQueue[bytes]" = queue.SimpleQueue()
+        self.full = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        if self.full:
+            traces_written.inc("dropped")
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                    self._thread.start()
+        self.queue.put(json.dumps(record, separators=(",", ":"), default=str).encode() + b"\n")
+
+    def _run(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        size = os.fstat(fd).st_size
+        logger.info(f"Capturing request traces to {self.path}")
+        try:
+            while True:
+                line = self.queue.get()
+                if size + len(line) > self.max_bytes:
+                    self.full = True
+                    logger.warning(f"Traffic capture stopped: {self.path} reached {self.max_bytes} bytes")
+                    traces_written.inc("dropped")
+                    break
+                os.write(fd, line)
+                size += len(line)
+                traces_written.inc("written")
+        finally:
+            os.close(fd)
+
+
+class TrafficCaptureMiddleware:
+    """Pure ASGI middleware recording a sanitized trace of every sampled HTTP request"""
+
+    def __init__(self, app, writer: Optional[TraceWriter] = None, exclude: Iterable[str] = (),
+                 sample: float = TRAFFIC_CAPTURE_SAMPLE):
+        self.app = app
+        self.writer = writer or trace_writer
+        self.exclude = tuple(TRAFFIC_CAPTURE_EXCLUDE) + tuple(exclude)
+        self.sample = sample
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["path"].startswith(self.exclude)
+                or (self.sample < 1.0 and random.random() >= self.sample)):
+            await self.app(scope, receive, send)
+            return
+
+        wall_clock = time.time()
+        started = time.perf_counter()
+        body = bytearray()
+        body_size = 0
+        status_holder = [500]
+
+        async def receive_wrapper():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                if body_size <= TRAFFIC_CAPTURE_MAX_BODY:
+                    body.extend(chunk)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        trace = _Trace()
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            duration = time.perf_counter() - started
+            try:
+                self.writer.write(self._record(scope, wall_clock, duration, status_holder[0], bytes(body),
+                                               body_size, trace.fields))
+            except Exception as e:
+                logger.error(f"Could not record trace for {scope['path']}: {e}")
+
+    @staticmethod
+    def _record(scope, wall_clock: float, duration: float, status: int, body: bytes, body_size: int,
+                fields: Dict[str, Any]) -> Dict[str, Any]:
+        path = scope["path"]
+        for name, value in scope.get("path_params", {}).items():
+            if name in PSEUDONYM_FIELDS:
+                path = path.replace(str(value), pseudonym(value))
+        route = scope.get("route")
+        record: Dict[str, Any] = {
+            "ts": round(wall_clock, 3),
+            "m": scope["method"],
+            "p": path,
+            "r": getattr(route, "path", None),
+            "c": pseudonym(client_id(scope)),
+            "s": status,
+            "ms": round(duration * 1000, 2),
+        }
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        if query_string:
+            record["q"] = sanitize_query(query_string)
+        for name, value in scope.get("headers", []):
+            # Both change what a response costs to produce
+            if name == b"accept" and value != b"*/*":
+                record["a"] = value.decode("latin-1")
+            elif name == b"accept-encoding":
+                record["e"] = value.decode("latin-1")
+        if body_size > TRAFFIC_CAPTURE_MAX_BODY:
+            record["bn"] = body_size
+        elif body:
+            try:
+                record["b"] = sanitize(json.loads(body))
+            except ValueError:
+                record["bn"] = body_size
+        record.update(fields)
+        return record
+
+
+# Global trace writer instance
+trace_writer = TraceWriter()
@@ -1,130 +1,410 @@
 """
-Warehouse data simulation module
-This module simulates warehouse inventory and shipment data for the AI agent
+Warehouse data module
+This module keeps an in-memory read replica of the inventory for the AI agent: products are stored column-wise
+in typed arrays with dict indexes by id, category and status, bulk-loaded from DatabaseService and refreshed
+incrementally. Without a database it falls back to the shared synthetic catalog.
 """
 
+from array import array
 from datetime import datetime, timedelta
+import heapq
+import itertools
+import json
+import os
 import random
-from typing import List, Dict, Any
-from dataclasses import dataclass
+import sys
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Union
+
+from dotenv import load_dotenv
+
+from data_generator import category_rows, iter_products, iter_stock, iter_orders
+from entity_index import product_key
+
+load_dotenv()
+
+# Most recent orders kept as shipments; stock is replicated in full
+SHIPMENT_WINDOW = int(os.getenv("REPLICA_SHIPMENT_WINDOW", "5000"))
+# Refreshes look back this far past the watermark, since DATETIME values may be stored without sub-seconds
+REFRESH_LOOKBACK = timedelta(seconds=1)
 
-@dataclass
 class Product:
-    id: str
-    name: str
-    category: str
-    stock_level: int
-    reorder_point: int
-    unit_price: float
-    location: str
-    supplier: str
-
-@dataclass
+    """A product row materialized from the replica's columns"""
+    __slots__ = ("id", "name", "category", "stock_level", "reorder_point", "unit_price", "location", "supplier")
+
+    def __init__(self, id: str, name: str, category: str, stock_level: int, reorder_point: int,
+                 unit_price: float, location: Optional[str] = None, supplier: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.stock_level = stock_level
+        self.reorder_point = reorder_point
+        self.unit_price = unit_price
+        self.location = location
+        self.supplier = supplier
+
+    def __repr__(self):
+        return f"Product(id={self.id!r}, name={self.name!r}, stock_level={self.stock_level})"
+
 class Shipment:
-    id: str
-    product_id: str
-    quantity: int
-    status: str  # pending, in_transit, delivered, delayed
-    origin: str
-    destination: str
-    expected_date: datetime
-    actual_date: datetime = None
+    """An order seen as a delivery; every field comes from the order row"""
+    __slots__ = ("id", "order_id", "customer_id", "amount", "order_type", "status", "ordered_at", "delivered_at")
+
+    def __init__(self, id: str, order_id: int, customer_id: Optional[int], amount: float, order_type: str,
+                 status: str, ordered_at: Optional[datetime], delivered_at: Optional[datetime] = None):
+        self.id = id
+        self.order_id = order_id
+        self.customer_id = customer_id
+        self.amount = amount
+        self.order_type = order_type
+        self.status = status  # pending, in_transit, delivered, delayed
+        self.ordered_at = ordered_at
+        self.delivered_at = delivered_at
+
+    def __repr__(self):
+        return f"Shipment(id={self.id!r}, status={self.status!r})"
+
+SHIPMENT_STATUS_BY_ORDER_STATUS = {
+    "placed": "pending",
+    "confirmed": "pending",
+    "processing": "in_transit",
+    "delivered": "delivered",
+    "canceled": "delayed",
+}
 
 class WarehouseData:
-    def __init__(self):
-        self.products = self._generate_sample_products()
-        self.shipments = self._generate_sample_shipments()
-    
-    def _generate_sample_products(self) -> List[Product]:
-        """Generate sample product data"""
-        categories = ["Electronics", "Clothing", "Home & Garden", "Sports", "Books"]
-        locations = ["A-01", "A-02", "B-01", "B-02", "C-01", "C-02"]
-        suppliers = ["TechSupply Co", "Fashion World", "Garden Plus", "SportMax", "BookDist"]
-        
-        products = []
-        for i in range(1, 51):  # 50 sample products
-            product = Product(
-                id=f"PRD-{i:04d}",
-                name=f"Product {i}",
-                category=random.choice(categories),
-                stock_level=random.randint(0, 500),
-                reorder_point=random.randint(10, 50),
-                unit_price=round(random.uniform(10.0, 500.0), 2),
-                location=random.choice(locations),
-                supplier=random.choice(suppliers)
-            )
-            products.append(product)
-        return products
-    
-    def _generate_sample_shipments(self) -> List[Shipment]:
-        """Generate sample shipment data"""
-        statuses = ["pending", "in_transit", "delivered", "delayed"]
-        origins = ["Warehouse A", "Warehouse B", "Supplier Hub"]
-        destinations = ["Store 1", "Store 2", "Customer Direct", "Distribution Center"]
-        
-        shipments = []
-        for i in range(1, 31):  # 30 sample shipments
-            expected_date = datetime.now() + timedelta(days=random.randint(-10, 30))
-            actual_date = expected_date + timedelta(days=random.randint(-2, 5)) if random.choice([True, False]) else None
-            
-            shipment = Shipment(
-                id=f"SHP-{i:04d}",
-                product_id=f"PRD-{random.randint(1, 50):04d}",
-                quantity=random.randint(1, 100),
-                status=random.choice(statuses),
-                origin=random.choice(origins),
-                destination=random.choice(destinations),
-                expected_date=expected_date,
-                actual_date=actual_date
-            )
-            shipments.append(shipment)
-        return shipments
-    
-    def get_low_stock_products(self) -> List[Product]:
+    """
+    Column-oriented product store. Row i of every column array describes one product; freed rows are reused.
+    Names live in one UTF-8 buffer addressed by offset/length, so a million SKUs cost about 70 bytes each
+    plus the ID index instead of a Python object per field. Counts used by prompts (low stock, per category,
+    per shipment status) and the stats aggregates are maintained on every write and read in O(1).
+    """
+
+    def __init__(self, num_products: int = 50, num_shipments: int = 30, seed: int = 42):
+        self._lock = threading.RLock()
+        self._clear()
+        if num_products or num_shipments:
+            rng = random.Random(seed)
+            self._load_sample_products(num_products, rng)
+            self._load_sample_shipments(num_shipments, rng)
+
+    def _clear(self):
+        # Product columns
+        self._ids = array("q")
+        self._stock = array("q")
+        self._reorder = array("l")
+        self._price = array("d")
+        self._category = array("H")
+        self._low = bytearray()
+        self._live = bytearray()
+        self._name_offset = array("Q")
+        self._name_length = array("H")
+        self._names = bytearray()
+        self._names_live = 0
+        self._free_rows: List[int] = []
+
+        # Indexes
+        self._row_by_id: Dict[int, int] = {}
+        # Rows per category slot, as insertion-ordered sets (dict keys) so a move is O(1)
+        self._rows_by_category: Dict[int, Dict[int, None]] = {}
+        self._low_rows: Dict[int, None] = {}
+        self._category_names: List[str] = []
+        self._category_slot: Dict[str, int] = {}
+        self._category_by_db_id: Dict[int, int] = {}
+
+        # Shipments, by order id and by status
+        self._shipments: Dict[int, Shipment] = {}
+        self._shipments_by_status: Dict[str, Dict[int, Shipment]] = {}
+
+        # Aggregates
+        self._total_stock = 0
+        self._total_value = 0.0
+        self.watermark: Optional[datetime] = None
+        self.loaded_at: Optional[datetime] = None
+
+    # Loading
+
+    def _set_categories(self, names: Dict[int, str]):
+        for db_id, name in names.items():
+            self._category_by_db_id[db_id] = self._category_slot_for(name or f"Category {db_id}")
+
+    def _category_slot_for(self, name: str) -> int:
+        slot = self._category_slot.get(name.lower())
+        if slot is None:
+            slot = self._category_slot[name.lower()] = len(self._category_names)
+            self._category_names.append(name)
+            self._rows_by_category[slot] = {}
+        return slot
+
+    def _category_of(self, category_ids: Optional[str]) -> int:
+        """The most specific category listed on a product (sub-categories come after their parent)"""
+        try:
+            db_id = json.loads(category_ids)[-1]["id"]
+            return self._category_by_db_id[int(db_id)]
+        except (TypeError, ValueError, KeyError, IndexError):
+            return self._category_slot_for("Uncategorized")
+
+    def _load_sample_products(self, count: int, rng: random.Random):
+        """Fill the replica from the shared synthetic catalog"""
+        self._set_categories({c["id"]: c["name"] for c in category_rows()})
+        rows = list(iter_products(count, rng))
+        stock = {s["product_id"]: s["quantity"] for s in iter_stock(rows, 1, rng)}
+        for row in rows:
+            quantity = stock[row["id"]]
+            self._upsert(row["id"], row["name"], self._category_of(row["category_ids"]), quantity,
+                         row["low_stock_limit"], row["price"], quantity <= row["low_stock_limit"], True)
+
+    def _load_sample_shipments(self, count: int, rng: random.Random):
+        """Shipments from the synthetic order history"""
+        for order in iter_orders(count, rng, days=30):
+            self._upsert_shipment(order["id"], order["user_id"], order["order_amount"], order["order_type"],
+                                  order["order_status"], order["created_at"], order["updated_at"])
+
+    def load_from_db(self, db_service) -> Dict[str, int]:
+        """Bulk (re)load every product and the latest orders from the database"""
+        watermark = db_service.get_change_watermark()
+        replica = WarehouseData(num_products=0, num_shipments=0)
+        replica._set_categories(db_service.get_category_names())
+        products = replica._apply_inventory(db_service.iter_inventory_rows())
+        replica._apply_orders(db_service.iter_recent_orders(limit=SHIPMENT_WINDOW))
+
+        with self._lock:
+            # Swap in the freshly built columns so readers never see a half-loaded replica
+            self.__dict__.update({k: v for k, v in replica.__dict__.items() if k != "_lock"})
+            self.watermark = watermark
+            self.loaded_at = datetime.now()
+        return {"products": products, "shipments": len(self._shipments)}
+
+    def refresh(self, db_service) -> Dict[str, int]:
+        """Apply products, stock and orders changed since the last load or refresh"""
+        if self.watermark is None:
+            return self.load_from_db(db_service)
+
+        # Read the changes before taking the lock, so readers only wait for the in-memory updates
+        watermark = db_service.get_change_watermark()
+        since = self.watermark - REFRESH_LOOKBACK
+        category_names = db_service.get_category_names()
+        inventory = list(db_service.iter_inventory_rows(since=since))
+        orders = list(db_service.iter_recent_orders(since=since))
+        with self._lock:
+            self._set_categories(category_names)
+            products = self._apply_inventory(inventory)
+            shipments = self._apply_orders(orders)
+            self.watermark = watermark or self.watermark
+            self.loaded_at = datetime.now()
+        return {"products": products, "shipments": shipments}
+
+    def _apply_inventory(self, rows: Iterable) -> int:
+        count = 0
+        with self._lock:
+            for product_id, name, category_ids, limit, price, status, is_deleted, quantity, min_quantity in rows:
+                limit = limit or 10
+                quantity = int(quantity or 0)
+                low = min_quantity is None or min_quantity <= limit
+                self._upsert(product_id, name or "", self._category_of(category_ids), quantity, limit,
+                             float(price or 0), low, bool(status) and not is_deleted)
+                count += 1
+        return count
+
+    def _apply_orders(self, rows: Iterable) -> int:
+        count = 0
+        with self._lock:
+            for order_id, user_id, amount, order_type, status, created_at, updated_at in rows:
+                self._upsert_shipment(order_id, user_id, amount, order_type, status, created_at, updated_at)
+                count += 1
+            # Keep the most recent orders only
+            excess = len(self._shipments) - SHIPMENT_WINDOW
+            if excess > 0:
+                for order_id in heapq.nsmallest(excess, self._shipments):
+                    self._remove_shipment(order_id)
+        return count
+
+    # Writes
+
+    def _upsert(self, product_id: int, name: str, category: int, stock: int, reorder: int, price: float,
+                low: bool, live: bool):
+        row = self._row_by_id.get(product_id)
+        if not live:
+            if row is not None:
+                self._remove(row)
+            return
+
+        encoded = name.encode("utf-8")[:65535]
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+                self._ids[row], self._stock[row], self._reorder[row] = product_id, stock, reorder
+                self._price[row], self._category[row], self._low[row], self._live[row] = price, category, low, 1
+            else:
+                row = len(self._ids)
+                self._ids.append(product_id)
+                self._stock.append(stock)
+                self._reorder.append(reorder)
+                self._price.append(price)
+                self._category.append(category)
+                self._low.append(low)
+                self._live.append(1)
+                self._name_offset.append(0)
+                self._name_length.append(0)
+            self._row_by_id[product_id] = row
+            self._rows_by_category[category][row] = None
+        else:
+            self._total_stock -= self._stock[row]
+            self._total_value -= self._stock[row] * self._price[row]
+            if self._category[row] != category:
+                del self._rows_by_category[self._category[row]][row]
+                self._rows_by_category[category][row] = None
+            self._stock[row], self._reorder[row], self._price[row] = stock, reorder, price
+            self._category[row], self._low[row] = category, low
+
+        if encoded != self._name_bytes(row):
+            self._names_live += len(encoded) - self._name_length[row]
+            self._name_offset[row] = len(self._names)
+            self._name_length[row] = len(encoded)
+            self._names += encoded
+        self._total_stock += stock
+        self._total_value += stock * price
+        if low:
+            self._low_rows[row] = None
+        else:
+            self._low_rows.pop(row, None)
+
+        # Replaced names leave garbage in the buffer; compact once it is mostly garbage
+        if len(self._names) > 1 << 20 and len(self._names) > 2 * self._names_live:
+            self._compact_names()
+
+    def _remove(self, row: int):
+        self._total_stock -= self._stock[row]
+        self._total_value -= self._stock[row] * self._price[row]
+        del self._rows_by_category[self._category[row]][row]
+        self._low_rows.pop(row, None)
+        del self._row_by_id[self._ids[row]]
+        self._live[row] = 0
+        self._low[row] = 0
+        self._stock[row] = 0
+        self._names_live -= self._name_length[row]
+        self._name_length[row] = 0
+        self._free_rows.append(row)
+
+    def _compact_names(self):
+        names = bytearray()
+        for row in range(len(self._ids)):
+            start = self._name_offset[row]
+            self._name_offset[row] = len(names)
+            names += self._names[start:start + self._name_length[row]]
+        self._names = names
+
+    def _upsert_shipment(self, order_id: int, user_id: Optional[int], amount, order_type: Optional[str],
+                         order_status: str, created_at: Optional[datetime], updated_at: Optional[datetime]):
+        status = SHIPMENT_STATUS_BY_ORDER_STATUS.get(order_status, "pending")
+        self._remove_shipment(order_id)
+        shipment = Shipment(
+            id=f"SHP-{order_id:04d}",
+            order_id=order_id,
+            customer_id=user_id,
+            amount=float(amount or 0),
+            order_type=order_type or "delivery",
+            status=status,
+            ordered_at=created_at,
+            delivered_at=updated_at if status == "delivered" else None
+        )
+        self._shipments[order_id] = shipment
+        self._shipments_by_status.setdefault(status, {})[order_id] = shipment
+
+    def _remove_shipment(self, order_id: int):
+        shipment = self._shipments.pop(order_id, None)
+        if shipment is not None:
+            del self._shipments_by_status[shipment.status][order_id]
+
+    # Reads
+
+    def _name_bytes(self, row: int) -> bytes:
+        start = self._name_offset[row]
+        return bytes(self._names[start:start + self._name_length[row]])
+
+    def _record(self, row: int) -> Product:
+        product_id = self._ids[row]
+        name = self._name_bytes(row).decode("utf-8", "ignore")
+        return Product(
+            id=f"PRD-{product_id:04d}",
+            name=name,
+            category=self._category_names[self._category[row]],
+            stock_level=self._stock[row],
+            reorder_point=self._reorder[row],
+            unit_price=self._price[row]
+            # The database holds no bin location or supplier, so none is reported
+        )
+
+    @property
+    def products(self) -> List[Product]:
+        """All live products (materializes every row; prefer the indexed getters)"""
+        with self._lock:
+            return [self._record(row) for row in self._row_by_id.values()]
+
+    @property
+    def shipments(self) -> List[Shipment]:
+        with self._lock:
+            return list(self._shipments.values())
+
+    def get_low_stock_products(self, limit: Optional[int] = None) -> List[Product]:
         """Get products with stock below reorder point"""
-        return [p for p in self.products if p.stock_level <= p.reorder_point]
-    
-    def get_products_by_category(self, category: str) -> List[Product]:
+        with self._lock:
+            return [self._record(row) for row in itertools.islice(self._low_rows, limit)]
+
+    def count_low_stock_products(self) -> int:
+        return len(self._low_rows)
+
+    def get_products_by_category(self, category: str, limit: Optional[int] = None) -> List[Product]:
         """Get products by category"""
-        return [p for p in self.products if p.category.lower() == category.lower()]
-    
+        with self._lock:
+            rows = self._rows_by_category.get(self._category_slot.get(category.lower(), -1), ())
+            return [self._record(row) for row in itertools.islice(rows, limit)]
+
+    def count_products_by_category(self, category: str) -> int:
+        return len(self._rows_by_category.get(self._category_slot.get(category.lower(), -1), ()))
+
     def get_shipments_by_status(self, status: str) -> List[Shipment]:
         """Get shipments by status"""
-        return [s for s in self.shipments if s.status.lower() == status.lower()]
-    
-    def get_product_by_id(self, product_id: str) -> Product:
+        with self._lock:
+            return list(self._shipments_by_status.get(status.lower(), {}).values())
+
+    def count_shipments_by_status(self, status: str) -> int:
+        return len(self._shipments_by_status.get(status.lower(), ()))
+
+    def get_product_by_id(self, product_id: Union[int, str]) -> Optional[Product]:
         """Get product by ID"""
-        for product in self.products:
-            if product.id == product_id:
-                return product
-        return None
-    
+        with self._lock:
+            row = self._row_by_id.get(product_key(product_id))
+            return self._record(row) if row is not None else None
+
     def get_total_inventory_value(self) -> float:
         """Calculate total inventory value"""
-        return sum(p.stock_level * p.unit_price for p in self.products)
-    
+        return self._total_value
+
     def get_warehouse_stats(self) -> Dict[str, Any]:
         """Get comprehensive warehouse statistics"""
-        total_products = len(self.products)
-        low_stock_count = len(self.get_low_stock_products())
-        total_value = self.get_total_inventory_value()
-        
-        category_counts = {}
-        for product in self.products:
-            category_counts[product.category] = category_counts.get(product.category, 0) + 1
-        
-        shipment_status_counts = {}
-        for shipment in self.shipments:
-            shipment_status_counts[shipment.status] = shipment_status_counts.get(shipment.status, 0) + 1
-        
+        with self._lock:
+            total_products = len(self._row_by_id)
+            return {
+                "total_products": total_products,
+                "low_stock_products": len(self._low_rows),
+                "total_inventory_value": round(self._total_value, 2),
+                "categories": {
+                    self._category_names[slot]: len(rows) for slot, rows in self._rows_by_category.items() if rows
+                },
+                "shipment_status": {status: len(s) for status, s in self._shipments_by_status.items() if s},
+                "average_stock_level": round(self._total_stock / total_products, 2) if total_products else 0
+            }
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by the columns and indexes (ID index entries hold two int objects)"""
+        columns = (self._ids, self._stock, self._reorder, self._price, self._category, self._name_offset, self._name_length)
         return {
-            "total_products": total_products,
-            "low_stock_products": low_stock_count,
-            "total_inventory_value": round(total_value, 2),
-            "categories": category_counts,
-            "shipment_status": shipment_status_counts,
-            "average_stock_level": round(sum(p.stock_level for p in self.products) / total_products, 2)
+            "products": len(self._row_by_id),
+            "columns": sum(c.itemsize * len(c) for c in columns) + len(self._low) + len(self._live) + len(self._names),
+            "indexes": sys.getsizeof(self._row_by_id) + 56 * len(self._row_by_id) + sys.getsizeof(self._low_rows)
+                       + sum(sys.getsizeof(rows) for rows in self._rows_by_category.values()),
         }
 
-# Global warehouse data instance
+# Global warehouse data instance; main loads it from the database at startup
 warehouse_db = WarehouseData()
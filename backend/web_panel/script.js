@@ -9,6 +9,45 @@ let currentData = {
     lowStockProducts: []
 };
 
+// Server-side chat session; the backend keeps the conversation history
+let chatSessionId = null;
+
+// Local copy of the database tables, seeded page by page and then kept current through the /changes feed
+const CHANGES_PAGE_SIZE = 1000;
+// Latest orders loaded on the first sync; older ones join the shipments table only if they change
+const SHIPMENTS_SEED_LIMIT = 1000;
+const SEEDED_TABLES = ['categories', 'products', 'warehouse_products'];
+const syncState = {
+    cursor: null,
+    tables: {
+        categories: new Map(),
+        products: new Map(),
+        warehouse_products: new Map(),
+        orders: new Map()
+    }
+};
+
+// Same presentation of orders as shipments as the backend's warehouse_data
+const SHIPMENT_STATUS_BY_ORDER_STATUS = {
+    placed: 'pending',
+    confirmed: 'pending',
+    processing: 'in_transit',
+    delivered: 'delivered',
+    canceled: 'delayed'
+};
+
+// Rows shown in the products and shipments tables, derived from syncState and updated only where changes landed
+const panelRows = {
+    products: new Map(),
+    shipments: new Map()
+};
+// warehouse_products rows per product_id, so a stock change only rebuilds that product's row
+const stockRowsByProduct = new Map();
+
+// Virtualized tables, created once the page has loaded
+let productsTable = null;
+let shipmentsTable = null;
+
 // Quick queries mapping
 const quickQueries = {
     'low_stock': 'What products are running low on stock and need immediate attention?',
@@ -22,6 +61,7 @@ const quickQueries = {
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     console.log('🏭 Warehouse Management Panel Initialized');
+    setupTables();
     checkHealthAndLoadData();
     setupEventListeners();
 });
@@ -47,9 +87,11 @@ function handleTabSwitch(targetId) {
             loadDashboardData();
             break;
         case '#products':
+            productsTable.render();
             loadProductsData();
             break;
         case '#shipments':
+            shipmentsTable.render();
             loadShipmentsData();
             break;
         case '#analytics':
@@ -87,7 +129,7 @@ async function checkHealthAndLoadData() {
         showLoadingState();
         await apiCall('/');
         updateConnectionStatus(true);
-        await loadAllData();
+        await Promise.all([loadAllData(), syncChanges()]);
         hideLoadingState();
         showToast('Connected to warehouse system', 'success');
     } catch (error) {
@@ -119,10 +161,191 @@ async function loadAllData() {
     }
 }
 
-// Refresh data
+// Refresh data: only what changed since the last sync is fetched
 async function refreshData() {
     console.log('🔄 Refreshing data...');
-    await loadAllData();
+    try {
+        const changed = await syncChanges();
+        if (changed > 0 || !currentData.stats) {
+            await loadAllData();
+        } else {
+            updateLastUpdated();
+        }
+    } catch (error) {
+        console.error('Failed to sync changes:', error);
+    }
+}
+
+// Pull every change after the stored cursor and apply it to the local tables
+async function syncChanges() {
+    const affected = { products: new Set(), orders: new Set(), allProducts: false };
+    let changed = syncState.cursor ? 0 : await seedTables(affected);
+    let page;
+    do {
+        const params = new URLSearchParams({ limit: CHANGES_PAGE_SIZE });
+        if (syncState.cursor) params.set('since', syncState.cursor);
+        page = await apiCall(`/changes?${params}`);
+        page.changes.forEach(change => applyChange(change, affected));
+        changed += page.changes.length;
+        if (page.next_cursor) syncState.cursor = page.next_cursor;
+    } while (page.has_more);
+
+    if (changed > 0) {
+        updateLocalViews(affected);
+        console.log(`🔁 Applied ${changed} changes`);
+    }
+    return changed;
+}
+
+// First sync: take the feed's head cursor, then load the tables from the paged row lists, so the feed
+// only ever carries deltas. Rows changed while loading come again through the feed and are upserted twice.
+async function seedTables(affected) {
+    const { cursor } = await apiCall('/changes/head');
+    let loaded = 0;
+    const applyRows = (table, rows) => {
+        rows.forEach(row => applyChange({ table, id: row.id, op: 'upsert', data: row }, affected));
+        loaded += rows.length;
+    };
+
+    for (const table of SEEDED_TABLES) {
+        let page;
+        let afterId = null;
+        do {
+            const params = new URLSearchParams({ limit: CHANGES_PAGE_SIZE });
+            if (afterId !== null) params.set('after_id', afterId);
+            page = await apiCall(`/changes/rows/${table}?${params}`);
+            applyRows(table, page.rows);
+            afterId = page.next_after_id;
+        } while (page.has_more);
+    }
+    const orders = await apiCall(`/changes/rows/orders?limit=${SHIPMENTS_SEED_LIMIT}&newest_first=true`);
+    applyRows('orders', orders.rows);
+
+    syncState.cursor = cursor;
+    return loaded;
+}
+
+// Apply one change and note which panel rows it affects
+function applyChange(change, affected) {
+    const table = syncState.tables[change.table];
+    if (!table) return;
+    const previous = table.get(change.id);
+    if (change.op === 'delete') {
+        table.delete(change.id);
+    } else {
+        table.set(change.id, change.data);
+    }
+
+    if (change.table === 'warehouse_products') {
+        if (previous) {
+            const rows = stockRowsByProduct.get(previous.product_id);
+            if (rows) {
+                rows.delete(change.id);
+                if (!rows.size) stockRowsByProduct.delete(previous.product_id);
+            }
+            affected.products.add(previous.product_id);
+        }
+        if (change.op !== 'delete') {
+            const productId = change.data.product_id;
+            if (!stockRowsByProduct.has(productId)) stockRowsByProduct.set(productId, new Map());
+            stockRowsByProduct.get(productId).set(change.id, change.data);
+            affected.products.add(productId);
+        }
+    } else if (change.table === 'products') {
+        affected.products.add(change.id);
+    } else if (change.table === 'orders') {
+        affected.orders.add(change.id);
+    } else if (change.table === 'categories') {
+        // Category names appear on every product row
+        affected.allProducts = true;
+    }
+}
+
+// Rebuild the panel rows the changes touched and patch only those into the tables
+function updateLocalViews(affected) {
+    const { categories, products, orders } = syncState.tables;
+
+    const productIds = affected.allProducts
+        ? new Set([...products.keys(), ...panelRows.products.keys()])
+        : affected.products;
+    const productUpserts = [];
+    const productDeletes = [];
+    for (const id of productIds) {
+        const product = products.get(id);
+        if (product && product.status) {
+            const row = toPanelProduct(product, categories, productStock(id));
+            panelRows.products.set(id, row);
+            productUpserts.push(row);
+        } else if (panelRows.products.delete(id)) {
+            productDeletes.push(id);
+        }
+    }
+
+    const shipmentUpserts = [];
+    const shipmentDeletes = [];
+    for (const id of affected.orders) {
+        const order = orders.get(id);
+        if (order) {
+            const row = toShipment(order);
+            panelRows.shipments.set(id, row);
+            shipmentUpserts.push(row);
+        } else if (panelRows.shipments.delete(id)) {
+            shipmentDeletes.push(id);
+        }
+    }
+
+    currentData.products = [...panelRows.products.values()];
+    currentData.shipments = [...panelRows.shipments.values()];
+
+    populateCategoryFilter();
+    productsTable.patch(productUpserts, productDeletes);
+    shipmentsTable.patch(shipmentUpserts, shipmentDeletes);
+}
+
+function productStock(productId) {
+    const rows = stockRowsByProduct.get(productId);
+    if (!rows) return null;
+    const stock = { quantity: 0, warehouses: [] };
+    for (const row of rows.values()) {
+        stock.quantity += row.quantity;
+        stock.warehouses.push(`WH-${row.warehouse_id}`);
+    }
+    return stock;
+}
+
+function toPanelProduct(product, categories, stock) {
+    let category = 'Uncategorized';
+    try {
+        const ids = JSON.parse(product.category_ids || '[]');
+        const leaf = ids.length ? categories.get(Number(ids[ids.length - 1].id)) : null;
+        if (leaf) category = leaf.name;
+    } catch (error) {
+        // Malformed category_ids: keep the product under Uncategorized
+    }
+
+    return {
+        id: product.id,
+        name: product.name,
+        category,
+        stock_level: stock ? stock.quantity : 0,
+        reorder_point: product.low_stock_limit || 0,
+        unit_price: Number(product.price),
+        location: stock ? stock.warehouses.join(', ') : '--'
+    };
+}
+
+function toShipment(order) {
+    const status = SHIPMENT_STATUS_BY_ORDER_STATUS[order.order_status] || 'pending';
+    return {
+        order_id: order.id,
+        id: `SHP-${String(order.id).padStart(4, '0')}`,
+        customer: order.user_id ? `USR-${order.user_id}` : 'Guest',
+        amount: Number(order.order_amount),
+        order_type: order.order_type || 'delivery',
+        status,
+        ordered_at: order.created_at,
+        delivered_at: status === 'delivered' ? order.updated_at : null
+    };
 }
 
 // Update connection status
@@ -228,8 +451,9 @@ async function sendMessage() {
     try {
         const response = await apiCall('/chat', {
             method: 'POST',
-            body: JSON.stringify({ message })
+            body: JSON.stringify({ message, session_id: chatSessionId })
         });
+        chatSessionId = response.session_id || chatSessionId;
         
         addMessageToChat(response.reply, false, response.query_analysis);
     } catch (error) {
@@ -286,6 +510,10 @@ function handleChatKeyPress(event) {
 
 // Clear chat
 function clearChat() {
+    if (chatSessionId) {
+        apiCall(`/chat/sessions/${chatSessionId}`, { method: 'DELETE' }).catch(() => {});
+        chatSessionId = null;
+    }
     const messagesContainer = document.getElementById('chat-messages');
     messagesContainer.innerHTML = `
         <div class="message ai-message">
@@ -306,41 +534,64 @@ async function loadDashboardData() {
 // Load products data
 async function loadProductsData() {
     try {
-        const response = await apiCall('/warehouse/products');
-        currentData.products = response.products;
-        updateProductsTable(response.products);
-        populateCategoryFilter();
+        await syncChanges();
     } catch (error) {
         console.error('Failed to load products:', error);
         showToast('Failed to load products', 'error');
     }
 }
 
-// Update products table
-function updateProductsTable(products) {
-    const tbody = document.getElementById('products-tbody');
-    
-    if (!products || products.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="8" class="text-center text-muted">No products found</td></tr>';
-        return;
-    }
-    
-    tbody.innerHTML = products.map(product => `
-        <tr>
-            <td><code>${product.id}</code></td>
-            <td>${product.name}</td>
-            <td><span class="badge bg-secondary">${product.category}</span></td>
-            <td>${product.stock_level}</td>
-            <td>${product.reorder_point}</td>
-            <td>$${product.unit_price.toFixed(2)}</td>
-            <td><code>${product.location}</code></td>
-            <td>
-                <span class="status-badge ${getStockStatusClass(product)}">
-                    ${getStockStatus(product)}
-                </span>
-            </td>
-        </tr>
-    `).join('');
+// Create the virtualized products and shipments tables
+function setupTables() {
+    productsTable = new LiveTable({
+        name: 'products',
+        key: 'id',
+        sort: { field: 'id', descending: false },
+        table: document.getElementById('products-table'),
+        emptyText: 'No products found',
+        columns: [
+            { label: 'ID', sortField: 'id', render: p => `<code>${p.id}</code>` },
+            { label: 'Name', sortField: 'name', width: '22%', render: p => escapeHtml(p.name) },
+            { label: 'Category', sortField: 'category', render: p => `<span class="badge bg-secondary">${escapeHtml(p.category)}</span>` },
+            { label: 'Stock Level', sortField: 'stock_level', render: p => p.stock_level },
+            { label: 'Reorder Point', sortField: 'reorder_point', render: p => p.reorder_point },
+            { label: 'Unit Price', sortField: 'unit_price', render: p => `$${p.unit_price.toFixed(2)}` },
+            { label: 'Location', sortField: 'location', render: p => `<code>${escapeHtml(p.location)}</code>` },
+            {
+                label: 'Status',
+                render: p => `<span class="status-badge ${getStockStatusClass(p)}">${getStockStatus(p)}</span>`
+            }
+        ]
+    });
+
+    shipmentsTable = new LiveTable({
+        name: 'shipments',
+        key: 'order_id',
+        sort: { field: 'order_id', descending: true },
+        table: document.getElementById('shipments-table'),
+        emptyText: 'No shipments found',
+        columns: [
+            { label: 'ID', sortField: 'order_id', render: s => `<code>${s.id}</code>` },
+            { label: 'Customer', sortField: 'customer', render: s => `<code>${escapeHtml(s.customer)}</code>` },
+            { label: 'Amount', sortField: 'amount', render: s => `€${s.amount.toFixed(2)}` },
+            {
+                label: 'Status',
+                sortField: 'status',
+                render: s => `<span class="status-badge status-${s.status}">${s.status.replace('_', ' ')}</span>`
+            },
+            { label: 'Type', sortField: 'order_type', render: s => escapeHtml(s.order_type) },
+            {
+                label: 'Ordered',
+                sortField: 'ordered_at',
+                render: s => s.ordered_at ? new Date(s.ordered_at).toLocaleDateString() : '--'
+            },
+            {
+                label: 'Delivered',
+                sortField: 'delivered_at',
+                render: s => s.delivered_at ? new Date(s.delivered_at).toLocaleDateString() : '--'
+            }
+        ]
+    });
 }
 
 // Get stock status
@@ -360,79 +611,39 @@ function getStockStatusClass(product) {
 // Populate category filter
 function populateCategoryFilter() {
     const select = document.getElementById('category-filter');
-    const categories = [...new Set(currentData.products.map(p => p.category))];
+    const selected = select.value;
+    const categories = [...new Set(currentData.products.map(p => p.category))].sort();
     
     select.innerHTML = '<option value="">All Categories</option>' +
         categories.map(cat => `<option value="${cat}">${cat}</option>`).join('');
+    select.value = categories.includes(selected) ? selected : '';
 }
 
-// Filter products
+// Filter products (the worker applies the filter)
 function filterProducts() {
     const categoryFilter = document.getElementById('category-filter').value;
-    let filteredProducts = currentData.products;
-    
-    if (categoryFilter) {
-        filteredProducts = filteredProducts.filter(p => p.category === categoryFilter);
-    }
-    
-    updateProductsTable(filteredProducts);
+    productsTable.setFilters(categoryFilter ? [{ field: 'category', op: 'eq', value: categoryFilter }] : []);
 }
 
 // Filter low stock products
 function filterLowStock() {
-    const lowStockProducts = currentData.products.filter(p => p.stock_level <= p.reorder_point);
-    updateProductsTable(lowStockProducts);
+    productsTable.setFilters([{ field: 'stock_level', op: 'lte_field', other: 'reorder_point' }]);
 }
 
 // Load shipments data
 async function loadShipmentsData() {
     try {
-        const response = await apiCall('/warehouse/shipments');
-        currentData.shipments = response.shipments;
-        updateShipmentsTable(response.shipments);
+        await syncChanges();
     } catch (error) {
         console.error('Failed to load shipments:', error);
         showToast('Failed to load shipments', 'error');
     }
 }
 
-// Update shipments table
-function updateShipmentsTable(shipments) {
-    const tbody = document.getElementById('shipments-tbody');
-    
-    if (!shipments || shipments.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="8" class="text-center text-muted">No shipments found</td></tr>';
-        return;
-    }
-    
-    tbody.innerHTML = shipments.map(shipment => `
-        <tr>
-            <td><code>${shipment.id}</code></td>
-            <td><code>${shipment.product_id}</code></td>
-            <td>${shipment.quantity}</td>
-            <td>
-                <span class="status-badge status-${shipment.status}">
-                    ${shipment.status.replace('_', ' ')}
-                </span>
-            </td>
-            <td>${shipment.origin}</td>
-            <td>${shipment.destination}</td>
-            <td>${new Date(shipment.expected_date).toLocaleDateString()}</td>
-            <td>${shipment.actual_date ? new Date(shipment.actual_date).toLocaleDateString() : '--'}</td>
-        </tr>
-    `).join('');
-}
-
 // Filter shipments
 function filterShipments() {
     const statusFilter = document.getElementById('shipment-status-filter').value;
-    let filteredShipments = currentData.shipments;
-    
-    if (statusFilter) {
-        filteredShipments = filteredShipments.filter(s => s.status === statusFilter);
-    }
-    
-    updateShipmentsTable(filteredShipments);
+    shipmentsTable.setFilters(statusFilter ? [{ field: 'status', op: 'eq', value: statusFilter }] : []);
 }
 
 // Load analytics data
@@ -1,57 +1,55 @@
 #!/usr/bin/env python3
 """
-Simple HTTP server to serve the warehouse management web panel
+Standalone server for the warehouse management web panel
+Serves the precompressed, content-hashed build from memory on an async server (the API also serves it at /panel)
 """
 
-import http.server
-import socketserver
-import webbrowser
 import os
 import sys
 
-def start_web_server(port=3000):
-    """Start a simple HTTP server for the web panel"""
-    web_dir = os.path.dirname(os.path.abspath(__file__))
-    os.chdir(web_dir)
-    
-    handler = http.server.SimpleHTTPRequestHandler
-    
-    class CustomHTTPRequestHandler(handler):
-        def end_headers(self):
-            # Add CORS headers
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            super().end_headers()
-    
+import uvicorn
+
+# static_panel lives in the backend directory next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from static_panel import StaticPanel, build_bundle, write_bundle, WEB_PANEL_DIST
+
+
+def start_web_server(port=3000, host="0.0.0.0"):
+    """Serve the web panel until interrupted"""
+    print(f"🌐 Web Panel Server starting on port {port}")
+    print(f"📱 Open your browser and go to: http://localhost:{port}")
+    print(f"🏭 Make sure your FastAPI server is running on http://localhost:8000")
+    print(f"⏹️  Press Ctrl+C to stop the server")
+    print("-" * 60)
+
     try:
-        with socketserver.TCPServer(("", port), CustomHTTPRequestHandler) as httpd:
-            print(f"🌐 Web Panel Server starting on port {port}")
-            print(f"📱 Open your browser and go to: http://localhost:{port}")
-            print(f"🏭 Make sure your FastAPI server is running on http://localhost:8000")
-            print(f"⏹️  Press Ctrl+C to stop the server")
-            print("-" * 60)
-            
-            # Automatically open browser
-            webbrowser.open(f'http://localhost:{port}')
-            
-            httpd.serve_forever()
-            
+        uvicorn.run(StaticPanel(), host=host, port=port, log_level="warning", access_log=False)
     except KeyboardInterrupt:
-        print("\n🛑 Web server stopped")
-    except OSError as e:
-        if "Address already in use" in str(e):
-            print(f"❌ Port {port} is already in use. Try a different port.")
-            print(f"   Usage: python serve.py [port]")
-        else:
-            print(f"❌ Error starting server: {e}")
+        pass
+    print("\n🛑 Web server stopped")
+
+
+def build(out_dir=WEB_PANEL_DIST):
+    """Precompress the panel so servers load it instead of building at startup"""
+    bundle = build_bundle()
+    write_bundle(bundle, out_dir)
+    for asset in bundle.assets.values():
+        sizes = ", ".join(f"{encoding} {len(body)}" for encoding, body in asset.variants.items())
+        print(f"📦 {asset.name}: {sizes}")
+    print(f"✅ Web panel built into {out_dir}")
+
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["build"]:
+        build(*sys.argv[2:3])
+        sys.exit(0)
+
     port = 3000
     if len(sys.argv) > 1:
         try:
             port = int(sys.argv[1])
         except ValueError:
             print("❌ Invalid port number. Using default port 3000.")
-    
+
     start_web_server(port)
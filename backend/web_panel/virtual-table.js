@@ -0,0 +1,326 @@
+// Virtualized tables for the web panel
+// VirtualTable keeps only the rows in view (plus an overscan margin) in the DOM and patches them by key.
+// TableQuery filters and sorts rows; LiveTable runs it in a Web Worker so large tables never block scrolling.
+
+// Captured while this script runs: the worker loads this same file (it may have a content-hashed name)
+const VIRTUAL_TABLE_SCRIPT = typeof document !== 'undefined' && document.currentScript
+    ? document.currentScript.src
+    : null;
+
+// Filters are plain objects so they can be posted to the worker:
+//   { field, op: 'eq', value }            row[field] === value
+//   { field, op: 'lte_field', other }     row[field] <= row[other]
+//   { field, op: 'contains', value }      case-insensitive substring (value in lower case)
+const TableQuery = {
+    matches(row, filters) {
+        for (const filter of filters) {
+            const value = row[filter.field];
+            if (filter.op === 'eq' && value !== filter.value) return false;
+            if (filter.op === 'lte_field' && !(value <= row[filter.other])) return false;
+            if (filter.op === 'contains' && !String(value ?? '').toLowerCase().includes(filter.value)) return false;
+        }
+        return true;
+    },
+
+    // Missing values sort last; strings are compared case-insensitively
+    compare(a, b) {
+        if (a === b) return 0;
+        if (a == null) return 1;
+        if (b == null) return -1;
+        return a < b ? -1 : 1;
+    },
+
+    // Keys of the matching rows in display order; ties are broken by key so the order is stable
+    run(rows, keyField, query) {
+        const matched = [];
+        for (const row of rows.values()) {
+            if (TableQuery.matches(row, query.filters || [])) matched.push(row);
+        }
+        if (!query.sort) return matched.map(row => row[keyField]);
+
+        const { field, descending } = query.sort;
+        const direction = descending ? -1 : 1;
+        const entries = matched.map(row => {
+            const value = row[field];
+            return { value: typeof value === 'string' ? value.toLowerCase() : value, key: row[keyField] };
+        });
+        entries.sort((a, b) => direction * (TableQuery.compare(a.value, b.value) || TableQuery.compare(a.key, b.key)));
+        return entries.map(entry => entry.key);
+    }
+};
+
+// Worker side: a copy of every table's rows, patched incrementally; every message carries the current query
+// and is answered with the matching keys
+const TableWorker = {
+    listen(scope) {
+        const tables = new Map();
+        scope.onmessage = ({ data }) => {
+            let table = tables.get(data.table);
+            if (!table) {
+                table = { key: data.key, rows: new Map() };
+                tables.set(data.table, table);
+            }
+            if (data.type === 'patch') {
+                if (data.reset) table.rows.clear();
+                for (const row of data.upserts) table.rows.set(row[table.key], row);
+                for (const key of data.deletes) table.rows.delete(key);
+            }
+            const keys = TableQuery.run(table.rows, table.key, data.query);
+            scope.postMessage({ table: data.table, seq: data.seq, keys });
+        };
+    }
+};
+
+let tableWorker;
+
+// One worker shared by every table, or null where workers cannot load this script (e.g. file:// pages)
+function getTableWorker() {
+    if (tableWorker !== undefined) return tableWorker;
+    tableWorker = null;
+    if (typeof Worker === 'undefined' || !VIRTUAL_TABLE_SCRIPT || location.protocol === 'file:') return null;
+    try {
+        const source = `importScripts(${JSON.stringify(VIRTUAL_TABLE_SCRIPT)}); TableWorker.listen(self);`;
+        tableWorker = new Worker(URL.createObjectURL(new Blob([source], { type: 'text/javascript' })));
+    } catch (error) {
+        console.warn('Table worker unavailable, filtering on the main thread:', error);
+    }
+    return tableWorker;
+}
+
+function escapeHtml(value) {
+    return String(value ?? '')
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+class VirtualTable {
+    // columns: [{ label, render(row) -> HTML string, sortField?, width? }]; the table sits in a .table-responsive
+    constructor({ table, columns, rowKey, emptyText = 'No rows', rowHeight = 41, overscan = 8, onSort = null }) {
+        this.table = table;
+        this.tbody = table.tBodies[0];
+        this.viewport = table.closest('.table-responsive');
+        this.columns = columns;
+        this.rowKey = rowKey;
+        this.emptyText = emptyText;
+        this.rowHeight = rowHeight;
+        this.overscan = overscan;
+        this.keys = [];
+        this.rows = new Map();
+        this.rendered = new Map();
+        this.pool = [];
+        this.frame = null;
+        this.measured = false;
+
+        this.viewport.classList.add('vt-viewport');
+        table.classList.add('virtual-table');
+        this.topSpacer = this.createSpacer();
+        this.bottomSpacer = this.createSpacer();
+        this.emptyRow = document.createElement('tr');
+        this.emptyRow.innerHTML = `<td colspan="${columns.length}" class="text-center text-muted"></td>`;
+
+        const headers = table.tHead.rows[0].cells;
+        columns.forEach((column, i) => {
+            if (column.width) headers[i].style.width = column.width;
+            if (column.sortField && onSort) {
+                headers[i].classList.add('vt-sortable');
+                headers[i].addEventListener('click', () => onSort(column.sortField));
+            }
+        });
+
+        this.viewport.addEventListener('scroll', () => this.schedule(), { passive: true });
+        window.addEventListener('resize', () => this.schedule());
+    }
+
+    createSpacer() {
+        const tr = document.createElement('tr');
+        tr.className = 'vt-spacer';
+        tr.innerHTML = `<td colspan="${this.columns.length}"></td>`;
+        return tr;
+    }
+
+    // Show these keys, in this order, looking rows up in the map
+    setRows(keys, rows) {
+        this.keys = keys;
+        this.rows = rows;
+        this.render();
+    }
+
+    showSort(field, descending) {
+        const headers = this.table.tHead.rows[0].cells;
+        this.columns.forEach((column, i) => {
+            headers[i].classList.toggle('vt-sorted-asc', column.sortField === field && !descending);
+            headers[i].classList.toggle('vt-sorted-desc', column.sortField === field && descending);
+        });
+    }
+
+    schedule() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    render() {
+        if (!this.keys.length) {
+            this.recycle(this.rendered);
+            this.rendered = new Map();
+            this.emptyRow.firstChild.textContent = this.emptyText;
+            this.tbody.replaceChildren(this.emptyRow);
+            return;
+        }
+        if (this.emptyRow.parentNode || !this.topSpacer.parentNode) {
+            this.tbody.replaceChildren(this.topSpacer, this.bottomSpacer);
+        }
+
+        const headHeight = this.table.tHead.offsetHeight;
+        const viewportHeight = this.viewport.clientHeight || window.innerHeight;
+        const top = Math.max(0, this.viewport.scrollTop - headHeight);
+        const count = this.keys.length;
+        const start = Math.min(count, Math.max(0, Math.floor(top / this.rowHeight) - this.overscan));
+        const end = Math.min(count, Math.ceil((top + viewportHeight) / this.rowHeight) + this.overscan);
+
+        // Reuse the row element already showing a key; rows that scrolled out go back to the pool
+        const next = new Map();
+        for (let i = start; i < end; i++) {
+            const key = this.keys[i];
+            const row = this.rows.get(key);
+            if (row === undefined) continue;
+            let tr = this.rendered.get(key);
+            if (tr) {
+                this.rendered.delete(key);
+            } else {
+                tr = this.pool.pop() || this.createRow();
+            }
+            this.updateRow(tr, row, i);
+            next.set(key, tr);
+        }
+        this.recycle(this.rendered);
+        this.rendered = next;
+
+        // Move only the rows that are out of place
+        let cursor = this.topSpacer.nextSibling;
+        for (const tr of next.values()) {
+            if (tr === cursor) {
+                cursor = cursor.nextSibling;
+            } else {
+                this.tbody.insertBefore(tr, cursor);
+            }
+        }
+        this.topSpacer.firstChild.style.height = `${start * this.rowHeight}px`;
+        this.bottomSpacer.firstChild.style.height = `${(count - end) * this.rowHeight}px`;
+
+        if (!this.measured && next.size) {
+            const height = next.values().next().value.offsetHeight;
+            if (height) {
+                this.measured = true;
+                if (Math.abs(height - this.rowHeight) > 0.5) {
+                    this.rowHeight = height;
+                    this.schedule();
+                }
+            }
+        }
+    }
+
+    recycle(rendered) {
+        for (const tr of rendered.values()) {
+            tr.remove();
+            this.pool.push(tr);
+        }
+    }
+
+    createRow() {
+        const tr = document.createElement('tr');
+        for (let i = 0; i < this.columns.length; i++) {
+            tr.appendChild(document.createElement('td'));
+        }
+        return tr;
+    }
+
+    // Row objects are replaced, never mutated, when data changes; only cells whose HTML differs are written
+    updateRow(tr, row, index) {
+        const className = index % 2 === 0 ? 'vt-row vt-odd' : 'vt-row';
+        if (tr.className !== className) tr.className = className;
+        if (tr.vtRow === row) return;
+        tr.vtRow = row;
+        const cells = tr.cells;
+        for (let i = 0; i < this.columns.length; i++) {
+            const html = this.columns[i].render(row);
+            if (cells[i].vtHtml !== html) {
+                cells[i].innerHTML = html;
+                cells[i].vtHtml = html;
+            }
+        }
+    }
+}
+
+// A VirtualTable fed by keyed patches, with filtering and sorting done by the worker.
+// Nothing is rendered until the first patch, so the tbody keeps its loading placeholder until then.
+class LiveTable {
+    constructor({ name, key, sort = null, ...options }) {
+        this.name = name;
+        this.key = key;
+        this.rows = new Map();
+        this.query = { filters: [], sort };
+        this.seq = 0;
+        this.worker = getTableWorker();
+        this.view = new VirtualTable({ ...options, rowKey: row => row[key], onSort: field => this.sortBy(field) });
+        if (sort) this.view.showSort(sort.field, sort.descending);
+
+        if (this.worker) {
+            this.worker.addEventListener('message', ({ data }) => {
+                if (data.table === this.name && data.seq === this.seq) this.view.setRows(data.keys, this.rows);
+            });
+            this.worker.addEventListener('error', event => {
+                console.warn('Table worker failed, filtering on the main thread:', event.message);
+                this.worker = null;
+                this.runInline();
+            });
+        }
+    }
+
+    send(message) {
+        this.seq += 1;
+        if (this.worker) {
+            this.worker.postMessage({ ...message, query: this.query, table: this.name, key: this.key, seq: this.seq });
+        } else {
+            this.runInline();
+        }
+    }
+
+    runInline() {
+        const seq = this.seq;
+        setTimeout(() => {
+            if (seq === this.seq) this.view.setRows(TableQuery.run(this.rows, this.key, this.query), this.rows);
+        }, 0);
+    }
+
+    // Apply changed and removed rows; with reset, the upserts replace everything
+    patch(upserts, deletes = [], reset = false) {
+        if (reset) this.rows.clear();
+        for (const row of upserts) this.rows.set(row[this.key], row);
+        for (const key of deletes) this.rows.delete(key);
+        this.send({ type: 'patch', upserts, deletes, reset });
+    }
+
+    setFilters(filters) {
+        this.query = { ...this.query, filters };
+        this.send({ type: 'query' });
+    }
+
+    // First click sorts ascending, the next one descending
+    sortBy(field) {
+        const current = this.query.sort;
+        const descending = current && current.field === field ? !current.descending : false;
+        this.query = { ...this.query, sort: { field, descending } };
+        this.view.showSort(field, descending);
+        this.send({ type: 'query' });
+    }
+
+    render() {
+        this.view.render();
+    }
+}
@@ -80,6 +80,34 @@ class Product {
     );
   }
 
+  // Same keys as fromJson reads, so cached products round-trip
+  Map<String, dynamic> toJson() => {
+    'id': id,
+    'name': name,
+    'description': description,
+    'price': price,
+    'tax': tax,
+    'status': status,
+    'is_deleted': isDeleted,
+    'is_featured': isFeatured,
+    'category_ids': categoryIds,
+    'attributes': attributes,
+    'discount': discount,
+    'discount_type': discountType,
+    'low_stock_limit': lowStockLimit,
+    'minimum_order_quantity': minimumOrderQuantity,
+    'maximum_order_quantity': maximumOrderQuantory,
+    'image': image,
+    'nutrition_fact_image': nutritionFactImage,
+    'nutrition_fact': nutritionFact,
+    'unit': unit,
+    'weight': weight,
+    'view_count': viewCount,
+    'popularity_count': popularityCount,
+    'created_at': createdAt.toIso8601String(),
+    'updated_at': updatedAt.toIso8601String(),
+  };
+
   bool get isLowStock => lowStockLimit > 0; // We don't have current stock from this endpoint
   bool get isOutOfStock => !status;
   
@@ -153,6 +181,26 @@ class Order {
     );
   }
 
+  Map<String, dynamic> toJson() => {
+    'id': id,
+    'user_id': userId,
+    'order_amount': orderAmount,
+    'order_status': orderStatus,
+    'payment_status': paymentStatus,
+    'payment_method': paymentMethod,
+    'order_type': orderType,
+    'created_at': createdAt.toIso8601String(),
+    'updated_at': updatedAt.toIso8601String(),
+    'date': date,
+    'delivery_date': deliveryDate,
+    'delivery_charge': deliveryCharge,
+    'total_tax_amount': totalTaxAmount,
+    'is_guest': isGuest,
+    'checked': checked,
+    'order_note': orderNote,
+    'delivery_address': deliveryAddress,
+  };
+
   bool get isCompleted => orderStatus == 'delivered';
   bool get isPending => orderStatus == 'placed' || orderStatus == 'confirmed';
   bool get isProcessing => orderStatus == 'processing' || orderStatus == 'out_for_delivery';
@@ -187,6 +235,86 @@ class WarehouseStats {
       averageStockLevel: (json['average_stock_level'] ?? 0.0).toDouble(),
     );
   }
+
+  Map<String, dynamic> toJson() => {
+    'total_products': totalProducts,
+    'low_stock_products': lowStockProducts,
+    'total_inventory_value': totalInventoryValue,
+    'categories': categories,
+    'order_status': orderStatus,
+    'average_stock_level': averageStockLevel,
+  };
+}
+
+class ChangeRecord {
+  final String table;
+  final int id;
+  final String op;
+  final DateTime updatedAt;
+  final Map<String, dynamic>? data;
+
+  ChangeRecord({
+    required this.table,
+    required this.id,
+    required this.op,
+    required this.updatedAt,
+    this.data,
+  });
+
+  factory ChangeRecord.fromJson(Map<String, dynamic> json) {
+    return ChangeRecord(
+      table: json['table'] ?? '',
+      id: json['id'] ?? 0,
+      op: json['op'] ?? 'upsert',
+      updatedAt: DateTime.parse(json['updated_at'] ?? DateTime.now().toIso8601String()),
+      data: json['data'],
+    );
+  }
+
+  bool get isDelete => op == 'delete';
+}
+
+class ChangeFeed {
+  final List<ChangeRecord> changes;
+  final String? nextCursor;
+  final bool hasMore;
+
+  ChangeFeed({
+    required this.changes,
+    this.nextCursor,
+    required this.hasMore,
+  });
+
+  factory ChangeFeed.fromJson(Map<String, dynamic> json) {
+    return ChangeFeed(
+      changes: (json['changes'] as List? ?? []).map((c) => ChangeRecord.fromJson(c)).toList(),
+      nextCursor: json['next_cursor'],
+      hasMore: json['has_more'] ?? false,
+    );
+  }
+}
+
+class TableRowsPage {
+  final String table;
+  final List<Map<String, dynamic>> rows;
+  final int? nextAfterId;
+  final bool hasMore;
+
+  TableRowsPage({
+    required this.table,
+    required this.rows,
+    this.nextAfterId,
+    required this.hasMore,
+  });
+
+  factory TableRowsPage.fromJson(Map<String, dynamic> json) {
+    return TableRowsPage(
+      table: json['table'] ?? '',
+      rows: (json['rows'] as List? ?? []).cast<Map<String, dynamic>>(),
+      nextAfterId: json['next_after_id'],
+      hasMore: json['has_more'] ?? false,
+    );
+  }
 }
 
 class ChatMessage {
@@ -227,11 +355,13 @@ class ChatMessage {
 class ApiResponse {
   final String reply;
   final Map<String, dynamic>? queryAnalysis;
+  final String? sessionId;
   final DateTime timestamp;
 
   ApiResponse({
     required this.reply,
     this.queryAnalysis,
+    this.sessionId,
     required this.timestamp,
   });
 
@@ -239,6 +369,7 @@ class ApiResponse {
     return ApiResponse(
       reply: json['reply'] ?? '',
       queryAnalysis: json['query_analysis'],
+      sessionId: json['session_id'],
       timestamp: DateTime.parse(json['timestamp']),
     );
   }
@@ -10,6 +10,8 @@ class ChatProvider with ChangeNotifier {
   String? _error;
   bool _isTyping = false;
   String _currentInput = '';
+  // Server-side conversation; the backend keeps the history, so only the new message is sent
+  String? _sessionId;
 
   // Getters
   List<ChatMessage> get messages => List.unmodifiable(_messages);
@@ -43,7 +45,8 @@ class ChatProvider with ChangeNotifier {
 
     try {
       // Send message to API
-      final response = await WarehouseApiService.chatWithAgent(message.trim());
+      final response = await WarehouseApiService.chatWithAgent(message.trim(), sessionId: _sessionId);
+      _sessionId = response.sessionId ?? _sessionId;
       
       // Add AI response
       final aiMessage = ChatMessage.ai(response.reply, analysis: response.queryAnalysis);
@@ -104,6 +107,11 @@ class ChatProvider with ChangeNotifier {
 
   // Clear all messages
   void clearMessages() {
+    final sessionId = _sessionId;
+    _sessionId = null;
+    if (sessionId != null) {
+      WarehouseApiService.endChatSession(sessionId).catchError((_) {});
+    }
     _messages.clear();
     _errorMessages.clear();
     _clearError();
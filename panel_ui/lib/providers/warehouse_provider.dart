@@ -1,5 +1,6 @@
 import 'package:flutter/foundation.dart';
 import '../models/warehouse_models.dart';
+import '../services/local_cache_service.dart';
 import '../services/warehouse_api_service.dart';
 
 class WarehouseProvider with ChangeNotifier {
@@ -8,6 +9,16 @@ class WarehouseProvider with ChangeNotifier {
   List<Product> _products = [];
   List<Product> _lowStockProducts = [];
   List<Order> _orders = [];
+
+  // Local copies of the product and order tables, kept current through /changes
+  final Map<int, Product> _productsById = {};
+  final Map<int, Order> _ordersById = {};
+  String? _changeCursor;
+  // Cursor the stats were loaded at; they are reloaded once the local tables move past it
+  String? _statsCursor;
+  // Cache writes run one after another, off the UI's critical path
+  Future<void> _cacheWrite = Future.value();
+  DateTime? _cachedAt;
   
   bool _isLoading = false;
   String? _error;
@@ -21,6 +32,8 @@ class WarehouseProvider with ChangeNotifier {
   bool get isLoading => _isLoading;
   String? get error => _error;
   bool get isConnected => _isConnected;
+  // When the data on screen was restored from the on-device cache, until the first sync replaces it
+  DateTime? get cachedAt => _cachedAt;
 
   // Computed getters
   double get totalInventoryValue => _stats?.totalInventoryValue ?? 0.0;
@@ -49,13 +62,51 @@ class WarehouseProvider with ChangeNotifier {
   }
 
   // Actions
+  // Show the cached data first, then catch up with the server through the change feed
   Future<void> initialize() async {
+    await _restoreFromCache();
     await checkConnection();
     if (_isConnected) {
-      await loadWarehouseData();
+      await refreshData();
     }
   }
 
+  Future<void> _restoreFromCache() async {
+    final cached = await LocalCacheService.load();
+    if (cached == null) return;
+
+    for (final product in cached.products) {
+      _productsById[product.id] = product;
+    }
+    for (final order in cached.orders) {
+      _ordersById[order.id] = order;
+    }
+    _changeCursor = cached.changeCursor;
+    _stats = cached.stats;
+    _statsCursor = cached.statsCursor;
+    _lowStockProducts = cached.lowStockProducts;
+    _cachedAt = cached.savedAt;
+    _rebuildLists();
+    notifyListeners();
+  }
+
+  void _persist({bool products = false, bool orders = false, bool stats = false}) {
+    final cursor = _changeCursor;
+    final statsCursor = _statsCursor;
+    final productList = products ? List<Product>.of(_products) : null;
+    final orderList = orders ? List<Order>.of(_orders) : null;
+    final currentStats = stats ? _stats : null;
+    final lowStock = stats ? List<Product>.of(_lowStockProducts) : null;
+    _cacheWrite = _cacheWrite.then((_) => LocalCacheService.save(
+      products: productList,
+      orders: orderList,
+      stats: currentStats,
+      lowStockProducts: lowStock,
+      changeCursor: cursor,
+      statsCursor: statsCursor,
+    )).catchError((e) => debugPrint('Failed to save warehouse cache: $e'));
+  }
+
   Future<void> checkConnection() async {
     try {
       _isConnected = await WarehouseApiService.healthCheck();
@@ -81,18 +132,17 @@ class WarehouseProvider with ChangeNotifier {
     _clearError();
 
     try {
-      // Load all data in parallel
+      // Load all data in parallel; products and orders come from the change feed
       final futures = await Future.wait([
         WarehouseApiService.getWarehouseStats(),
-        WarehouseApiService.getProducts(),
         WarehouseApiService.getLowStockProducts(),
-        WarehouseApiService.getOrders(),
+        syncChanges(),
       ]);
 
       _stats = futures[0] as WarehouseStats;
-      _products = futures[1] as List<Product>;
-      _lowStockProducts = futures[2] as List<Product>;
-      _orders = futures[3] as List<Order>;
+      _lowStockProducts = futures[1] as List<Product>;
+      _statsCursor = _changeCursor;
+      _persist(stats: true);
 
     } catch (e) {
       _setError('Failed to load warehouse data: ${e.toString()}');
@@ -102,13 +152,134 @@ class WarehouseProvider with ChangeNotifier {
     }
   }
 
+  // Fetch only what changed since the last sync; stats are reloaded only when something did
   Future<void> refreshData() async {
-    await loadWarehouseData();
+    if (_changeCursor == null || _stats == null) {
+      await loadWarehouseData();
+      return;
+    }
+
+    try {
+      await syncChanges();
+      if (_statsCursor != _changeCursor) {
+        final futures = await Future.wait([
+          WarehouseApiService.getWarehouseStats(),
+          WarehouseApiService.getLowStockProducts(),
+        ]);
+        _stats = futures[0] as WarehouseStats;
+        _lowStockProducts = futures[1] as List<Product>;
+        _statsCursor = _changeCursor;
+        _persist(stats: true);
+        notifyListeners();
+      }
+    } catch (e) {
+      _setError('Failed to refresh warehouse data: ${e.toString()}');
+    }
+  }
+
+  // Apply every change after the stored cursor to the local tables; returns how many were applied.
+  // Without a cursor the tables are seeded first, so the feed only ever carries deltas.
+  Future<int> syncChanges() async {
+    final tables = <String>{};
+    var changed = _changeCursor == null ? await _seedTables(tables) : 0;
+    ChangeFeed page;
+    do {
+      page = await WarehouseApiService.getChanges(since: _changeCursor);
+      for (final change in page.changes) {
+        _applyChange(change);
+        tables.add(change.table);
+      }
+      changed += page.changes.length;
+      _changeCursor = page.nextCursor ?? _changeCursor;
+    } while (page.hasMore);
+
+    // The data on screen is current now, whether or not anything changed
+    final wasCached = _cachedAt != null;
+    _cachedAt = null;
+    if (changed > 0) {
+      _rebuildLists();
+      // Only the tables that changed are rewritten; the cursor is saved with them
+      _persist(products: tables.contains('products'), orders: tables.contains('orders'));
+    }
+    if (changed > 0 || wasCached) notifyListeners();
+    return changed;
+  }
+
+  // Take the feed's head cursor, then load every product and the latest orders from the paged row lists.
+  // Rows changed while loading come again through the feed and are simply replaced.
+  Future<int> _seedTables(Set<String> tables) async {
+    final cursor = await WarehouseApiService.getChangeHead();
+    var loaded = 0;
+
+    int? afterId;
+    TableRowsPage page;
+    do {
+      page = await WarehouseApiService.getTableRows('products', afterId: afterId);
+      for (final row in page.rows) {
+        _productsById[row['id']] = Product.fromJson(row);
+      }
+      loaded += page.rows.length;
+      afterId = page.nextAfterId;
+    } while (page.hasMore);
+
+    afterId = null;
+    var orders = 0;
+    do {
+      page = await WarehouseApiService.getTableRows('orders', afterId: afterId, newestFirst: true);
+      for (final row in page.rows) {
+        _ordersById[row['id']] = Order.fromJson(row);
+      }
+      orders += page.rows.length;
+      afterId = page.nextAfterId;
+    } while (page.hasMore && orders < LocalCacheService.maxOrders);
+
+    tables.addAll(['products', 'orders']);
+    _changeCursor = cursor;
+    return loaded + orders;
+  }
+
+  void _rebuildLists() {
+    _products = _productsById.values.toList()..sort((a, b) => a.id.compareTo(b.id));
+    _orders = _ordersById.values.toList()..sort((a, b) => b.createdAt.compareTo(a.createdAt));
+    // Keep the most recent orders only; older ones come back if they change again
+    if (_orders.length > LocalCacheService.maxOrders) {
+      for (final order in _orders.skip(LocalCacheService.maxOrders)) {
+        _ordersById.remove(order.id);
+      }
+      _orders = _orders.sublist(0, LocalCacheService.maxOrders);
+    }
+  }
+
+  void _applyChange(ChangeRecord change) {
+    switch (change.table) {
+      case 'products':
+        if (change.isDelete) {
+          _productsById.remove(change.id);
+        } else {
+          _productsById[change.id] = Product.fromJson(change.data!);
+        }
+        break;
+      case 'orders':
+        _ordersById[change.id] = Order.fromJson(change.data!);
+        break;
+    }
   }
 
   Future<void> loadProducts({String? category, bool lowStockOnly = false}) async {
     if (!_isConnected) return;
 
+    // The unfiltered list is the local table
+    if (category == null && !lowStockOnly) {
+      try {
+        await syncChanges();
+        _rebuildLists();
+        notifyListeners();
+      } catch (e) {
+        _setError('Failed to load products: ${e.toString()}');
+      }
+      return;
+    }
+
     _setLoading(true);
     _clearError();
 
@@ -127,6 +298,17 @@ class WarehouseProvider with ChangeNotifier {
   Future<void> loadOrders({String? status}) async {
     if (!_isConnected) return;
 
+    if (status == null) {
+      try {
+        await syncChanges();
+        _rebuildLists();
+        notifyListeners();
+      } catch (e) {
+        _setError('Failed to load orders: ${e.toString()}');
+      }
+      return;
+    }
+
     _setLoading(true);
     _clearError();
 
@@ -190,6 +372,12 @@ class WarehouseProvider with ChangeNotifier {
     _products.clear();
     _lowStockProducts.clear();
     _orders.clear();
+    _productsById.clear();
+    _ordersById.clear();
+    _changeCursor = null;
+    _statsCursor = null;
+    _cachedAt = null;
+    _cacheWrite = _cacheWrite.then((_) => LocalCacheService.clear());
     _error = null;
     _isLoading = false;
     _isConnected = false;
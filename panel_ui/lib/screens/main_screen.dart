@@ -311,6 +311,21 @@ class _MainScreenState extends State<MainScreen> {
                         ),
                       ),
                       const Spacer(),
+                      Consumer<WarehouseProvider>(
+                        builder: (context, provider, child) {
+                          final cachedAt = provider.cachedAt;
+                          if (cachedAt == null) return const SizedBox.shrink();
+                          return Padding(
+                            padding: const EdgeInsets.only(right: 16),
+                            child: Text(
+                              'Showing saved data from '
+                              '${cachedAt.hour.toString().padLeft(2, '0')}:'
+                              '${cachedAt.minute.toString().padLeft(2, '0')}',
+                              style: const TextStyle(fontSize: 13, color: Color(0xFF6B7280)),
+                            ),
+                          );
+                        },
+                      ),
                       Consumer<WarehouseProvider>(
                         builder: (context, provider, child) {
                           return FilledButton.icon(
@@ -0,0 +1,153 @@
+import 'dart:convert';
+import 'package:flutter/foundation.dart';
+import 'package:shared_preferences/shared_preferences.dart';
+import '../models/warehouse_models.dart';
+import 'warehouse_api_service.dart';
+
+// What the last session stored: enough to render right away and resume the change feed
+class CachedWarehouseData {
+  final List<Product> products;
+  final List<Order> orders;
+  final WarehouseStats? stats;
+  final List<Product> lowStockProducts;
+  // Change feed position the products and orders are current to; null means a full sync is needed
+  final String? changeCursor;
+  // Change feed position the stats were loaded at; stats are reloaded when it differs from changeCursor
+  final String? statsCursor;
+  final DateTime savedAt;
+
+  CachedWarehouseData({
+    required this.products,
+    required this.orders,
+    this.stats,
+    required this.lowStockProducts,
+    this.changeCursor,
+    this.statsCursor,
+    required this.savedAt,
+  });
+}
+
+// On-device copy of products, orders and stats in shared_preferences (localStorage on the web).
+// Each part has its own key so a sync rewrites only what changed; storage is capped at maxBytes.
+class LocalCacheService {
+  static const int schemaVersion = 1;
+  static const String _prefix = 'warehouse_cache.';
+  static const String _metaKey = '${_prefix}meta';
+  static const String _productsKey = '${_prefix}products';
+  static const String _ordersKey = '${_prefix}orders';
+  static const String _statsKey = '${_prefix}stats';
+
+  // Browsers allow about 5 MB of localStorage per origin
+  static const int maxBytes = 4 * 1024 * 1024;
+  // Only the most recent orders are kept, locally and on disk
+  static const int maxOrders = 5000;
+  // An older cache is dropped and the app starts with a full sync
+  static const Duration maxAge = Duration(days: 7);
+
+  static Future<CachedWarehouseData?> load() async {
+    try {
+      final prefs = await SharedPreferences.getInstance();
+      final meta = prefs.getString(_metaKey);
+      if (meta == null) return null;
+
+      final info = json.decode(meta) as Map<String, dynamic>;
+      final savedAt = DateTime.parse(info['saved_at']);
+      if (info['schema'] != schemaVersion ||
+          info['base_url'] != WarehouseApiService.baseUrl ||
+          DateTime.now().difference(savedAt) > maxAge) {
+        await clear();
+        return null;
+      }
+
+      List<Map<String, dynamic>> rows(String key) =>
+          (json.decode(prefs.getString(key) ?? '[]') as List).cast<Map<String, dynamic>>();
+      final statsJson = prefs.getString(_statsKey);
+      final stats = statsJson != null ? json.decode(statsJson) as Map<String, dynamic> : null;
+
+      return CachedWarehouseData(
+        products: rows(_productsKey).map(Product.fromJson).toList(),
+        orders: rows(_ordersKey).map(Order.fromJson).toList(),
+        stats: stats?['stats'] != null ? WarehouseStats.fromJson(stats!['stats']) : null,
+        lowStockProducts: ((stats?['low_stock'] as List?) ?? [])
+            .map((p) => Product.fromJson(p as Map<String, dynamic>))
+            .toList(),
+        changeCursor: prefs.containsKey(_productsKey) ? info['cursor'] : null,
+        statsCursor: stats?['cursor'],
+        savedAt: savedAt,
+      );
+    } catch (e) {
+      // A cache that does not parse is worth nothing; start over with a full sync
+      debugPrint('Discarding unreadable warehouse cache: $e');
+      await clear();
+      return null;
+    }
+  }
+
+  // Write the parts that are given, then the cursor; orders are expected newest first
+  static Future<void> save({
+    List<Product>? products,
+    List<Order>? orders,
+    WarehouseStats? stats,
+    List<Product>? lowStockProducts,
+    String? changeCursor,
+    String? statsCursor,
+  }) async {
+    final prefs = await SharedPreferences.getInstance();
+    var used = 0;
+    for (final key in [_productsKey, _ordersKey, _statsKey]) {
+      used += prefs.getString(key)?.length ?? 0;
+    }
+
+    if (stats != null) {
+      final encoded = json.encode({
+        'stats': stats.toJson(),
+        'low_stock': (lowStockProducts ?? []).map((p) => p.toJson()).toList(),
+        'cursor': statsCursor,
+      });
+      used += encoded.length - (prefs.getString(_statsKey)?.length ?? 0);
+      await prefs.setString(_statsKey, encoded);
+    }
+
+    if (products != null) {
+      final encoded = json.encode(products.map((p) => p.toJson()).toList());
+      final budget = maxBytes - used + (prefs.getString(_productsKey)?.length ?? 0);
+      if (encoded.length > budget) {
+        // Not storing products: the next start syncs them in full instead of reading a partial table
+        debugPrint('Product cache (${encoded.length} bytes) exceeds its budget; not persisting products');
+        used -= prefs.getString(_productsKey)?.length ?? 0;
+        await prefs.remove(_productsKey);
+      } else {
+        used += encoded.length - (prefs.getString(_productsKey)?.length ?? 0);
+        await prefs.setString(_productsKey, encoded);
+      }
+    }
+
+    if (orders != null) {
+      // Newest orders first, until the remaining budget is used up
+      final budget = maxBytes - used + (prefs.getString(_ordersKey)?.length ?? 0);
+      final kept = <String>[];
+      var size = 2;
+      for (final order in orders.take(maxOrders)) {
+        final encoded = json.encode(order.toJson());
+        if (size + encoded.length + 1 > budget) break;
+        kept.add(encoded);
+        size += encoded.length + 1;
+      }
+      await prefs.setString(_ordersKey, '[${kept.join(',')}]');
+    }
+
+    await prefs.setString(_metaKey, json.encode({
+      'schema': schemaVersion,
+      'base_url': WarehouseApiService.baseUrl,
+      'cursor': changeCursor,
+      'saved_at': DateTime.now().toIso8601String(),
+    }));
+  }
+
+  static Future<void> clear() async {
+    final prefs = await SharedPreferences.getInstance();
+    for (final key in [_metaKey, _productsKey, _ordersKey, _statsKey]) {
+      await prefs.remove(key);
+    }
+  }
+}
@@ -10,6 +10,27 @@ class WarehouseApiService {
     'Accept': 'application/json',
   };
 
+  // List endpoints answer with one array per column instead of repeating every key in every row.
+  // Compression needs no header: dart:io and browsers send Accept-Encoding and decompress on their own.
+  static const String _columnarJson = 'application/x-columnar+json';
+  static final Map<String, String> _listHeaders = {
+    ..._headers,
+    'Accept': '$_columnarJson, application/json;q=0.9',
+  };
+
+  // Rows of a list response in either format, as one map per row
+  static List<Map<String, dynamic>> _decodeRows(http.Response response) {
+    final data = json.decode(utf8.decode(response.bodyBytes));
+    if (data is List) {
+      return data.cast<Map<String, dynamic>>();
+    }
+    final columns = (data['columns'] as List).cast<String>();
+    final values = (data['data'] as List).cast<List>();
+    return List.generate(data['count'] as int, (row) => {
+      for (var column = 0; column < columns.length; column++) columns[column]: values[column][row],
+    });
+  }
+
   // Health check
   static Future<bool> healthCheck() async {
     try {
@@ -24,12 +45,12 @@ class WarehouseApiService {
     }
   }
 
-  // Chat with AI agent
-  static Future<ApiResponse> chatWithAgent(String message) async {
+  // Chat with AI agent; pass the session ID from the previous reply to continue a conversation
+  static Future<ApiResponse> chatWithAgent(String message, {String? sessionId}) async {
     final response = await http.post(
       Uri.parse('$baseUrl/chat'),
       headers: _headers,
-      body: json.encode({'message': message}),
+      body: json.encode({'message': message, 'session_id': sessionId}),
     ).timeout(const Duration(seconds: 30));
     
     if (response.statusCode == 200) {
@@ -39,6 +60,14 @@ class WarehouseApiService {
     }
   }
 
+  // Forget a conversation's server-side history
+  static Future<void> endChatSession(String sessionId) async {
+    await http.delete(
+      Uri.parse('$baseUrl/chat/sessions/$sessionId'),
+      headers: _headers,
+    ).timeout(const Duration(seconds: 5));
+  }
+
   // Advanced warehouse query
   static Future<ApiResponse> warehouseQuery(String query, {bool includeContext = true}) async {
     final response = await http.post(
@@ -100,12 +129,11 @@ class WarehouseApiService {
       queryParameters: queryParams.isEmpty ? null : queryParams,
     );
     
-    final response = await http.get(uri, headers: _headers)
+    final response = await http.get(uri, headers: _listHeaders)
         .timeout(const Duration(seconds: 10));
     
     if (response.statusCode == 200) {
-      final data = json.decode(response.body) as List;
-      return data.map((p) => Product.fromJson(p)).toList();
+      return _decodeRows(response).map((p) => Product.fromJson(p)).toList();
     } else {
       throw Exception('Failed to get products: ${response.statusCode}');
     }
@@ -120,17 +148,63 @@ class WarehouseApiService {
       queryParameters: queryParams.isEmpty ? null : queryParams,
     );
     
-    final response = await http.get(uri, headers: _headers)
+    final response = await http.get(uri, headers: _listHeaders)
         .timeout(const Duration(seconds: 10));
     
     if (response.statusCode == 200) {
-      final data = json.decode(response.body) as List;
-      return data.map((s) => Order.fromJson(s)).toList();
+      return _decodeRows(response).map((s) => Order.fromJson(s)).toList();
     } else {
       throw Exception('Failed to get orders: ${response.statusCode}');
     }
   }
 
+  // Get the feed position to follow from once the local tables are seeded
+  static Future<String> getChangeHead() async {
+    final response = await http.get(Uri.parse('$baseUrl/changes/head'), headers: _headers)
+        .timeout(const Duration(seconds: 10));
+
+    if (response.statusCode == 200) {
+      return json.decode(response.body)['cursor'];
+    } else {
+      throw Exception('Failed to get change head: ${response.statusCode}');
+    }
+  }
+
+  // Get one page of a table's rows by ID, in the change feed's row format
+  static Future<TableRowsPage> getTableRows(String table, {int? afterId, int limit = 1000, bool newestFirst = false}) async {
+    final queryParams = <String, String>{'limit': limit.toString()};
+    if (afterId != null) queryParams['after_id'] = afterId.toString();
+    if (newestFirst) queryParams['newest_first'] = 'true';
+
+    final uri = Uri.parse('$baseUrl/changes/rows/$table').replace(queryParameters: queryParams);
+
+    final response = await http.get(uri, headers: _headers)
+        .timeout(const Duration(seconds: 30));
+
+    if (response.statusCode == 200) {
+      return TableRowsPage.fromJson(json.decode(utf8.decode(response.bodyBytes)));
+    } else {
+      throw Exception('Failed to get $table rows: ${response.statusCode}');
+    }
+  }
+
+  // Get rows changed after a cursor (start from getChangeHead; no cursor replays every row, oldest first)
+  static Future<ChangeFeed> getChanges({String? since, int limit = 1000}) async {
+    final queryParams = <String, String>{'limit': limit.toString()};
+    if (since != null) queryParams['since'] = since;
+
+    final uri = Uri.parse('$baseUrl/changes').replace(queryParameters: queryParams);
+
+    final response = await http.get(uri, headers: _headers)
+        .timeout(const Duration(seconds: 30));
+
+    if (response.statusCode == 200) {
+      return ChangeFeed.fromJson(json.decode(response.body));
+    } else {
+      throw Exception('Failed to get changes: ${response.statusCode}');
+    }
+  }
+
   // Get specific product details
   static Future<Product> getProductDetails(String productId) async {
     final response = await http.get(
@@ -146,4 +220,21 @@ class WarehouseApiService {
       throw Exception('Failed to get product details: ${response.statusCode}');
     }
   }
+
+  // Get many products in one request; IDs that no longer exist are left out
+  static Future<List<Product>> getProductsByIds(List<String> productIds) async {
+    final uri = Uri.parse('$baseUrl/warehouse/products/batch').replace(
+      queryParameters: {'ids': productIds.join(',')},
+    );
+
+    final response = await http.get(uri, headers: _headers)
+        .timeout(const Duration(seconds: 10));
+
+    if (response.statusCode == 200) {
+      final data = json.decode(utf8.decode(response.bodyBytes));
+      return (data['products'] as List).map((p) => Product.fromJson(p)).toList();
+    } else {
+      throw Exception('Failed to get products: ${response.statusCode}');
+    }
+  }
 }